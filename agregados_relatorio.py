@@ -0,0 +1,215 @@
+# --- MÓDULO: agregados_relatorio.py ---
+# Agregados do relatório de risco para o dashboard.
+#
+# O analise.py grava, junto com o relatório, um banco SQLite com:
+#   histograma_risco   contagem de produtos por classificação e por indicador de risco
+#                      (resolução de 0,01 ponto, a mesma do relatório)
+#   amostra_dispersao  amostra estratificada (classificação x faixa de 1%) para o gráfico de dispersão
+#   relatorio          as linhas do relatório, na ordem do arquivo (maior risco primeiro),
+#                      com a posição geral e a posição dentro da classificação
+#
+# Como o relatório está ordenado por risco, os produtos de uma classificação com risco
+# entre A e B ocupam um intervalo contíguo de posições, calculado pelo histograma. Assim
+# os filtros, as métricas, as curvas e a paginação da tabela não percorrem o relatório:
+# cada página é uma consulta por intervalo no índice, com latência constante.
+
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+BANCO_RELATORIO = 'relatorio_risco.db'
+PONTOS_POR_FAIXA = 50 # Pontos da amostra de dispersão por classificação e faixa de 1% de risco
+ESCALA_RISCO = 100 # O risco é guardado em centésimos de ponto percentual (inteiro)
+
+COLUNAS_DETALHE = ['titulo', 'preco', 'compatibilidade', 'modelo_cartucho', 'classificacao_ia', 'indicador_de_risco_pct']
+COLUNAS_DISPERSAO = ['titulo', 'preco', 'indicador_de_risco_pct', 'classificacao_ia']
+
+
+def _risco_centesimos(riscos):
+    centesimos = np.rint(np.asarray(riscos, dtype=float) * ESCALA_RISCO)
+    return np.clip(centesimos, 0, 100 * ESCALA_RISCO).astype(np.int64)
+
+
+def _amostrar(amostra, bloco, rng):
+    """Amostragem estratificada incremental: mantém os PONTOS_POR_FAIXA de menor chave aleatória por estrato."""
+    bloco = bloco[COLUNAS_DISPERSAO].assign(
+        _faixa=(np.asarray(bloco['indicador_de_risco_pct'], dtype=float) // 1).astype(int),
+        _chave=rng.random(len(bloco)),
+    )
+    candidatos = bloco if amostra is None else pd.concat([amostra, bloco], ignore_index=True)
+    return (candidatos.sort_values('_chave', kind='stable')
+            .groupby(['classificacao_ia', '_faixa'], sort=False).head(PONTOS_POR_FAIXA))
+
+
+def gravar_agregados(blocos, caminho=BANCO_RELATORIO, origem=None):
+    """Grava o banco de agregados a partir dos blocos do relatório, já ordenados por risco decrescente.
+
+    O banco é montado em um arquivo temporário e substitui o anterior de uma vez, então o
+    dashboard nunca lê um banco pela metade. Devolve o número de linhas gravadas.
+    """
+    temporario = caminho + '.tmp'
+    if os.path.exists(temporario):
+        os.remove(temporario)
+
+    rng = np.random.default_rng(42)
+    histograma = {}  # classificação -> contagens por risco em centésimos
+    posicoes_classe = {}
+    amostra = None
+    total = 0
+
+    conexao = sqlite3.connect(temporario)
+    try:
+        conexao.execute('PRAGMA journal_mode = OFF')
+        conexao.execute('PRAGMA synchronous = OFF')
+        conexao.execute("""
+            CREATE TABLE relatorio (
+                posicao INTEGER PRIMARY KEY, posicao_classe INTEGER NOT NULL,
+                titulo TEXT, preco REAL, compatibilidade TEXT, modelo_cartucho TEXT,
+                classificacao_ia TEXT NOT NULL, indicador_de_risco_pct REAL NOT NULL
+            )""")
+
+        for bloco in blocos:
+            if bloco.empty:
+                continue
+            bloco = bloco.reindex(columns=COLUNAS_DETALHE)
+            classes = bloco['classificacao_ia'].astype(str).to_numpy()
+            centesimos = _risco_centesimos(bloco['indicador_de_risco_pct'])
+
+            posicao_classe = np.empty(len(bloco), dtype=np.int64)
+            for classe in pd.unique(classes):
+                mascara = classes == classe
+                inicio = posicoes_classe.get(classe, 0)
+                posicao_classe[mascara] = np.arange(inicio, inicio + mascara.sum())
+                posicoes_classe[classe] = inicio + int(mascara.sum())
+                contagens = np.bincount(centesimos[mascara], minlength=100 * ESCALA_RISCO + 1)
+                histograma[classe] = histograma.get(classe, 0) + contagens
+
+            linhas = bloco.astype(object).where(bloco.notna(), None)
+            linhas.insert(0, 'posicao_classe', posicao_classe)
+            linhas.insert(0, 'posicao', np.arange(total, total + len(bloco)))
+            conexao.executemany('INSERT INTO relatorio VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                linhas.itertuples(index=False, name=None))
+            amostra = _amostrar(amostra, bloco, rng)
+            total += len(bloco)
+
+        conexao.execute('CREATE INDEX idx_relatorio_classe_posicao ON relatorio (classificacao_ia, posicao_classe)')
+
+        conexao.execute('CREATE TABLE histograma_risco (classificacao_ia TEXT, risco_centesimos INTEGER, contagem INTEGER)')
+        for classe, contagens in histograma.items():
+            nao_vazios = np.flatnonzero(contagens)
+            conexao.executemany('INSERT INTO histograma_risco VALUES (?, ?, ?)',
+                                ((classe, int(r), int(contagens[r])) for r in nao_vazios))
+
+        conexao.execute(f'CREATE TABLE amostra_dispersao ({", ".join(COLUNAS_DISPERSAO)})')
+        if amostra is not None:
+            amostra = amostra[COLUNAS_DISPERSAO]
+            conexao.executemany(f'INSERT INTO amostra_dispersao VALUES ({", ".join("?" * len(COLUNAS_DISPERSAO))})',
+                                amostra.astype(object).where(amostra.notna(), None).itertuples(index=False, name=None))
+
+        conexao.execute('CREATE TABLE metadados (chave TEXT PRIMARY KEY, valor TEXT)')
+        conexao.executemany('INSERT INTO metadados VALUES (?, ?)', [
+            ('gerado_em', time.strftime('%Y-%m-%d %H:%M:%S')),
+            ('origem', origem or ''),
+            ('total_linhas', str(total)),
+        ])
+        conexao.commit()
+    finally:
+        conexao.close()
+
+    os.replace(temporario, caminho)
+    return total
+
+
+def carregar_histograma(caminho=BANCO_RELATORIO):
+    with closing(sqlite3.connect(caminho)) as conexao:
+        return pd.read_sql_query('SELECT classificacao_ia, risco_centesimos, contagem FROM histograma_risco', conexao)
+
+
+def carregar_amostra(caminho=BANCO_RELATORIO):
+    with closing(sqlite3.connect(caminho)) as conexao:
+        return pd.read_sql_query('SELECT * FROM amostra_dispersao', conexao)
+
+
+def carregar_metadados(caminho=BANCO_RELATORIO):
+    with closing(sqlite3.connect(caminho)) as conexao:
+        return dict(conexao.execute('SELECT chave, valor FROM metadados').fetchall())
+
+
+def _filtrar(histograma, classificacao, risco_min, risco_max):
+    """Linhas do histograma dentro do filtro; classificacao=None considera todas."""
+    mascara = histograma['risco_centesimos'].between(round(risco_min * ESCALA_RISCO), round(risco_max * ESCALA_RISCO))
+    if classificacao is not None:
+        mascara &= histograma['classificacao_ia'] == classificacao
+    return histograma[mascara]
+
+
+def resumo_filtro(histograma, classificacao, risco_min, risco_max):
+    """Quantidade e risco médio dos produtos no filtro, calculados pelo histograma."""
+    filtrado = _filtrar(histograma, classificacao, risco_min, risco_max)
+    total = int(filtrado['contagem'].sum())
+    soma = float((filtrado['risco_centesimos'] * filtrado['contagem']).sum()) / ESCALA_RISCO
+    return {'total': total, 'risco_medio': soma / total if total else 0.0}
+
+
+def contagem_por_faixa(histograma, classificacao, risco_min, risco_max, largura=5):
+    """Contagem por classificação em faixas de `largura` pontos de risco (gráfico de barras)."""
+    filtrado = _filtrar(histograma, classificacao, risco_min, risco_max)
+    faixa = np.minimum(filtrado['risco_centesimos'] // (largura * ESCALA_RISCO), 100 // largura - 1) * largura
+    contagens = filtrado.groupby([faixa.rename('faixa_inicio'), 'classificacao_ia'])['contagem'].sum().reset_index()
+    contagens['faixa_fim'] = contagens['faixa_inicio'] + largura
+    return contagens
+
+
+def densidade_por_classe(histograma, classificacao, risco_min, risco_max, pontos=200):
+    """Curvas de densidade (KDE gaussiano) por classificação, calculadas sobre o histograma.
+
+    Cada curva integra 1, como no transform_density do Altair; a largura de banda segue a
+    regra de Scott aplicada à média e ao desvio ponderados pelas contagens.
+    """
+    filtrado = _filtrar(histograma, classificacao, risco_min, risco_max)
+    grade = np.linspace(risco_min, risco_max, pontos)
+    curvas = []
+    for classe, grupo in filtrado.groupby('classificacao_ia'):
+        valores = grupo['risco_centesimos'].to_numpy() / ESCALA_RISCO
+        pesos = grupo['contagem'].to_numpy(dtype=float)
+        n = pesos.sum()
+        media = np.average(valores, weights=pesos)
+        desvio = np.sqrt(np.average((valores - media) ** 2, weights=pesos))
+        banda = max(1.06 * desvio * n ** (-1 / 5), 0.5)
+        z = (grade[:, None] - valores[None, :]) / banda
+        densidade = (np.exp(-0.5 * z ** 2) @ pesos) / (n * banda * np.sqrt(2 * np.pi))
+        curvas.append(pd.DataFrame({'risco': grade, 'densidade': densidade, 'classificacao_ia': classe}))
+    if not curvas:
+        return pd.DataFrame(columns=['risco', 'densidade', 'classificacao_ia'])
+    return pd.concat(curvas, ignore_index=True)
+
+
+def pagina_relatorio(histograma, classificacao, risco_min, risco_max, numero_pagina, tamanho_pagina=100,
+                     caminho=BANCO_RELATORIO):
+    """Devolve uma página da tabela detalhada (numero_pagina começa em 0).
+
+    As posições das linhas do filtro são calculadas pelo histograma (produtos com risco acima
+    do máximo vêm antes), e a página é lida por intervalo no índice, sem OFFSET nem COUNT.
+    """
+    acima = histograma['risco_centesimos'] > round(risco_max * ESCALA_RISCO)
+    if classificacao is not None:
+        acima &= histograma['classificacao_ia'] == classificacao
+    inicio_filtro = int(histograma.loc[acima, 'contagem'].sum())
+    total_filtro = resumo_filtro(histograma, classificacao, risco_min, risco_max)['total']
+
+    inicio = inicio_filtro + numero_pagina * tamanho_pagina
+    fim = min(inicio + tamanho_pagina, inicio_filtro + total_filtro) - 1
+    colunas = ', '.join(COLUNAS_DETALHE)
+    with closing(sqlite3.connect(caminho)) as conexao:
+        if classificacao is None:
+            consulta = f'SELECT {colunas} FROM relatorio WHERE posicao BETWEEN ? AND ? ORDER BY posicao'
+            parametros = (inicio, fim)
+        else:
+            consulta = (f'SELECT {colunas} FROM relatorio WHERE classificacao_ia = ? '
+                        f'AND posicao_classe BETWEEN ? AND ? ORDER BY posicao_classe')
+            parametros = (classificacao, inicio, fim)
+        return pd.read_sql_query(consulta, conexao, params=parametros)
@@ -1,96 +1,534 @@
 # --- SCRIPT: 2_analise_sprint4.py ---
 # Executa o pipeline principal de análise (RPA + IA).
 
-import pandas as pd
-import joblib
+import argparse
+import contextlib
+import csv
+import heapq
+import os
 import sys
+import tempfile
+import time
+
+import pandas as pd
 
 # Importação de funções locais
 try:
     from funcoes_analise import (
-        load_and_clean_data, 
-        enrich_data, 
-        create_features, 
-        setup_visual_style, 
+        iter_load_and_clean_data,
+        enrich_data,
+        score_data,
+        setup_visual_style,
         generate_visualizations
     )
 except ImportError:
     print("ERRO: Arquivo 'funcoes_analise.py' não encontrado.")
     sys.exit()
 
-print("--- Iniciando Pipeline de Análise e Detecção ---")
+import instrumentacao
+from agregados_relatorio import gravar_agregados, BANCO_RELATORIO
+from banco_resultados import GravadorExecucao, BANCO_RESULTADOS
+from cache_dados import carregar_dados, hash_arquivo
+from clusters_titulos import carregar_indice, ARQUIVO_CLUSTERS
+from identificadores import carregar_identificadores, chaves_anuncio, ARQUIVO_IDENTIFICADORES
+from indice_vendedores import AtualizadorVendedores, BANCO_VENDEDORES
+from instrumentacao import medir_etapa, log, ARQUIVO_METRICAS
+from pontuacao_incremental import pontuar_incremental, versao_modelo
+from pontuacao_paralela import iter_pontuar_paralelo
+from modelo_fundido import ModeloFundido, ARQUIVO_MODELO_FUNDIDO, carregar_modelo
+from pacote_modelo import carregar_pacote, ARQUIVO_PACOTE
+from referencia_precos import ReferenciaPrecos, ARQUIVO_REFERENCIA
+from saida_relatorio import FORMATOS, EscritorRelatorio, caminho_relatorio, escrever_relatorio, ler_relatorio
 
-# 1. Carregamento do Modelo de IA
-try:
-    modelo_ia = joblib.load('modelo_risco.pkl')
-    avg_price_map = joblib.load('avg_price_map.pkl')
-    features_list = joblib.load('features_list.pkl')
-    print("Modelo de IA e artefatos carregados com sucesso.")
-except FileNotFoundError:
-    print("ERRO: Arquivos 'modelo_risco.pkl', 'avg_price_map.pkl' ou 'features_list.pkl' não encontrados.")
-    print("Por favor, execute o script '1_treinar_modelo.py' primeiro.")
-    sys.exit()
+# Configuração de Arquivos
+CSV_ENTRADA = 'dataset_mercado_livre.csv'
+ARQUIVOS_MODELO = ['modelo_risco.pkl', 'avg_price_map.pkl', 'features_list.pkl']
 
-# 2. Carregamento dos Dados (Simulação de RPA)
-csv_filepath = 'dataset_mercado_livre.csv' 
-print(f"Carregando dados 'novos' de: {csv_filepath}")
+COLUNAS_RELATORIO = [
+    'titulo', 'preco', 'compatibilidade', 'modelo_cartucho',
+    'classificacao_ia', 'indicador_de_risco_pct'
+]
+# Colunas acrescentadas ao relatório com --clusters
+COLUNAS_CLUSTER = ['cluster_titulo', 'anuncios_cluster', 'preco_medio_cluster', 'razao_preco_cluster']
+COLUNA_RISCO = 'indicador_de_risco_pct'
+LINHAS_AMOSTRA = 15
 
-df_novos = load_and_clean_data(csv_filepath, separator=',')
 
-if df_novos is None:
-    print(f"ERRO: Falha ao carregar os dados de '{csv_filepath}'.")
-    sys.exit()
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pipeline de análise e detecção de risco (RPA + IA).")
+    parser.add_argument('--streaming', action='store_true',
+                        help="Processa a entrada em blocos de tamanho fixo, com memória limitada.")
+    parser.add_argument('--chunksize', type=int, default=100_000,
+                        help="Linhas por bloco no modo streaming ou paralelo (padrão: 100000).")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Número de processos para pontuar os blocos em paralelo (padrão: 1, modo serial).")
+    parser.add_argument('--inferencia', choices=['auto', 'numpy', 'sklearn'], default='auto',
+                        help="'numpy' usa o modelo fundido (modelo_risco_fundido.npz); 'sklearn' usa o Pipeline; "
+                             "'auto' usa o fundido quando ele existir (padrão).")
+    parser.add_argument('--top-n', type=int, default=None,
+                        help="Mantém no relatório apenas os N produtos de maior risco.")
+    parser.add_argument('--sem-cache', action='store_true',
+                        help="Ignora o cache colunar e processa o CSV de entrada do zero.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Reaproveita as pontuações da execução anterior; só anúncios novos ou alterados vão ao modelo.")
+    parser.add_argument('--sem-agregados', action='store_true',
+                        help=f"Não grava o banco de agregados do dashboard ({BANCO_RELATORIO}).")
+    parser.add_argument('--sem-banco', action='store_true',
+                        help=f"Não registra a execução no banco de resultados ({BANCO_RESULTADOS}).")
+    parser.add_argument('--reter-dias', type=float, default=None,
+                        help="Remove do banco de resultados as execuções iniciadas há mais de N dias (padrão: mantém todas).")
+    parser.add_argument('--sem-vendedores', action='store_true',
+                        help=f"Não soma esta execução ao índice de risco por vendedor ({BANCO_VENDEDORES}).")
+    parser.add_argument('--formato', choices=list(FORMATOS), default='csv',
+                        help="Formato do relatório: csv (padrão, compatível com planilhas), csv.gz (comprimido em "
+                             "blocos paralelos), parquet ou feather (colunares, mais rápidos e menores).")
+    parser.add_argument('--precos-fixos', action='store_true',
+                        help="Usa o avg_price_map.pkl do treino no lugar da referência de preços incremental "
+                             "e não a atualiza com esta coleta.")
+    parser.add_argument('--clusters', action='store_true',
+                        help=f"Agrupa anúncios quase duplicados pelo título (índice persistente em {ARQUIVO_CLUSTERS}) "
+                             "e acrescenta ao relatório o cluster e o preço médio dele.")
+    parser.add_argument('--silencioso', action='store_true',
+                        help="Desliga as mensagens de diagnóstico das etapas (df.info(), amostras, progresso por bloco).")
+    parser.add_argument('--metricas', nargs='?', const=ARQUIVO_METRICAS, default=None, metavar='ARQUIVO',
+                        help=f"Grava tempo, linhas e memória de cada etapa em JSON lines (padrão: {ARQUIVO_METRICAS}).")
+    parser.add_argument('--perfil', action='store_true',
+                        help="Perfila cada etapa com cProfile; os arquivos .prof ficam na pasta 'perfis'.")
+    return parser.parse_args()
 
-# 3. Aplicação da Camada de IA
-print("Aplicando enriquecimento e engenharia de features...")
-df_enriquecido = enrich_data(df_novos.copy())
-df_com_features = create_features(df_enriquecido, avg_price_map)
 
-# Preparar dados para o modelo
-X_para_prever = df_com_features[features_list].fillna(0)
+def carregar_artefatos(inferencia='auto', referencia=None):
+    """Carrega o modelo treinado e os artefatos auxiliares.
 
-print("\nAplicando modelo de IA para classificação e risco...")
+    Fora do modo sklearn, usa o pacote de artefatos (um único .npz, sem pickle) quando ele
+    existir; senão, os arquivos separados do treino. Com a referência de preços incremental,
+    o mapa de preços vem dela e não do treino.
+    """
+    if inferencia != 'sklearn' and os.path.exists(ARQUIVO_PACOTE):
+        try:
+            modelo_ia, avg_price_map, features_list, manifesto = carregar_pacote(ARQUIVO_PACOTE)
+        except (ValueError, KeyError) as e:
+            print(f"ERRO: Pacote '{ARQUIVO_PACOTE}' inválido ({e}). Execute o script 'treinar_modelo.py' novamente.")
+            sys.exit()
+        if referencia is not None:
+            avg_price_map = referencia.mapa()
+        print(f"Modelo de IA e artefatos carregados de '{ARQUIVO_PACOTE}' "
+              f"(versão {manifesto['versao']}, inferência: NumPy (modelo fundido)).")
+        return modelo_ia, avg_price_map, features_list
 
-# Aplicar modelo para classificação (0 ou 1)
-df_final = df_com_features.copy()
-df_final['classificacao_ia'] = modelo_ia.predict(X_para_prever)
+    import joblib
+    if inferencia == 'numpy' and not os.path.exists(ARQUIVO_MODELO_FUNDIDO):
+        print(f"ERRO: Arquivo '{ARQUIVO_MODELO_FUNDIDO}' não encontrado. Execute o script 'treinar_modelo.py' novamente.")
+        sys.exit()
+    try:
+        modelo_ia = carregar_modelo(ARQUIVOS_MODELO[0], usar_fundido=inferencia != 'sklearn')
+        features_list = joblib.load(ARQUIVOS_MODELO[2])
+        avg_price_map = referencia.mapa() if referencia is not None else joblib.load(ARQUIVOS_MODELO[1])
+        if isinstance(modelo_ia, ModeloFundido) and modelo_ia.features != list(features_list):
+            print(f"ERRO: '{ARQUIVO_MODELO_FUNDIDO}' não corresponde a 'features_list.pkl'. Execute o script 'treinar_modelo.py' novamente.")
+            sys.exit()
+        tipo = 'NumPy (modelo fundido)' if isinstance(modelo_ia, ModeloFundido) else 'sklearn'
+        print(f"Modelo de IA e artefatos carregados com sucesso (inferência: {tipo}).")
+    except FileNotFoundError:
+        print("ERRO: Arquivos 'modelo_risco.pkl', 'avg_price_map.pkl' ou 'features_list.pkl' não encontrados.")
+        print("Por favor, execute o script '1_treinar_modelo.py' primeiro.")
+        sys.exit()
+    return modelo_ia, avg_price_map, features_list
 
-# Aplicar modelo para probabilidade (Indicador de Risco)
-probabilidades_risco = modelo_ia.predict_proba(X_para_prever)[:, 1]
-df_final['indicador_de_risco_pct'] = (probabilidades_risco * 100).round(2)
 
-print("Análise de risco concluída.")
+def carregar_referencia(args):
+    """Referência de preços incremental, ou None com --precos-fixos ou se ela ainda não existir."""
+    if args.precos_fixos or not os.path.exists(ARQUIVO_REFERENCIA):
+        return None
+    try:
+        referencia = ReferenciaPrecos.carregar(ARQUIVO_REFERENCIA)
+    except Exception as e:
+        print(f"Aviso: não foi possível ler '{ARQUIVO_REFERENCIA}' ({e}); usando o avg_price_map.pkl do treino.")
+        return None
+    print(f"Preços de referência lidos de: {ARQUIVO_REFERENCIA}")
+    return referencia
 
-# Mapear classificação para o relatório
-mapa_risco = {0: 'Original/Legítimo', 1: 'Suspeito'}
-df_final['classificacao_ia'] = df_final['classificacao_ia'].map(mapa_risco)
 
-# 4. Geração de Relatórios
-colunas_relatorio = [
-    'titulo', 'preco', 'compatibilidade', 'modelo_cartucho', 
-    'classificacao_ia', 'indicador_de_risco_pct'
-]
-colunas_existentes = [col for col in colunas_relatorio if col in df_final.columns]
-df_relatorio_final = df_final[colunas_existentes].sort_values(by='indicador_de_risco_pct', ascending=False)
+def salvar_referencia(referencia, incorporados):
+    """Grava a referência de preços atualizada com os anúncios desta coleta."""
+    try:
+        referencia.salvar(ARQUIVO_REFERENCIA)
+        print(f"Referência de preços atualizada com {incorporados} anúncios 'Original': {ARQUIVO_REFERENCIA}")
+    except Exception as e:
+        print(f"Erro ao gravar a referência de preços: {e}")
 
-# 4a. Salvar Relatório em CSV
-try:
-    csv_filename = 'relatorio_final_com_risco.csv'
-    df_relatorio_final.to_csv(csv_filename, index=False, sep=';', encoding='utf-8-sig')
-    print(f"\nRelatório final salvo com sucesso em: {csv_filename}")
-except Exception as e:
-    print(f"\nErro ao salvar o CSV final: {e}")
 
-# 4b. Gerar Gráficos de Visualização
-try:
-    setup_visual_style()
-    generate_visualizations(df_final) 
-    print("Gráficos de visualização atualizados.")
-except Exception as e:
-    print(f"Erro ao gerar visualizações: {e}")
+def carregar_dicionario_ids(args):
+    """Dicionário persistente de anúncios e vendedores, ou None quando a URL não é lida."""
+    if not precisa_url(args):
+        return None
+    try:
+        return carregar_identificadores(ARQUIVO_IDENTIFICADORES)
+    except Exception as e:
+        # Um dicionário novo renumeraria os anúncios: nesta execução a URL é mantida sem códigos
+        print(f"Aviso: não foi possível ler '{ARQUIVO_IDENTIFICADORES}' ({e}); os anúncios não serão codificados.")
+        return None
+
+
+def salvar_dicionario_ids(identificadores):
+    """Grava o dicionário com os anúncios e vendedores vistos pela primeira vez nesta coleta."""
+    try:
+        identificadores.salvar(ARQUIVO_IDENTIFICADORES)
+        print(f"Dicionário de identificadores atualizado ({len(identificadores.anuncios)} anúncios, "
+              f"{len(identificadores.vendedores)} vendedores): {ARQUIVO_IDENTIFICADORES}")
+    except Exception as e:
+        print(f"Erro ao gravar o dicionário de identificadores: {e}")
+
+
+def arquivos_do_modelo(modelo_ia):
+    """Arquivos de onde o modelo foi carregado: o pacote de artefatos ou os arquivos separados."""
+    # O pacote tem prioridade sempre que a inferência é NumPy (ver carregar_artefatos)
+    if isinstance(modelo_ia, ModeloFundido) and os.path.exists(ARQUIVO_PACOTE):
+        return [ARQUIVO_PACOTE]
+    return ARQUIVOS_MODELO + ([ARQUIVO_MODELO_FUNDIDO] if isinstance(modelo_ia, ModeloFundido) else [])
+
+
+def blocos_pontuados(modelo_ia, avg_price_map, features_list, chunksize, workers=1, manter_url=True,
+                     identificadores=None):
+    """Iterador dos blocos pontuados da entrada, em série ou distribuídos entre processos.
+
+    Nos dois casos os blocos saem na ordem original do arquivo. Com `identificadores`, a URL
+    de cada bloco é trocada pelos códigos do dicionário (no processo principal, que é o dono
+    dele). Retorna None se a entrada não existir.
+    """
+    if workers > 1:
+        print(f"Pontuando em paralelo com {workers} processos.")
+        usar_fundido = isinstance(modelo_ia, ModeloFundido)
+        blocos = iter_pontuar_paralelo(CSV_ENTRADA, ',', chunksize, workers, arquivos_do_modelo(modelo_ia), usar_fundido,
+                                       avg_price_map, manter_url)
+        if blocos is None or identificadores is None:
+            return blocos
+        return (identificadores.internar(bloco) for bloco in blocos)
+
+    blocos = iter_load_and_clean_data(CSV_ENTRADA, separator=',', chunksize=chunksize, manter_url=manter_url)
+    if blocos is None:
+        return None
+    if identificadores is not None:
+        blocos = (identificadores.internar(bloco) for bloco in blocos)
+    return (score_data(bloco, modelo_ia, avg_price_map, features_list) for bloco in blocos)
+
+
+def executar_completo(modelo_ia, avg_price_map, features_list, args, referencia=None):
+    """Modo padrão: carrega toda a base em memória, pontua e ordena o relatório."""
+    # 2. Carregamento dos Dados (Simulação de RPA)
+    print(f"Carregando dados 'novos' de: {CSV_ENTRADA}")
+    print("Aplicando enriquecimento e engenharia de features...")
+    identificadores = carregar_dicionario_ids(args)
+
+    if args.workers > 1:
+        # Leitura, limpeza e pontuação feitas pelos workers, bloco a bloco
+        blocos = blocos_pontuados(modelo_ia, avg_price_map, features_list, args.chunksize, args.workers, precisa_url(args),
+                                  identificadores)
+        if blocos is None:
+            print(f"ERRO: Falha ao carregar os dados de '{CSV_ENTRADA}'.")
+            sys.exit()
+        lista_blocos = list(blocos)
+        if not lista_blocos:
+            print("Nenhum produto válido encontrado na entrada.")
+            sys.exit()
+        df_final = pd.concat(lista_blocos)
+        precos_invalidos = sum(bloco.attrs.get('precos_invalidos', 0) for bloco in lista_blocos)
+        if precos_invalidos:
+            print(f"Aviso: {precos_invalidos} preços não puderam ser convertidos e foram descartados.")
+    else:
+        # No modo incremental o enriquecimento é feito só para os anúncios novos ou alterados;
+        # com --clusters, os atributos do título vêm do índice de clusters
+        indice_titulos = carregar_indice() if args.clusters else None
+        df_novos = carregar_dados(CSV_ENTRADA, separator=',', enriquecer=not args.incremental and indice_titulos is None,
+                                  usar_cache=not args.sem_cache, manter_url=precisa_url(args))
+
+        if df_novos is None:
+            print(f"ERRO: Falha ao carregar os dados de '{CSV_ENTRADA}'.")
+            sys.exit()
+        if identificadores is not None:
+            df_novos = identificadores.internar(df_novos)
+        if indice_titulos is not None:
+            df_novos = enrich_data(df_novos, indice_titulos)
+
+        # 3. Aplicação da Camada de IA
+        print("\nAplicando modelo de IA para classificação e risco...")
+        if args.incremental:
+            versao = versao_modelo(arquivos_do_modelo(modelo_ia))
+            df_final = pontuar_incremental(df_novos, modelo_ia, avg_price_map, features_list, versao)
+        else:
+            df_final = score_data(df_novos, modelo_ia, avg_price_map, features_list, enriquecer=False)
+    print("Análise de risco concluída.")
+    if identificadores is not None:
+        salvar_dicionario_ids(identificadores)
+
+    # A coleta foi pontuada com os preços de referência anteriores; agora ela entra na referência
+    if referencia is not None:
+        salvar_referencia(referencia, referencia.atualizar(df_final))
+
+    if args.clusters:
+        atualizar_clusters(indice_titulos, df_final)
+
+    if not args.sem_banco:
+        try:
+            with medir_etapa('gravacao_banco', len(df_final)) as etapa, abrir_gravador(args) as gravador:
+                gravador.inserir(df_final)
+                etapa.linhas_saida = gravador.total
+            print(f"Execução {gravador.execucao_id} registrada no banco de resultados: {BANCO_RESULTADOS}")
+        except Exception as e:
+            print(f"Erro ao gravar o banco de resultados: {e}")
+
+    if not args.sem_vendedores:
+        vendedores = AtualizadorVendedores(BANCO_VENDEDORES)
+        vendedores.acrescentar(df_final)
+        gravar_vendedores(vendedores)
+
+    # 4. Geração de Relatórios
+    colunas_existentes = [col for col in COLUNAS_RELATORIO + COLUNAS_CLUSTER if col in df_final.columns]
+    df_relatorio_final = df_final[colunas_existentes].sort_values(by=COLUNA_RISCO, ascending=False, kind='stable')
+    if args.top_n is not None:
+        df_relatorio_final = df_relatorio_final.head(args.top_n)
+
+    # 4a. Salvar Relatório (CSV por padrão)
+    caminho_saida = caminho_relatorio(args.formato)
+    try:
+        with medir_etapa('escrita_relatorio', len(df_relatorio_final)) as etapa:
+            etapa.linhas_saida = escrever_relatorio(df_relatorio_final, caminho_saida)
+        print(f"\nRelatório final salvo com sucesso em: {caminho_saida}")
+    except Exception as e:
+        print(f"\nErro ao salvar o relatório final: {e}")
+
+    if not args.sem_agregados:
+        atualizar_agregados([df_relatorio_final], caminho_saida)
+
+    # 4b. Gerar Gráficos de Visualização
+    try:
+        setup_visual_style()
+        generate_visualizations(df_final)
+        print("Gráficos de visualização atualizados.")
+    except Exception as e:
+        print(f"Erro ao gerar visualizações: {e}")
+
+    return df_relatorio_final.head(LINHAS_AMOSTRA)
+
+
+def atualizar_clusters(indice_titulos, df_final):
+    """Registra os preços da coleta nos clusters, acrescenta as colunas de cluster e grava o índice."""
+    clusters = df_final['cluster_titulo'].to_numpy()
+    indice_titulos.atualizar_precos(clusters, df_final['preco'], chaves_anuncio(df_final))
+    preco_medio = indice_titulos.preco_medio(clusters)
+    df_final['anuncios_cluster'] = indice_titulos.anuncios[clusters]
+    df_final['preco_medio_cluster'] = preco_medio.round(2)
+    df_final['razao_preco_cluster'] = (df_final['preco'].to_numpy() / preco_medio).round(3)
+    try:
+        indice_titulos.salvar(ARQUIVO_CLUSTERS)
+        print(f"Índice de clusters atualizado: {df_final['cluster_titulo'].nunique()} clusters nesta coleta, "
+              f"{len(indice_titulos)} no total ({ARQUIVO_CLUSTERS}).")
+    except Exception as e:
+        print(f"Erro ao gravar o índice de clusters: {e}")
+
+
+def gravar_vendedores(vendedores):
+    """Soma os anúncios acumulados da execução ao índice de risco por vendedor."""
+    try:
+        with medir_etapa('indice_vendedores') as etapa:
+            etapa.linhas_saida = vendedores.gravar()
+        print(f"Índice de vendedores atualizado ({etapa.linhas_saida} vendedores nesta execução): {BANCO_VENDEDORES}")
+    except Exception as e:
+        print(f"Erro ao atualizar o índice de vendedores: {e}")
+
+
+def precisa_url(args):
+    """A URL do anúncio só é lida quando identifica o anúncio no banco de resultados, no histórico
+    incremental, no índice de vendedores ou no índice de clusters."""
+    return args.incremental or args.clusters or not args.sem_banco or not args.sem_vendedores
+
+
+def abrir_gravador(args):
+    """Registro da execução no banco de resultados, identificando a entrada e o modo usado."""
+    if args.streaming:
+        modo = 'streaming'
+    elif args.workers > 1:
+        modo = 'paralelo'
+    else:
+        modo = 'incremental' if args.incremental else 'completo'
+    return GravadorExecucao(BANCO_RESULTADOS, origem=CSV_ENTRADA, modo=modo, reter_dias=args.reter_dias)
+
+
+def atualizar_agregados(blocos_relatorio, caminho_relatorio_final):
+    """Grava o banco de agregados do dashboard a partir dos blocos do relatório ordenado."""
+    try:
+        with medir_etapa('agregados_dashboard') as etapa:
+            etapa.linhas_saida = gravar_agregados(blocos_relatorio, BANCO_RELATORIO, origem=caminho_relatorio_final)
+        print(f"Agregados do dashboard salvos em: {BANCO_RELATORIO}")
+    except Exception as e:
+        print(f"Erro ao gravar os agregados do dashboard: {e}")
+
+
+def _ler_run(caminho):
+    """Lê as linhas de um bloco já ordenado gravado em disco."""
+    with open(caminho, newline='', encoding='utf-8') as f:
+        yield from csv.reader(f, delimiter=';')
+
+
+def executar_streaming(modelo_ia, avg_price_map, features_list, args, referencia=None):
+    """Modo streaming: pontua a base bloco a bloco, com memória limitada ao tamanho do bloco.
+
+    Cada bloco pontuado é ordenado e gravado em um arquivo temporário (run). A ordenação
+    global do relatório vem de uma intercalação externa (heapq.merge) desses arquivos.
+    Com --top-n, apenas um heap limitado aos N maiores riscos é mantido em memória.
+    """
+    top_n = args.top_n
+    print(f"Carregando dados 'novos' de: {CSV_ENTRADA} (modo streaming, blocos de {args.chunksize} linhas)")
+    identificadores = carregar_dicionario_ids(args)
+    blocos = blocos_pontuados(modelo_ia, avg_price_map, features_list, args.chunksize, args.workers, precisa_url(args),
+                              identificadores)
+
+    if blocos is None:
+        print(f"ERRO: Falha ao carregar os dados de '{CSV_ENTRADA}'.")
+        sys.exit()
+
+    colunas_existentes = None
+    total_linhas = 0
+    precos_invalidos = 0
+    heap_top = []  # (risco, -posição, linha) dos N maiores riscos
+    incorporados = 0
+    inicio_coleta = time.time()  # Todos os blocos entram na referência de preços com o mesmo instante
+
+    # Com o banco de resultados, cada bloco é inserido na mesma transação da execução
+    gravador = abrir_gravador(args) if not args.sem_banco else contextlib.nullcontext()
+    # O índice de vendedores acumula um registro por vendedor e é gravado uma vez, ao final
+    vendedores = AtualizadorVendedores(BANCO_VENDEDORES) if not args.sem_vendedores else None
+
+    with tempfile.TemporaryDirectory(prefix='runs_relatorio_', dir='.') as pasta_runs, gravador:
+        runs = []
+        for numero_bloco, df_final in enumerate(blocos):
+            precos_invalidos += df_final.attrs.get('precos_invalidos', 0)
+            if referencia is not None:
+                incorporados += referencia.atualizar(df_final, agora=inicio_coleta)
+            if not args.sem_banco:
+                with medir_etapa('gravacao_banco', len(df_final)) as etapa:
+                    gravador.inserir(df_final)
+                    etapa.linhas_saida = len(df_final)
+            if vendedores is not None:
+                vendedores.acrescentar(df_final)
+            if colunas_existentes is None:
+                colunas_existentes = [col for col in COLUNAS_RELATORIO if col in df_final.columns]
+                colunas_numericas = [col for col in colunas_existentes if pd.api.types.is_numeric_dtype(df_final[col])]
+            df_bloco = df_final[colunas_existentes]
+
+            if top_n is not None:
+                riscos = df_bloco[COLUNA_RISCO].to_numpy()
+                for posicao, (risco, linha) in enumerate(zip(riscos, df_bloco.itertuples(index=False)), start=total_linhas):
+                    item = (risco, -posicao, tuple(linha))
+                    if len(heap_top) < top_n:
+                        heapq.heappush(heap_top, item)
+                    elif item > heap_top[0]:
+                        heapq.heapreplace(heap_top, item)
+            else:
+                caminho_run = os.path.join(pasta_runs, f'run_{numero_bloco:06d}.csv')
+                with medir_etapa('escrita_run', len(df_bloco)) as etapa:
+                    df_bloco.sort_values(by=COLUNA_RISCO, ascending=False, kind='stable').to_csv(
+                        caminho_run, index=False, header=False, sep=';', encoding='utf-8'
+                    )
+                    etapa.linhas_saida = len(df_bloco)
+                runs.append(caminho_run)
+
+            total_linhas += len(df_bloco)
+            log(f"Bloco {numero_bloco + 1} pontuado ({total_linhas} produtos até agora).")
+
+        if colunas_existentes is None:
+            print("Nenhum produto válido encontrado na entrada.")
+            return pd.DataFrame(columns=COLUNAS_RELATORIO)
+
+        if precos_invalidos:
+            print(f"Aviso: {precos_invalidos} preços não puderam ser convertidos e foram descartados.")
+        print("Análise de risco concluída.")
+        if identificadores is not None:
+            salvar_dicionario_ids(identificadores)
+        if referencia is not None:
+            salvar_referencia(referencia, incorporados)
+        if vendedores is not None:
+            gravar_vendedores(vendedores)
+
+        # 4a. Salvar Relatório (CSV por padrão)
+        caminho_saida = caminho_relatorio(args.formato)
+        try:
+            with medir_etapa('escrita_relatorio', total_linhas) as etapa:
+                etapa.linhas_saida = _escrever_relatorio_streaming(colunas_existentes, colunas_numericas, runs,
+                                                                   heap_top, top_n, caminho_saida)
+            print(f"\nRelatório final salvo com sucesso em: {caminho_saida}")
+        except Exception as e:
+            print(f"\nErro ao salvar o relatório final: {e}")
+
+    if not args.sem_agregados:
+        # O relatório já está ordenado em disco: os agregados são montados lendo-o em blocos
+        atualizar_agregados(ler_relatorio(caminho_saida, chunksize=args.chunksize), caminho_saida)
+
+    print("Gráficos de visualização não são gerados no modo streaming.")
+    return ler_relatorio(caminho_saida, nrows=LINHAS_AMOSTRA)
+
+
+def _escrever_relatorio_streaming(colunas_existentes, colunas_numericas, runs, heap_top, top_n, caminho_saida):
+    """Grava o relatório a partir do heap dos N maiores riscos ou da intercalação dos runs."""
+    if top_n is not None:
+        df_top = pd.DataFrame([linha for _, _, linha in sorted(heap_top, reverse=True)], columns=colunas_existentes)
+        return escrever_relatorio(df_top, caminho_saida)
+
+    indice_risco = colunas_existentes.index(COLUNA_RISCO)
+    with EscritorRelatorio(caminho_saida, colunas_existentes, colunas_numericas) as escritor:
+        # heapq.merge é estável: empates mantêm a ordem original das linhas
+        escritor.escrever_linhas(heapq.merge(
+            *(_ler_run(caminho) for caminho in runs),
+            key=lambda linha: -float(linha[indice_risco])
+        ))
+    return escritor.linhas
+
+
+def main():
+    args = parse_args()
+    instrumentacao.configurar(silencioso=args.silencioso, arquivo_metricas=args.metricas, perfil=args.perfil)
+
+    print("--- Iniciando Pipeline de Análise e Detecção ---")
+
+    # 1. Carregamento do Modelo de IA
+    referencia = carregar_referencia(args)
+    modelo_ia, avg_price_map, features_list = carregar_artefatos(args.inferencia, referencia)
+    if referencia is not None and os.path.exists(CSV_ENTRADA):
+        # A coleta entra na referência uma única vez: reprocessar o mesmo arquivo não a altera
+        entrada = hash_arquivo(CSV_ENTRADA, ',')
+        if referencia.incorporada(entrada):
+            print("Esta coleta já foi incorporada à referência de preços; a referência não será atualizada.")
+            referencia = None
+        else:
+            referencia.registrar_entrada(entrada)
+
+    if args.incremental and (args.streaming or args.workers > 1):
+        print("ERRO: o modo --incremental não pode ser usado com --streaming ou --workers.")
+        sys.exit()
+    if args.clusters and (args.streaming or args.workers > 1 or args.incremental):
+        print("ERRO: o modo --clusters não pode ser usado com --streaming, --workers ou --incremental.")
+        sys.exit()
+
+    if args.streaming:
+        df_amostra = executar_streaming(modelo_ia, avg_price_map, features_list, args, referencia)
+    else:
+        df_amostra = executar_completo(modelo_ia, avg_price_map, features_list, args, referencia)
+
+    # 5. Exibição de Amostra
+    print("\n--- Amostra do Relatório de Risco (Maiores Riscos) ---")
+    print(df_amostra.to_string())
+
+    # 6. Tempo gasto em cada etapa
+    if args.metricas or args.perfil:
+        print("\n--- Tempo por Etapa ---")
+        print(instrumentacao.resumo().to_string())
+        if args.metricas:
+            print(f"Métricas detalhadas gravadas em: {args.metricas}")
+        if args.perfil:
+            print(f"Perfis cProfile gravados em: {instrumentacao.PASTA_PERFIS}/ (ex: python -m pstats <arquivo>.prof)")
+
+    print("\nPipeline RPA + IA concluído com sucesso!")
 
-# 5. Exibição de Amostra
-print("\n--- Amostra do Relatório de Risco (Maiores Riscos) ---")
-print(df_relatorio_final.head(15).to_string())
 
-print("\nPipeline RPA + IA concluído com sucesso!")
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,342 @@
+# --- MÓDULO: banco_resultados.py ---
+# Banco local (SQLite) com os anúncios pontuados de todas as execuções.
+#
+# O relatório CSV é sobrescrito a cada execução e precisa ser lido inteiro para qualquer
+# filtro. Aqui cada execução do analise.py é registrada em `execucoes` e seus anúncios são
+# inseridos em lote em `anuncios_pontuados`, com índices por risco, classificação, modelo
+# do cartucho e vendedor. Consultas como "cartuchos 664 suspeitos de vendedores com
+# reputação vermelha na última semana" viram buscas por índice, e duas execuções podem
+# ser comparadas pela chave do anúncio.
+#
+# Uso:
+#   python banco_resultados.py execucoes
+#   python banco_resultados.py consultar --modelo 664 --reputacao vermelho --classe Suspeito --dias 7
+#   python banco_resultados.py comparar [--anterior ID] [--atual ID]
+#   python banco_resultados.py limpar --manter 10
+#   python banco_resultados.py limpar --reter-dias 90
+#
+# Nenhuma execução é removida automaticamente: a limpeza é pelo comando limpar ou, no
+# analise.py, pela opção --reter-dias.
+
+import argparse
+import sqlite3
+import time
+from contextlib import closing
+
+import pandas as pd
+
+from funcoes_analise import chave_anuncio, chave_do_id
+
+BANCO_RESULTADOS = 'resultados_risco.db'
+
+COLUNAS_ANUNCIO = [
+    'chave_anuncio', 'titulo', 'preco', 'compatibilidade', 'modelo_cartucho', 'nome_vendedor',
+    'reputacao_cor', 'avaliacao_numero', 'classificacao_ia', 'indicador_de_risco_pct'
+]
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS execucoes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    iniciada_em TEXT NOT NULL,
+    concluida_em TEXT,
+    origem TEXT,
+    modo TEXT,
+    total_anuncios INTEGER,
+    total_suspeitos INTEGER,
+    risco_medio REAL
+);
+CREATE TABLE IF NOT EXISTS anuncios_pontuados (
+    execucao_id INTEGER NOT NULL REFERENCES execucoes (id),
+    chave_anuncio TEXT,
+    titulo TEXT,
+    preco REAL,
+    compatibilidade TEXT,
+    modelo_cartucho TEXT,
+    nome_vendedor TEXT COLLATE NOCASE,
+    reputacao_cor TEXT COLLATE NOCASE,
+    avaliacao_numero INTEGER,
+    classificacao_ia TEXT,
+    indicador_de_risco_pct REAL
+);
+CREATE INDEX IF NOT EXISTS idx_anuncios_execucao_risco ON anuncios_pontuados (execucao_id, indicador_de_risco_pct);
+CREATE INDEX IF NOT EXISTS idx_anuncios_classe_risco ON anuncios_pontuados (classificacao_ia, indicador_de_risco_pct);
+CREATE INDEX IF NOT EXISTS idx_anuncios_modelo_risco ON anuncios_pontuados (modelo_cartucho, indicador_de_risco_pct);
+CREATE INDEX IF NOT EXISTS idx_anuncios_vendedor ON anuncios_pontuados (nome_vendedor);
+CREATE INDEX IF NOT EXISTS idx_anuncios_chave ON anuncios_pontuados (chave_anuncio, execucao_id);
+"""
+
+
+def conectar(caminho=BANCO_RESULTADOS):
+    conexao = sqlite3.connect(caminho)
+    conexao.execute('PRAGMA journal_mode = WAL')
+    conexao.execute('PRAGMA synchronous = NORMAL')
+    # Cache de páginas maior: as inserções em lote atualizam vários índices ao mesmo tempo
+    conexao.execute('PRAGMA cache_size = -262144')
+    conexao.executescript(ESQUEMA)
+    return conexao
+
+
+class GravadorExecucao:
+    """Registra uma execução e insere seus anúncios em lote, em uma única transação.
+
+    Uso:
+        with GravadorExecucao(origem='dataset.csv', modo='completo') as gravador:
+            gravador.inserir(df_pontuado)
+
+    Se ocorrer um erro antes do fim do bloco, nada da execução fica gravado. Com reter_dias,
+    as execuções iniciadas há mais de N dias são removidas na mesma transação.
+    """
+
+    def __init__(self, caminho=BANCO_RESULTADOS, origem=None, modo=None, reter_dias=None):
+        self.caminho = caminho
+        self.origem = origem
+        self.modo = modo
+        self.reter_dias = reter_dias
+        self.conexao = None
+        self.execucao_id = None
+        self.total = 0
+        self.suspeitos = 0
+        self.soma_risco = 0.0
+
+    def __enter__(self):
+        self.conexao = conectar(self.caminho)
+        cursor = self.conexao.execute(
+            'INSERT INTO execucoes (iniciada_em, origem, modo) VALUES (?, ?, ?)',
+            (time.strftime('%Y-%m-%d %H:%M:%S'), self.origem, self.modo)
+        )
+        self.execucao_id = cursor.lastrowid
+        return self
+
+    def inserir(self, df):
+        """Insere um bloco de anúncios pontuados (colunas ausentes ficam nulas)."""
+        if df.empty:
+            return
+        linhas = pd.DataFrame(index=df.index)
+        linhas['execucao_id'] = self.execucao_id
+        for coluna in COLUNAS_ANUNCIO:
+            if coluna == 'chave_anuncio':
+                if 'id_anuncio' in df.columns:
+                    linhas[coluna] = chave_do_id(df['id_anuncio'])
+                else:
+                    linhas[coluna] = chave_anuncio(df['url_produto']) if 'url_produto' in df.columns else None
+            else:
+                linhas[coluna] = df[coluna] if coluna in df.columns else None
+        linhas = linhas.astype(object).where(linhas.notna(), None)
+        self.conexao.executemany(
+            f'INSERT INTO anuncios_pontuados (execucao_id, {", ".join(COLUNAS_ANUNCIO)}) '
+            f'VALUES ({", ".join("?" * (len(COLUNAS_ANUNCIO) + 1))})',
+            linhas.itertuples(index=False, name=None)
+        )
+        self.total += len(df)
+        self.suspeitos += int((df['classificacao_ia'] == 'Suspeito').sum())
+        self.soma_risco += float(df['indicador_de_risco_pct'].sum())
+
+    def __exit__(self, tipo_erro, erro, rastreamento):
+        try:
+            if tipo_erro is not None:
+                self.conexao.rollback()
+                return False
+            self.conexao.execute(
+                'UPDATE execucoes SET concluida_em = ?, total_anuncios = ?, total_suspeitos = ?, risco_medio = ? WHERE id = ?',
+                (time.strftime('%Y-%m-%d %H:%M:%S'), self.total, self.suspeitos,
+                 self.soma_risco / self.total if self.total else None, self.execucao_id)
+            )
+            if self.reter_dias is not None:
+                _remover_antigas(self.conexao, dias=self.reter_dias)
+            self.conexao.commit()
+        finally:
+            self.conexao.close()
+        return False
+
+
+def _remover_antigas(conexao, manter=None, dias=None):
+    """Remove as execuções além das `manter` mais recentes e as iniciadas há mais de `dias` dias."""
+    antigas = set()
+    if manter is not None:
+        antigas.update(linha[0] for linha in conexao.execute(
+            'SELECT id FROM execucoes ORDER BY id DESC LIMIT -1 OFFSET ?', (manter,)
+        ))
+    if dias is not None:
+        limite_data = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time() - dias * 86400))
+        antigas.update(linha[0] for linha in conexao.execute(
+            'SELECT id FROM execucoes WHERE iniciada_em < ?', (limite_data,)
+        ))
+    for execucao_id in sorted(antigas):
+        conexao.execute('DELETE FROM anuncios_pontuados WHERE execucao_id = ?', (execucao_id,))
+        conexao.execute('DELETE FROM execucoes WHERE id = ?', (execucao_id,))
+    return len(antigas)
+
+
+def remover_execucoes_antigas(manter=None, dias=None, caminho=BANCO_RESULTADOS):
+    # closing fecha a conexão; o with interno da conexão só faz o commit
+    with closing(conectar(caminho)) as conexao:
+        with conexao:
+            removidas = _remover_antigas(conexao, manter, dias)
+        if removidas:
+            conexao.execute('VACUUM')
+    return removidas
+
+
+def historico_execucoes(caminho=BANCO_RESULTADOS):
+    """Resumo de cada execução concluída: anúncios, suspeitos e risco médio."""
+    with closing(conectar(caminho)) as conexao:
+        return pd.read_sql_query(
+            'SELECT id, iniciada_em, concluida_em, origem, modo, total_anuncios, total_suspeitos, risco_medio '
+            'FROM execucoes WHERE concluida_em IS NOT NULL ORDER BY id', conexao
+        )
+
+
+def _ultimas_execucoes(conexao, quantidade):
+    return [linha[0] for linha in conexao.execute(
+        'SELECT id FROM execucoes WHERE concluida_em IS NOT NULL ORDER BY id DESC LIMIT ?', (quantidade,)
+    )]
+
+
+def consultar(caminho=BANCO_RESULTADOS, classificacao=None, modelo_cartucho=None, vendedor=None,
+              reputacoes=None, risco_min=None, dias=None, execucao=None, limite=50):
+    """Anúncios de maior risco que atendem aos filtros.
+
+    Sem `dias` nem `execucao`, consulta a última execução concluída. Com `dias`, consulta
+    as execuções concluídas nesse período (um anúncio pode aparecer uma vez por execução).
+    """
+    with closing(conectar(caminho)) as conexao:
+        condicoes, parametros = [], []
+        if execucao is not None:
+            execucoes = [execucao]
+        elif dias is not None:
+            limite_data = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time() - dias * 86400))
+            execucoes = [linha[0] for linha in conexao.execute(
+                'SELECT id FROM execucoes WHERE concluida_em IS NOT NULL AND iniciada_em >= ?', (limite_data,)
+            )]
+        else:
+            execucoes = _ultimas_execucoes(conexao, 1)
+        if not execucoes:
+            return pd.DataFrame(columns=['execucao_id'] + COLUNAS_ANUNCIO)
+
+        condicoes.append(f'a.execucao_id IN ({", ".join("?" * len(execucoes))})')
+        parametros += execucoes
+        if classificacao is not None:
+            condicoes.append('a.classificacao_ia = ?')
+            parametros.append(classificacao)
+        if modelo_cartucho is not None:
+            condicoes.append('a.modelo_cartucho = ?')
+            parametros.append(str(modelo_cartucho))
+        if vendedor is not None:
+            condicoes.append('a.nome_vendedor = ?')
+            parametros.append(vendedor)
+        if reputacoes:
+            condicoes.append(f'a.reputacao_cor IN ({", ".join("?" * len(reputacoes))})')
+            parametros += list(reputacoes)
+        if risco_min is not None:
+            condicoes.append('a.indicador_de_risco_pct >= ?')
+            parametros.append(risco_min)
+
+        consulta = (f'SELECT a.execucao_id, e.iniciada_em, {", ".join("a." + c for c in COLUNAS_ANUNCIO)} '
+                    f'FROM anuncios_pontuados a JOIN execucoes e ON e.id = a.execucao_id '
+                    f'WHERE {" AND ".join(condicoes)} ORDER BY a.indicador_de_risco_pct DESC LIMIT ?')
+        return pd.read_sql_query(consulta, conexao, params=parametros + [limite])
+
+
+def comparar_execucoes(anterior=None, atual=None, caminho=BANCO_RESULTADOS, limite=20):
+    """Compara duas execuções pela chave do anúncio (padrão: as duas últimas).
+
+    Devolve (resumo, maiores_variacoes): o resumo conta anúncios novos, removidos, mantidos
+    e os que mudaram de classificação; maiores_variacoes lista os anúncios mantidos cujo
+    risco mais variou.
+    """
+    with closing(conectar(caminho)) as conexao:
+        if anterior is None or atual is None:
+            ultimas = _ultimas_execucoes(conexao, 2)
+            if len(ultimas) < 2:
+                return None, None
+            atual, anterior = ultimas
+
+        # Um anúncio repetido na mesma execução é representado pelo maior risco
+        base = ('SELECT chave_anuncio, MAX(titulo) AS titulo, MAX(indicador_de_risco_pct) AS risco, '
+                'MAX(classificacao_ia) AS classificacao FROM anuncios_pontuados '
+                'WHERE execucao_id = ? AND chave_anuncio IS NOT NULL GROUP BY chave_anuncio')
+        conexao.execute('CREATE TEMP TABLE anterior AS ' + base, (anterior,))
+        conexao.execute('CREATE TEMP TABLE atual AS ' + base, (atual,))
+        conexao.execute('CREATE INDEX temp.idx_anterior ON anterior (chave_anuncio)')
+
+        contagens = conexao.execute("""
+            SELECT
+                (SELECT COUNT(*) FROM atual WHERE chave_anuncio NOT IN (SELECT chave_anuncio FROM anterior)),
+                (SELECT COUNT(*) FROM anterior WHERE chave_anuncio NOT IN (SELECT chave_anuncio FROM atual)),
+                (SELECT COUNT(*) FROM atual JOIN anterior USING (chave_anuncio)),
+                (SELECT COUNT(*) FROM atual JOIN anterior USING (chave_anuncio)
+                 WHERE atual.classificacao != anterior.classificacao)
+        """).fetchone()
+        resumo = {
+            'execucao_anterior': anterior, 'execucao_atual': atual,
+            'novos': contagens[0], 'removidos': contagens[1], 'mantidos': contagens[2],
+            'mudaram_classificacao': contagens[3],
+        }
+        variacoes = pd.read_sql_query("""
+            SELECT atual.chave_anuncio, atual.titulo, anterior.risco AS risco_anterior, atual.risco AS risco_atual,
+                   atual.risco - anterior.risco AS variacao, anterior.classificacao AS classificacao_anterior,
+                   atual.classificacao AS classificacao_atual
+            FROM atual JOIN anterior USING (chave_anuncio)
+            WHERE atual.risco != anterior.risco
+            ORDER BY ABS(atual.risco - anterior.risco) DESC LIMIT ?
+        """, conexao, params=(limite,))
+    return resumo, variacoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consultas ao banco de resultados das execuções.")
+    parser.add_argument('--banco', default=BANCO_RESULTADOS)
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    sub.add_parser('execucoes', help="Lista as execuções registradas.")
+
+    consulta = sub.add_parser('consultar', help="Anúncios de maior risco que atendem aos filtros.")
+    consulta.add_argument('--classe', default=None, help="Ex: Suspeito")
+    consulta.add_argument('--modelo', default=None, help="Modelo do cartucho, ex: 664")
+    consulta.add_argument('--vendedor', default=None)
+    consulta.add_argument('--reputacao', nargs='+', default=None, help="Ex: vermelho laranja")
+    consulta.add_argument('--risco-min', type=float, default=None)
+    consulta.add_argument('--dias', type=float, default=None, help="Execuções dos últimos N dias (padrão: só a última).")
+    consulta.add_argument('--execucao', type=int, default=None)
+    consulta.add_argument('--limite', type=int, default=20)
+
+    comparacao = sub.add_parser('comparar', help="Compara duas execuções (padrão: as duas últimas).")
+    comparacao.add_argument('--anterior', type=int, default=None)
+    comparacao.add_argument('--atual', type=int, default=None)
+    comparacao.add_argument('--limite', type=int, default=20)
+
+    limpeza = sub.add_parser('limpar', help="Remove execuções antigas (por quantidade e/ou por idade).")
+    limpeza.add_argument('--manter', type=int, default=None, help="Mantém apenas as N execuções mais recentes.")
+    limpeza.add_argument('--reter-dias', type=float, default=None,
+                         help="Remove as execuções iniciadas há mais de N dias.")
+
+    args = parser.parse_args()
+    pd.set_option('display.width', 200)
+
+    if args.comando == 'execucoes':
+        historico = historico_execucoes(args.banco)
+        print(historico.to_string(index=False) if not historico.empty else "Nenhuma execução registrada.")
+    elif args.comando == 'consultar':
+        resultado = consultar(args.banco, args.classe, args.modelo, args.vendedor, args.reputacao,
+                              args.risco_min, args.dias, args.execucao, args.limite)
+        print(resultado.to_string(index=False) if not resultado.empty else "Nenhum anúncio encontrado.")
+    elif args.comando == 'comparar':
+        resumo, variacoes = comparar_execucoes(args.anterior, args.atual, args.banco, args.limite)
+        if resumo is None:
+            print("São necessárias ao menos duas execuções para comparar.")
+            return
+        print(f"Execução {resumo['execucao_anterior']} -> {resumo['execucao_atual']}: "
+              f"{resumo['novos']} novos, {resumo['removidos']} removidos, {resumo['mantidos']} mantidos, "
+              f"{resumo['mudaram_classificacao']} mudaram de classificação.")
+        if not variacoes.empty:
+            print("\nMaiores variações de risco:")
+            print(variacoes.to_string(index=False))
+    elif args.comando == 'limpar':
+        if args.manter is None and args.reter_dias is None:
+            print("ERRO: Informe --manter e/ou --reter-dias.")
+            return
+        print(f"{remover_execucoes_antigas(args.manter, args.reter_dias, args.banco)} execuções removidas.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,361 @@
+# --- SCRIPT: benchmark.py ---
+# Benchmark do pipeline com dados sintéticos no esquema do robô de coleta.
+#
+# Gera bases sintéticas realistas (preços no formato brasileiro, títulos de cartuchos HP,
+# cores de reputação, avaliações, URLs com parâmetros de rastreamento), mede o tempo e o
+# pico de memória de cada etapa do pipeline e guarda os resultados em
+# benchmarks/resultados.jsonl para comparação entre execuções.
+#
+# Uso:
+#   python benchmark.py --tamanhos 10k 1m
+#   python benchmark.py --tamanhos 10k --memoria --comparar --limiar 0.15
+#   python benchmark.py --tamanhos 10m --gerar-apenas
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import instrumentacao
+from funcoes_analise import load_and_clean_data, enrich_data, create_features, parse_title
+from modelo_fundido import ModeloFundido, ARQUIVO_MODELO_FUNDIDO, carregar_modelo, predict_risk
+
+PASTA_BENCHMARKS = 'benchmarks'
+PASTA_DADOS = os.path.join(PASTA_BENCHMARKS, 'dados')
+ARQUIVO_RESULTADOS = os.path.join(PASTA_BENCHMARKS, 'resultados.jsonl')
+DIFERENCA_MINIMA_S = 0.05 # Variações menores que isso são tratadas como ruído de medição
+ETAPAS = ['load_and_clean_data', 'enrich_data', 'create_features', 'inferencia', 'escrita_relatorio']
+
+FEATURES_LIST = [
+    'preco', 'avaliacao_numero', 'custo_por_pagina', 'feature_compativel', 'feature_preco_anomalo',
+    'feature_custo_pagina_suspeito', 'feature_baixa_reputacao', 'feature_compativel_baixa_rep',
+    'feature_vendedor_ruim'
+]
+
+# Vocabulário usado na geração dos títulos
+MODELOS_HP = ['662', '664', '667', '954', '122', '901', '934', '920', '60', '21', '22', '74', '75']
+PRECO_BASE_MODELO = {'662': 90, '664': 95, '667': 110, '954': 180, '122': 85}
+TIPOS = ['Cartucho', 'Cartucho de Tinta', 'Kit Cartuchos', 'Cartucho Original', 'Tinta', 'Kit 2 Cartuchos']
+CORES = ['Preto', 'Colorido', 'Tricolor', 'Preto e Colorido', 'Ciano', 'Magenta', 'Amarelo', 'Black']
+SUFIXOS = ['', 'Original', 'Compatível', 'Compativel', 'Genérico', 'Remanufaturado', 'Similar', 'Tipo Original']
+EXTRAS = ['', 'Deskjet', 'Ink Advantage', 'Officejet', 'Para Impressora', '2 Unidades', '4 Ml', 'Lacrado']
+CORES_REPUTACAO = ['Verde', 'Verde', 'Verde', 'Amarelo', 'Laranja', 'Vermelho', None]
+STATUS_VENDEDOR = ['MercadoLíder', 'MercadoLíder Gold', 'MercadoLíder Platinum', '+100mil vendas', '+1000 vendas', '']
+
+
+def _gerar_titulos(rng, quantidade):
+    """Gera um conjunto de títulos distintos; os anúncios sorteiam títulos deste conjunto."""
+    titulos, modelos = [], []
+    for _ in range(quantidade):
+        modelo = MODELOS_HP[rng.integers(len(MODELOS_HP))]
+        partes = [TIPOS[rng.integers(len(TIPOS))], 'HP', modelo + ('XL' if rng.random() < 0.25 else '')]
+        partes.append(CORES[rng.integers(len(CORES))])
+        partes.append(SUFIXOS[rng.integers(len(SUFIXOS))])
+        partes.append(EXTRAS[rng.integers(len(EXTRAS))])
+        if rng.random() < 0.15:
+            partes.append(f'{int(rng.choice([120, 190, 300, 360, 480, 600]))} páginas')
+        if rng.random() < 0.05:
+            partes.append('Impressora' if rng.random() < 0.5 else 'Notebook')
+        titulos.append(' '.join(p for p in partes if p))
+        modelos.append(modelo)
+    return np.array(titulos, dtype=object), np.array(modelos, dtype=object)
+
+
+def _formatar_precos(valores):
+    """Formata preços no padrão brasileiro, ex: 1234.5 -> '1.234,50'."""
+    return [f'{v:,.2f}'.replace(',', '_').replace('.', ',').replace('_', '.') for v in valores]
+
+
+def _gerar_bloco(rng, linhas, titulos, modelos, vendedores, inicio_id):
+    idx = rng.integers(len(titulos), size=linhas)
+    titulo = titulos[idx]
+    base = np.array([PRECO_BASE_MODELO.get(m, 150) for m in modelos[idx]], dtype=float)
+    # Maioria dos preços perto da referência; uma fração bem abaixo (candidatos a anômalos)
+    fator = np.where(rng.random(linhas) < 0.1, rng.uniform(0.15, 0.5, linhas), rng.lognormal(0, 0.35, linhas))
+    preco = np.round(base * fator * np.where(rng.random(linhas) < 0.2, 4, 1), 2)
+
+    avaliacoes = np.where(rng.random(linhas) < 0.3, 0, rng.geometric(0.02, linhas))
+    notas = np.round(np.clip(rng.normal(4.5, 0.4, linhas), 1, 5), 1)
+    pct5 = np.round(rng.uniform(50, 95, linhas), 2)
+    pct4 = np.round((100 - pct5) * 0.6, 2)
+    pct_resto = np.round((100 - pct5 - pct4) / 3, 2)
+    sem_reviews = avaliacoes == 0
+
+    ids = np.arange(inicio_id, inicio_id + linhas) + 2_000_000_000
+    urls = [
+        f'https://produto.mercadolivre.com.br/MLB-{i}-cartucho-hp-_JM#is_advertising=true&position={i % 48}'
+        f'&search_layout=grid&type=pad&tracking_id={i:x}-4786-9eef-ad2ba3c589a7&ad_click_id=ZjdkOGMyN2Qt{i:x}'
+        for i in ids
+    ]
+
+    return pd.DataFrame({
+        'nome_produto': titulo,
+        'preco_produto': _formatar_precos(preco),
+        'quantidade_vendida': rng.choice([0, 5, 25, 50, 100, 500, 1000], linhas),
+        'nome_vendedor': vendedores[rng.integers(len(vendedores), size=linhas)],
+        'status_vendedor': np.array(STATUS_VENDEDOR, dtype=object)[rng.integers(len(STATUS_VENDEDOR), size=linhas)],
+        'reputacao_cor': np.array(CORES_REPUTACAO, dtype=object)[rng.integers(len(CORES_REPUTACAO), size=linhas)],
+        'reviews_nota_media': np.where(sem_reviews, 0.0, notas),
+        'reviews_quantidade_total': avaliacoes,
+        'reviews_5_estrelas_pct': np.where(sem_reviews, np.nan, pct5),
+        'reviews_4_estrelas_pct': np.where(sem_reviews, np.nan, pct4),
+        'reviews_3_estrelas_pct': np.where(sem_reviews, np.nan, pct_resto),
+        'reviews_2_estrelas_pct': np.where(sem_reviews, np.nan, pct_resto),
+        'reviews_1_estrelas_pct': np.where(sem_reviews, np.nan, pct_resto),
+        'url_produto': urls,
+    })
+
+
+def gerar_dados_sinteticos(caminho, linhas, semente=42, tamanho_bloco=500_000):
+    """Grava um CSV sintético com `linhas` anúncios no esquema do robô, bloco a bloco."""
+    rng = np.random.default_rng(semente)
+    titulos, modelos = _gerar_titulos(rng, max(200, min(linhas // 20, 50_000)))
+    vendedores = np.array([f'loja_{i:05d}' for i in range(max(50, min(linhas // 50, 100_000)))], dtype=object)
+
+    os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+    with open(caminho + '.tmp', 'w', encoding='utf-8', newline='') as f:
+        for inicio in range(0, linhas, tamanho_bloco):
+            bloco = _gerar_bloco(rng, min(tamanho_bloco, linhas - inicio), titulos, modelos, vendedores, inicio)
+            bloco.to_csv(f, index=False, header=inicio == 0)
+    os.replace(caminho + '.tmp', caminho)
+
+
+def _hash_arquivo(caminho):
+    with open(caminho, 'rb') as f:
+        return hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+
+
+def _modelo_para_benchmark(df_features):
+    """Usa o modelo treinado se existir; senão ajusta um modelo rápido nos dados sintéticos.
+
+    Devolve (modelo, features, descrição). As features são as do próprio modelo (a busca do
+    treino pode escolher um subconjunto de FEATURES_LIST), e a descrição vai para o resultado,
+    para que só execuções com o mesmo modelo sejam comparadas.
+    """
+    if os.path.exists('modelo_risco.pkl') or os.path.exists(ARQUIVO_MODELO_FUNDIDO):
+        modelo = carregar_modelo()
+        if isinstance(modelo, ModeloFundido):
+            caminho, features = ARQUIVO_MODELO_FUNDIDO, list(modelo.features)
+        else:
+            caminho, features = 'modelo_risco.pkl', list(getattr(modelo, 'feature_names_in_', FEATURES_LIST))
+        return modelo, features, {'origem': 'treinado', 'arquivo': caminho, 'hash': _hash_arquivo(caminho),
+                                  'features': features}
+
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    amostra = df_features.head(50_000)
+    y = ((amostra['feature_vendedor_ruim'] == 1) | (amostra['feature_preco_anomalo'] == 1)).astype(int)
+    pipeline = Pipeline([('scaler', StandardScaler()), ('model', LogisticRegression())])
+    pipeline.fit(amostra[FEATURES_LIST], y)
+    return ModeloFundido.from_pipeline(pipeline, FEATURES_LIST), FEATURES_LIST, {'origem': 'sintetico', 'features': FEATURES_LIST}
+
+
+class _Medidor:
+    """Mede tempo de parede e pico de memória (tracemalloc, opcional) de cada etapa.
+
+    Com várias repetições, cada etapa guarda o menor tempo e o maior pico de memória observados.
+    """
+
+    def __init__(self, medir_memoria):
+        self.medir_memoria = medir_memoria
+        self.resultados = {}
+
+    @contextlib.contextmanager
+    def etapa(self, nome):
+        if self.medir_memoria:
+            tracemalloc.start()
+        inicio = time.perf_counter()
+        yield
+        duracao = time.perf_counter() - inicio
+        resultado = self.resultados.setdefault(nome, {'segundos': float('inf')})
+        resultado['segundos'] = round(min(resultado['segundos'], duracao), 4)
+        if self.medir_memoria:
+            _, pico = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            resultado['pico_memoria_mb'] = max(resultado.get('pico_memoria_mb', 0.0), round(pico / 2**20, 1))
+
+    def imprimir(self):
+        for nome, resultado in self.resultados.items():
+            linha = f"  {nome:<22} {resultado['segundos']:8.3f} s"
+            if self.medir_memoria:
+                linha += f"  {resultado['pico_memoria_mb']:10.1f} MB"
+            print(linha)
+        total = sum(r['segundos'] for r in self.resultados.values())
+        print(f"  {'total':<22} {total:8.3f} s")
+
+
+def _executar_pipeline(caminho, medidor):
+    # Cada repetição começa com o cache do parse_title vazio, como uma execução nova do
+    # analise.py; senão as repetições seguintes medem só consultas ao cache
+    parse_title.cache_clear()
+    with medidor.etapa('load_and_clean_data'):
+        df = load_and_clean_data(caminho, separator=',')
+    with medidor.etapa('enrich_data'):
+        df = enrich_data(df)
+
+    avg_price_map = df[df['compatibilidade'] == 'Original'].groupby('modelo_cartucho')['preco'].mean().to_dict()
+    with medidor.etapa('create_features'):
+        df = create_features(df, avg_price_map)
+
+    modelo, features, descricao_modelo = _modelo_para_benchmark(df)
+    with medidor.etapa('inferencia'):
+        classes, probabilidades = predict_risk(modelo, df[features].fillna(0))
+        df['classificacao_ia'] = classes
+        df['indicador_de_risco_pct'] = (np.asarray(probabilidades, dtype=float) * 100).round(2)
+
+    with tempfile.TemporaryDirectory() as pasta_tmp, medidor.etapa('escrita_relatorio'):
+        colunas = ['titulo', 'preco', 'compatibilidade', 'modelo_cartucho', 'classificacao_ia', 'indicador_de_risco_pct']
+        df[colunas].sort_values(by='indicador_de_risco_pct', ascending=False, kind='stable').to_csv(
+            os.path.join(pasta_tmp, 'relatorio.csv'), index=False, sep=';', encoding='utf-8-sig'
+        )
+    return descricao_modelo
+
+
+def executar_benchmark(linhas, semente=42, medir_memoria=False, repeticoes=1):
+    """Executa o pipeline completo sobre a base sintética e devolve os tempos por etapa e o modelo usado."""
+    caminho = os.path.join(PASTA_DADOS, f'sintetico_{linhas}_{semente}.csv')
+    if not os.path.exists(caminho):
+        print(f"Gerando base sintética com {linhas} linhas em '{caminho}'...")
+        gerar_dados_sinteticos(caminho, linhas, semente)
+
+    print(f"\nBenchmark com {linhas} linhas ({repeticoes} repetição(ões), melhor tempo):")
+    medidor = _Medidor(medir_memoria)
+    for _ in range(repeticoes):
+        descricao_modelo = _executar_pipeline(caminho, medidor)
+    print(f"  Modelo: {descricao_modelo['origem']} ({len(descricao_modelo['features'])} features)")
+    medidor.imprimir()
+    return medidor.resultados, descricao_modelo
+
+
+def _versao_codigo():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def salvar_resultado(linhas, etapas, medir_memoria, repeticoes, modelo=None, caminho=ARQUIVO_RESULTADOS):
+    registro = {
+        'data': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'commit': _versao_codigo(),
+        'linhas': linhas,
+        'modelo': modelo,
+        'memoria': medir_memoria,
+        'repeticoes': repeticoes,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'maquina': platform.node(),
+        'etapas': etapas,
+        'pico_rss_mb': _pico_rss_mb(),
+    }
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+    return registro
+
+
+def _pico_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(pico / (2**20 if sys.platform == 'darwin' else 2**10), 1)
+
+
+def carregar_resultados(caminho=ARQUIVO_RESULTADOS):
+    if not os.path.exists(caminho):
+        return []
+    with open(caminho, encoding='utf-8') as f:
+        return [json.loads(linha) for linha in f if linha.strip()]
+
+
+def comparar(atual, anterior, limiar):
+    """Compara duas execuções do mesmo tamanho; devolve as etapas que ficaram mais lentas que o limiar."""
+    regressoes = []
+    print(f"\nComparação com a execução de {anterior['data']} (commit {anterior.get('commit')}), {atual['linhas']} linhas:")
+    for etapa in ETAPAS:
+        if etapa not in atual['etapas'] or etapa not in anterior['etapas']:
+            continue
+        antes = anterior['etapas'][etapa]['segundos']
+        depois = atual['etapas'][etapa]['segundos']
+        variacao = (depois - antes) / antes if antes > 0 else 0.0
+        marcador = ''
+        if variacao > limiar and depois - antes > DIFERENCA_MINIMA_S:
+            marcador = '  <-- REGRESSÃO'
+            regressoes.append(etapa)
+        print(f"  {etapa:<22} {antes:8.3f} s -> {depois:8.3f} s  ({variacao:+.1%}){marcador}")
+    return regressoes
+
+
+def _parse_tamanho(valor):
+    """Converte '10k', '1m', '2.5m' ou '50000' em número de linhas."""
+    valor = valor.strip().lower()
+    multiplicador = {'k': 1_000, 'm': 1_000_000}.get(valor[-1:], 1)
+    if multiplicador > 1:
+        valor = valor[:-1]
+    try:
+        return int(float(valor) * multiplicador)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"tamanho inválido: '{valor}'")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline com dados sintéticos.")
+    parser.add_argument('--tamanhos', nargs='+', type=_parse_tamanho, default=[10_000],
+                        help="Tamanhos das bases (10k, 100k, 1m, 10m ou um número de linhas).")
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--repeticoes', type=int, default=3,
+                        help="Quantas vezes o pipeline é executado; vale o menor tempo de cada etapa (padrão: 3).")
+    parser.add_argument('--memoria', action='store_true',
+                        help="Mede o pico de memória de cada etapa com tracemalloc (deixa as etapas mais lentas).")
+    parser.add_argument('--comparar', action='store_true',
+                        help="Compara com a execução anterior do mesmo tamanho.")
+    parser.add_argument('--limiar', type=float, default=0.10,
+                        help="Aumento relativo de tempo considerado regressão (padrão: 0.10).")
+    parser.add_argument('--gerar-apenas', action='store_true',
+                        help="Apenas gera as bases sintéticas, sem executar o benchmark.")
+    args = parser.parse_args()
+
+    # As mensagens de diagnóstico das funções do pipeline (df.info(), amostras) ficam fora da medição
+    instrumentacao.configurar(silencioso=True)
+
+    regressoes = []
+    for linhas in args.tamanhos:
+        if args.gerar_apenas:
+            caminho = os.path.join(PASTA_DADOS, f'sintetico_{linhas}_{args.semente}.csv')
+            gerar_dados_sinteticos(caminho, linhas, args.semente)
+            print(f"Base sintética salva em: {caminho}")
+            continue
+
+        # tracemalloc deixa as etapas mais lentas, e outro modelo muda a inferência: só compara
+        # execuções medidas do mesmo jeito e com o mesmo modelo
+        resultados_anteriores = carregar_resultados()
+        etapas, modelo = executar_benchmark(linhas, args.semente, args.memoria, args.repeticoes)
+        anteriores = [r for r in resultados_anteriores
+                      if r['linhas'] == linhas and r.get('memoria', False) == args.memoria and r.get('modelo') == modelo]
+        registro = salvar_resultado(linhas, etapas, args.memoria, args.repeticoes, modelo)
+        if args.comparar and anteriores:
+            regressoes += comparar(registro, anteriores[-1], args.limiar)
+
+    if not args.gerar_apenas:
+        print(f"\nResultados registrados em: {ARQUIVO_RESULTADOS}")
+    if regressoes:
+        print(f"ATENÇÃO: regressão de desempenho em: {', '.join(sorted(set(regressoes)))}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
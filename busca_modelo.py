@@ -0,0 +1,215 @@
+# --- MÓDULO: busca_modelo.py ---
+# Busca de hiperparâmetros com validação cruzada estratificada para o treinar_modelo.py.
+#
+# Cada candidato combina uma força de regularização (C), um balanceamento de classes e um
+# subconjunto das features. As features são calculadas uma única vez (matriz X com todas
+# as colunas de FEATURES_LIST); cada worker calcula a média e o desvio de cada fold uma vez
+# e guarda só esses vetores. Como a padronização é feita coluna a coluna, cada tarefa
+# padroniza apenas as colunas do seu candidato e descarta a cópia ao final, então a memória
+# de um worker não cresce com o número de folds. As tarefas (candidato, fold) são
+# distribuídas entre todos os núcleos, dentro de um tempo limite opcional. Quando a matriz
+# está gravada em disco (matriz_features.py), cada worker a abre por memory-map e refaz os
+# folds a partir dos rótulos, em vez de receber uma cópia serializada de X, y e dos folds.
+
+import itertools
+import os
+import random
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+import pandas as pd
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import (
+    average_precision_score,
+    balanced_accuracy_score,
+    f1_score,
+    precision_score,
+    recall_score,
+    roc_auc_score
+)
+from sklearn.model_selection import StratifiedKFold
+
+from matriz_features import abrir_matriz
+
+ARQUIVO_RESULTADOS_BUSCA = 'resultados_busca.csv'
+VALORES_C = [0.01, 0.1, 1.0, 10.0, 100.0]
+PESOS_CLASSE = ['balanced', None]
+METRICAS = ['f1', 'roc_auc', 'average_precision', 'balanced_accuracy', 'precision', 'recall']
+MAX_ITER = 1000
+
+# Matriz de treino, folds e média/desvio de cada fold, carregados uma vez por worker
+_X = None
+_y = None
+_folds = None
+_estatisticas = {}
+
+
+def subconjuntos_features(features):
+    """Subconjuntos avaliados: todas as features, só as binárias e cada feature removida por vez."""
+    subconjuntos = {'todas': list(features)}
+    binarias = [f for f in features if f.startswith('feature_')]
+    if binarias and len(binarias) < len(features):
+        subconjuntos['binarias'] = binarias
+    for feature in features:
+        if len(features) > 1:
+            subconjuntos[f'sem_{feature}'] = [f for f in features if f != feature]
+    return subconjuntos
+
+
+def gerar_candidatos(features, semente=42):
+    """Grade completa de candidatos; a configuração padrão do treino vem primeiro e o resto é embaralhado.
+
+    A ordem aleatória faz com que, se o tempo limite acabar, os candidatos avaliados cubram
+    a grade de forma equilibrada.
+    """
+    subconjuntos = subconjuntos_features(features)
+    candidatos = [
+        {'C': c, 'class_weight': peso, 'subconjunto': nome, 'features': colunas}
+        for (nome, colunas), c, peso in itertools.product(subconjuntos.items(), VALORES_C, PESOS_CLASSE)
+    ]
+    padrao = [c for c in candidatos if c['C'] == 1.0 and c['class_weight'] == 'balanced' and c['subconjunto'] == 'todas']
+    resto = [c for c in candidatos if c not in padrao]
+    random.Random(semente).shuffle(resto)
+    return padrao + resto
+
+
+def _iniciar_worker(X, y, folds):
+    global _X, _y, _folds, _estatisticas
+    _X, _y, _folds, _estatisticas = X, y, folds, {}
+    warnings.filterwarnings('ignore', category=ConvergenceWarning)
+
+
+def _linhas_treino(caminho_matriz, features):
+    """X e y das linhas de treino de uma matriz em disco (fatias do memory-map, sem cópia)."""
+    X, y, cabecalho = abrir_matriz(caminho_matriz, features)
+    corte = cabecalho['linhas_treino'] if cabecalho['linhas_treino'] is not None else cabecalho['linhas']
+    return X[:corte], y[:corte]
+
+
+def _dividir(y, folds, semente):
+    return list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=semente).split(np.zeros(len(y)), y))
+
+
+def _anexar_matriz(caminho_matriz, features, folds, semente):
+    """Inicializador dos workers com a matriz em disco: o custo não depende do tamanho da base."""
+    X, y = _linhas_treino(caminho_matriz, features)
+    _iniciar_worker(X, np.asarray(y, dtype=np.int64), _dividir(y, folds, semente))
+
+
+def _fold_padronizado(numero_fold, colunas):
+    """Treino e teste do fold, só com as colunas do candidato, padronizados com média e desvio
+    do treino (como o StandardScaler).
+
+    O worker guarda só a média e o desvio de cada fold (um vetor por fold); as cópias
+    padronizadas são montadas a cada tarefa e descartadas ao final dela.
+    """
+    treino, teste = _folds[numero_fold]
+    if numero_fold not in _estatisticas:
+        media = _X[treino].mean(axis=0)
+        desvio = _X[treino].std(axis=0)
+        desvio[desvio == 0] = 1.0
+        _estatisticas[numero_fold] = (media, desvio)
+    media, desvio = _estatisticas[numero_fold]
+    media, desvio = media[colunas], desvio[colunas]
+    return (_X[np.ix_(treino, colunas)] - media) / desvio, (_X[np.ix_(teste, colunas)] - media) / desvio
+
+
+def _avaliar(indice_candidato, colunas, C, class_weight, numero_fold):
+    """Ajusta o candidato em um fold e devolve as métricas no fold de teste."""
+    inicio = time.perf_counter()
+    X_treino, X_teste = _fold_padronizado(numero_fold, colunas)
+    treino, teste = _folds[numero_fold]
+    modelo = LogisticRegression(C=C, class_weight=class_weight, random_state=42, max_iter=MAX_ITER)
+    modelo.fit(X_treino, _y[treino])
+    probabilidades = modelo.predict_proba(X_teste)[:, 1]
+    previstos = (probabilidades >= 0.5).astype(int)
+    y_teste = _y[teste]
+    metricas = {
+        'f1': f1_score(y_teste, previstos, zero_division=0),
+        'roc_auc': roc_auc_score(y_teste, probabilidades),
+        'average_precision': average_precision_score(y_teste, probabilidades),
+        'balanced_accuracy': balanced_accuracy_score(y_teste, previstos),
+        'precision': precision_score(y_teste, previstos, zero_division=0),
+        'recall': recall_score(y_teste, previstos, zero_division=0),
+    }
+    return indice_candidato, numero_fold, metricas, time.perf_counter() - inicio
+
+
+def buscar(X, y, features, folds=5, metrica='f1', tempo_limite=None, workers=None, semente=42):
+    """Executa a busca e devolve a tabela de candidatos ordenada pela média da métrica.
+
+    X pode ser a matriz de features ou o caminho de uma matriz gravada por matriz_features
+    (só as linhas de treino são usadas e y é ignorado). Só entram na tabela candidatos com
+    todos os folds avaliados. Com tempo_limite (segundos), as tarefas ainda não iniciadas
+    são canceladas quando o tempo acaba.
+    """
+    if isinstance(X, str):
+        inicializador, argumentos = _anexar_matriz, (X, list(features), folds, semente)
+    else:
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.int64)
+        inicializador, argumentos = _iniciar_worker, (X, y, _dividir(y, folds, semente))
+    candidatos = gerar_candidatos(features, semente)
+    posicoes = {feature: i for i, feature in enumerate(features)}
+    workers = workers or os.cpu_count() or 1
+
+    print(f"Busca de hiperparâmetros: {len(candidatos)} candidatos x {folds} folds "
+          f"({len(candidatos) * folds} ajustes) em {workers} processos"
+          + (f", tempo limite de {tempo_limite:.0f} s" if tempo_limite else "") + ".")
+
+    inicio = time.time()
+    resultados = {}  # candidato -> {fold: métricas}
+    tempos = {}
+    interrompida = False
+    with ProcessPoolExecutor(max_workers=workers, initializer=inicializador, initargs=argumentos) as pool:
+        pendentes = {
+            pool.submit(_avaliar, i, [posicoes[f] for f in candidato['features']],
+                        candidato['C'], candidato['class_weight'], numero_fold)
+            for i, candidato in enumerate(candidatos) for numero_fold in range(folds)
+        }
+        while pendentes:
+            restante = None if not tempo_limite else max(0.0, tempo_limite - (time.time() - inicio))
+            concluidos, pendentes = wait(pendentes, timeout=restante, return_when=FIRST_COMPLETED)
+            for futuro in concluidos:
+                i, numero_fold, metricas, segundos = futuro.result()
+                resultados.setdefault(i, {})[numero_fold] = metricas
+                tempos[i] = tempos.get(i, 0.0) + segundos
+            if tempo_limite and time.time() - inicio >= tempo_limite and pendentes:
+                interrompida = True
+                for futuro in pendentes:
+                    futuro.cancel()
+                break
+
+    completos = [i for i, por_fold in resultados.items() if len(por_fold) == folds]
+    print(f"{len(completos)} de {len(candidatos)} candidatos avaliados em {time.time() - inicio:.1f} s"
+          + (" (tempo limite atingido)." if interrompida else "."))
+
+    linhas = []
+    for i in completos:
+        candidato = candidatos[i]
+        valores = pd.DataFrame(list(resultados[i].values()))
+        linha = {
+            'C': candidato['C'],
+            'class_weight': candidato['class_weight'] or 'nenhum',
+            'subconjunto': candidato['subconjunto'],
+            'n_features': len(candidato['features']),
+        }
+        for nome in METRICAS:
+            linha[f'{nome}_media'] = valores[nome].mean()
+        linha[f'{metrica}_desvio'] = valores[metrica].std(ddof=0)
+        linha['segundos'] = tempos[i]
+        linha['_indice'] = i
+        linhas.append(linha)
+
+    tabela = pd.DataFrame(linhas)
+    if tabela.empty:
+        return tabela, []
+    # Empates na métrica: menor desvio, depois menos features e regularização mais forte
+    tabela = tabela.sort_values([f'{metrica}_media', f'{metrica}_desvio', 'n_features', 'C'],
+                                ascending=[False, True, True, True], kind='stable').reset_index(drop=True)
+    tabela.insert(0, 'posicao', np.arange(1, len(tabela) + 1))
+    ordenados = [candidatos[i] for i in tabela.pop('_indice')]
+    return tabela, ordenados
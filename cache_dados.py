@@ -0,0 +1,211 @@
+# --- MÓDULO: cache_dados.py ---
+# Cache colunar (Feather/Arrow) das bases limpas e enriquecidas.
+#
+# Cada entrada é identificada pelo hash do conteúdo do CSV de origem, pelo separador
+# e pela versão do código de leitura (hash do funcoes_analise.py + versão do pandas).
+# Se o arquivo de origem ou o código mudar, a chave muda e a base é processada de novo.
+#
+# Uso pela linha de comando:
+#   python cache_dados.py listar
+#   python cache_dados.py limpar [--dias N] [--tudo]
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import pandas as pd
+
+import funcoes_analise
+from funcoes_analise import load_and_clean_data, enrich_data, COLUNA_URL
+from instrumentacao import instrumentar
+
+PASTA_CACHE = '.cache_dados'
+ETAPAS = ('limpo', 'enriquecido')
+COLUNA_INDICE = '__indice__'
+
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+
+def versao_parser():
+    """Identifica a versão do código de leitura e enriquecimento."""
+    with open(funcoes_analise.__file__, 'rb') as f:
+        codigo = f.read()
+    return hashlib.blake2b(codigo + pd.__version__.encode(), digest_size=8).hexdigest()
+
+
+def hash_arquivo(filepath, separator):
+    """Calcula o hash do conteúdo do arquivo de origem (lido em blocos de 1 MB)."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(separator.encode())
+    with open(filepath, 'rb') as f:
+        for bloco in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _caminhos(chave, etapa, pasta):
+    base = os.path.join(pasta, f'{etapa}_{chave}')
+    return base + '.feather', base + '.json'
+
+
+@instrumentar('leitura_cache')
+def _ler_entrada(chave, etapa, pasta, descartar=()):
+    caminho_dados, caminho_meta = _caminhos(chave, etapa, pasta)
+    if not (os.path.exists(caminho_dados) and os.path.exists(caminho_meta)):
+        return None
+
+    # memory_map evita copiar o arquivo para a memória antes da conversão; as colunas
+    # descartadas nem chegam a ser lidas
+    colunas = None
+    if descartar:
+        colunas = [nome for nome in feather.read_table(caminho_dados, memory_map=True).column_names if nome not in descartar]
+    tabela = feather.read_table(caminho_dados, columns=colunas, memory_map=True)
+    df = tabela.to_pandas().set_index(COLUNA_INDICE).rename_axis(None)
+    with open(caminho_meta, encoding='utf-8') as f:
+        df.attrs.update(json.load(f).get('attrs', {}))
+    os.utime(caminho_meta)  # marca o último uso, usado pela limpeza por idade
+    return df
+
+
+def _gravar_entrada(df, chave, etapa, pasta, origem):
+    os.makedirs(pasta, exist_ok=True)
+    caminho_dados, caminho_meta = _caminhos(chave, etapa, pasta)
+
+    # Grava em arquivo temporário e renomeia, para nunca deixar uma entrada pela metade
+    tabela = df.rename_axis(COLUNA_INDICE).reset_index()
+    feather.write_feather(tabela, caminho_dados + '.tmp', compression='uncompressed')
+    os.replace(caminho_dados + '.tmp', caminho_dados)
+
+    meta = {
+        'origem': os.path.abspath(origem),
+        'etapa': etapa,
+        'versao_parser': chave.rsplit('_', 1)[-1],
+        'linhas': len(df),
+        'criado_em': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'attrs': {k: v for k, v in df.attrs.items() if isinstance(v, (int, float, str))},
+    }
+    with open(caminho_meta, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+
+def carregar_dados(filepath, separator=',', enriquecer=False, usar_cache=True, pasta=PASTA_CACHE, manter_url=True):
+    """Devolve a base limpa (e opcionalmente enriquecida), reaproveitando o cache quando possível.
+
+    Equivale a load_and_clean_data (seguido de enrich_data se enriquecer=True).
+    As entradas do cache sempre guardam a URL; com manter_url=False ela não é lida.
+    Retorna None se o arquivo de origem não existir.
+    """
+    if usar_cache and feather is None:
+        print("Aviso: 'pyarrow' não está instalado; o cache de dados foi desativado.")
+        usar_cache = False
+
+    if not usar_cache or not os.path.exists(filepath):
+        df = load_and_clean_data(filepath, separator=separator, manter_url=manter_url)
+        if df is not None and enriquecer:
+            df = enrich_data(df)
+        return df
+
+    chave = f'{hash_arquivo(filepath, separator)}_{versao_parser()}'
+    etapa = 'enriquecido' if enriquecer else 'limpo'
+    descartar = () if manter_url else (COLUNA_URL,)
+
+    df = _ler_entrada(chave, etapa, pasta, descartar)
+    if df is not None:
+        print(f"Dados de '{filepath}' carregados do cache ({etapa}, {len(df)} linhas).")
+        return df
+
+    df = _ler_entrada(chave, 'limpo', pasta) if enriquecer else None
+    if df is None:
+        df = load_and_clean_data(filepath, separator=separator)
+        if df is None:
+            return None
+        _gravar_entrada(df, chave, 'limpo', pasta, filepath)
+
+    if enriquecer:
+        df = enrich_data(df)
+        _gravar_entrada(df, chave, 'enriquecido', pasta, filepath)
+    return df.drop(columns=list(descartar), errors='ignore')
+
+
+def listar_entradas(pasta=PASTA_CACHE):
+    """Lista as entradas do cache com origem, etapa, tamanho e data do último uso."""
+    if not os.path.isdir(pasta):
+        return pd.DataFrame(columns=['arquivo', 'origem', 'etapa', 'linhas', 'tamanho_mb', 'criado_em', 'ultimo_uso', 'atual'])
+
+    versao_atual = versao_parser()
+    entradas = []
+    for nome in sorted(os.listdir(pasta)):
+        if not nome.endswith('.json'):
+            continue
+        caminho_meta = os.path.join(pasta, nome)
+        caminho_dados = caminho_meta[:-len('.json')] + '.feather'
+        with open(caminho_meta, encoding='utf-8') as f:
+            meta = json.load(f)
+        tamanho = os.path.getsize(caminho_dados) if os.path.exists(caminho_dados) else 0
+        entradas.append({
+            'arquivo': os.path.basename(caminho_dados),
+            'origem': meta.get('origem'),
+            'etapa': meta.get('etapa'),
+            'linhas': meta.get('linhas'),
+            'tamanho_mb': round(tamanho / 2**20, 2),
+            'criado_em': meta.get('criado_em'),
+            'ultimo_uso': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(os.path.getmtime(caminho_meta))),
+            'atual': meta.get('versao_parser') == versao_atual,
+        })
+    return pd.DataFrame(entradas)
+
+
+def limpar_cache(dias=None, tudo=False, pasta=PASTA_CACHE):
+    """Remove entradas do cache.
+
+    Por padrão remove apenas as entradas geradas por versões antigas do código de leitura.
+    Com dias=N remove também as não usadas há mais de N dias; com tudo=True remove todas.
+    Retorna o número de entradas removidas.
+    """
+    if not os.path.isdir(pasta):
+        return 0
+
+    versao_atual = versao_parser()
+    limite = time.time() - dias * 86400 if dias is not None else None
+    removidas = 0
+    for nome in os.listdir(pasta):
+        if not nome.endswith('.json'):
+            continue
+        caminho_meta = os.path.join(pasta, nome)
+        with open(caminho_meta, encoding='utf-8') as f:
+            meta = json.load(f)
+        obsoleta = meta.get('versao_parser') != versao_atual
+        antiga = limite is not None and os.path.getmtime(caminho_meta) < limite
+        if tudo or obsoleta or antiga:
+            caminho_dados = caminho_meta[:-len('.json')] + '.feather'
+            if os.path.exists(caminho_dados):
+                os.remove(caminho_dados)
+            os.remove(caminho_meta)
+            removidas += 1
+    return removidas
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Inspeção e limpeza do cache de dados.")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+    subparsers.add_parser('listar', help="Lista as entradas do cache.")
+    parser_limpar = subparsers.add_parser('limpar', help="Remove entradas obsoletas ou antigas.")
+    parser_limpar.add_argument('--dias', type=float, default=None, help="Remove entradas não usadas há mais de N dias.")
+    parser_limpar.add_argument('--tudo', action='store_true', help="Remove todas as entradas.")
+    args = parser.parse_args()
+
+    if args.comando == 'listar':
+        entradas = listar_entradas()
+        if entradas.empty:
+            print("Cache vazio.")
+        else:
+            print(entradas.to_string(index=False))
+            print(f"\nTotal: {len(entradas)} entradas, {entradas['tamanho_mb'].sum():.2f} MB")
+    else:
+        removidas = limpar_cache(dias=args.dias, tudo=args.tudo)
+        print(f"{removidas} entradas removidas do cache.")
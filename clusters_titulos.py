@@ -0,0 +1,357 @@
+# --- MÓDULO: clusters_titulos.py ---
+# Agrupamento de anúncios quase duplicados pelo título (shingles + MinHash/LSH).
+#
+# O mesmo produto aparece em muitos anúncios com títulos ligeiramente diferentes
+# ("Cartucho HP 664 preto original", "Cartucho Hp 664 Preto Original 2ml"...). O índice:
+#   - normaliza o título (minúsculas, sem acentos, só letras e números) e o divide em
+#     shingles de TAMANHO_SHINGLE caracteres;
+#   - calcula a assinatura MinHash do conjunto de shingles (NUM_PERMUTACOES hashes);
+#   - divide a assinatura em BANDAS e usa cada banda como chave de uma tabela de buckets
+#     (LSH): títulos parecidos caem no mesmo bucket em ao menos uma banda, então cada
+#     título novo é comparado só com os poucos clusters candidatos, em tempo ~linear;
+#   - junta o título a um cluster candidato só se os atributos do parse_title forem
+#     idênticos (categoria, compatibilidade, capacidade, modelo e rendimento) e a
+#     similaridade estimada com o representante do cluster for >= LIMIAR_SIMILARIDADE.
+#     Os atributos entram na chave dos buckets, então só clusters com os mesmos atributos
+#     viram candidatos.
+# Assim os atributos do título são calculados uma vez por cluster e guardados no índice:
+# títulos já vistos em coletas anteriores não passam de novo pelo parse_title.
+# O índice guarda também o último preço e o cluster de cada anúncio (pelo id_anuncio) e, a
+# partir deles, estatísticas de preço por cluster (anúncios distintos, média, mínimo e máximo
+# entre coletas): repetir uma coleta não muda as estatísticas. É gravado em .npz, sem pickle;
+# cada coleta nova é inserida no índice existente, sem reconstruí-lo.
+#
+# Uso:
+#   python clusters_titulos.py mostrar --top 20
+#   python clusters_titulos.py inserir dataset_mercado_livre.csv
+
+import argparse
+import os
+import re
+import unicodedata
+import zlib
+
+import numpy as np
+import pandas as pd
+
+ARQUIVO_CLUSTERS = 'clusters_titulos.npz'
+NUM_PERMUTACOES = 64
+BANDAS = 16 # 16 bandas de 4 hashes: pares com similaridade 0,6 colidem em alguma banda com ~88% de chance
+TAMANHO_SHINGLE = 4
+LIMIAR_SIMILARIDADE = 0.6 # Similaridade de Jaccard estimada mínima para entrar em um cluster
+TITULOS_POR_LOTE = 20_000 # Títulos novos com assinatura calculada de cada vez
+SEMENTE = 42
+
+_LINHAS_POR_BANDA = NUM_PERMUTACOES // BANDAS
+_PADRAO_NAO_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+_SEPARADOR = '\x1f' # Separa os títulos gravados no .npz
+
+# Hash por multiplicação (a * h + b, 64 bits com estouro) e bits altos: uma família universal
+_rng = np.random.default_rng(SEMENTE)
+_A = _rng.integers(1, 2**63, NUM_PERMUTACOES, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 2**63, NUM_PERMUTACOES, dtype=np.uint64)
+_MULTIPLICADORES_BANDA = _rng.integers(1, 2**63, _LINHAS_POR_BANDA, dtype=np.uint64) | np.uint64(1)
+_MULTIPLICADOR_ATRIBUTOS = 0x9E3779B97F4A7C15
+_MASCARA_64 = (1 << 64) - 1
+
+
+def normalizar_titulo(titulo):
+    # NFKD separa os acentos das letras; a codificação ASCII descarta os acentos
+    texto = unicodedata.normalize('NFKD', str(titulo).lower()).encode('ascii', 'ignore').decode('ascii')
+    return _PADRAO_NAO_ALFANUMERICO.sub(' ', texto).strip()
+
+
+def shingles(titulo):
+    """Hashes (crc32) dos trechos de TAMANHO_SHINGLE caracteres do título normalizado."""
+    texto = normalizar_titulo(titulo)
+    trechos = {texto[i:i + TAMANHO_SHINGLE] for i in range(max(1, len(texto) - TAMANHO_SHINGLE + 1))}
+    return [zlib.crc32(trecho.encode('utf-8')) for trecho in trechos]
+
+
+def assinaturas_minhash(titulos):
+    """Matriz (títulos, NUM_PERMUTACOES) de assinaturas MinHash, uint32."""
+    listas = [shingles(titulo) for titulo in titulos]
+    tamanhos = np.fromiter((len(lista) for lista in listas), dtype=np.int64, count=len(listas))
+    hashes = np.fromiter((h for lista in listas for h in lista), dtype=np.uint64, count=int(tamanhos.sum()))
+    inicios = np.concatenate([[0], np.cumsum(tamanhos)[:-1]])
+    assinaturas = np.empty((len(listas), NUM_PERMUTACOES), dtype=np.uint32)
+    for p in range(NUM_PERMUTACOES):
+        valores = (hashes * _A[p] + _B[p]) >> np.uint64(32)
+        assinaturas[:, p] = np.minimum.reduceat(valores, inicios)
+    return assinaturas
+
+
+def chaves_bandas(assinaturas):
+    """Chave de 64 bits de cada banda da assinatura: matriz (títulos, BANDAS)."""
+    bandas = assinaturas.reshape(len(assinaturas), BANDAS, _LINHAS_POR_BANDA).astype(np.uint64)
+    return (bandas * _MULTIPLICADORES_BANDA).sum(axis=2, dtype=np.uint64)
+
+
+def _chave_atributos(atributos):
+    # O rendimento é NaN quando não aparece no título (e NaN != NaN)
+    rendimento = atributos[4]
+    return atributos[:4] + (None if rendimento != rendimento else float(rendimento),)
+
+
+def _textos_para_bytes(textos):
+    return np.frombuffer(_SEPARADOR.join(textos).encode('utf-8'), dtype=np.uint8)
+
+
+def _bytes_para_textos(dados):
+    return dados.tobytes().decode('utf-8').split(_SEPARADOR) if len(dados) else []
+
+
+class IndiceTitulos:
+    """Índice persistente de clusters de títulos quase duplicados."""
+
+    def __init__(self):
+        self.cluster_do_titulo = {}
+        self.titulo_representante = []
+        self.atributos = [] # Tupla do parse_title de cada cluster
+        # Assinatura MinHash do representante e grupo de atributos de cada cluster (com folga
+        # para crescer: só as primeiras len(self) linhas valem)
+        self._assinaturas = np.zeros((0, NUM_PERMUTACOES), dtype=np.uint32)
+        self._grupo_do_cluster = np.zeros(0, dtype=np.int64)
+        self.buckets = [{} for _ in range(BANDAS)] # Por banda: chave (banda + atributos) -> lista de clusters
+        self.grupos_atributos = {} # Atributos do parse_title -> número do grupo, usado nas chaves dos buckets
+        # Último cluster e preço de cada anúncio, ordenados pelo id; as estatísticas por cluster
+        # abaixo são recalculadas a partir deles
+        self.ids_anuncio = np.zeros(0, dtype=np.int64)
+        self.cluster_anuncio = np.zeros(0, dtype=np.int32)
+        self.preco_anuncio = np.zeros(0)
+        self.anuncios = np.zeros(0, dtype=np.int64)
+        self.soma_precos = np.zeros(0)
+        self.preco_minimo = np.zeros(0)
+        self.preco_maximo = np.zeros(0)
+
+    def __len__(self):
+        return len(self.atributos)
+
+    @property
+    def assinaturas(self):
+        return self._assinaturas[:len(self)]
+
+    def _novo_cluster(self, titulo, atributos, assinatura, grupo):
+        cluster = len(self.atributos)
+        if cluster == len(self._assinaturas):
+            capacidade = max(1024, 2 * cluster)
+            self._assinaturas = np.resize(self._assinaturas, (capacidade, NUM_PERMUTACOES))
+            self._grupo_do_cluster = np.resize(self._grupo_do_cluster, capacidade)
+        self._assinaturas[cluster] = assinatura
+        self._grupo_do_cluster[cluster] = grupo
+        self.titulo_representante.append(titulo)
+        self.atributos.append(atributos)
+        return cluster
+
+    def inserir(self, titulos):
+        """Cluster de cada título; os títulos ainda não vistos são agrupados e inseridos no índice.
+
+        Devolve (clusters, atributos): um vetor int32 com o cluster de cada título e a lista
+        com a tupla do parse_title de cada um (lida do cluster, sem refazer o parse).
+        """
+        from funcoes_analise import parse_title
+        titulos = list(titulos)
+        novos = list(dict.fromkeys(t for t in titulos if t not in self.cluster_do_titulo))
+        for inicio in range(0, len(novos), TITULOS_POR_LOTE):
+            lote = novos[inicio:inicio + TITULOS_POR_LOTE]
+            assinaturas = assinaturas_minhash(lote)
+            chaves = chaves_bandas(assinaturas).tolist()
+            for titulo, assinatura, chaves_titulo in zip(lote, assinaturas, chaves):
+                atributos = parse_title(titulo)
+                grupo = self._grupo(atributos)
+                mistura = grupo * _MULTIPLICADOR_ATRIBUTOS
+                chaves_titulo = [(chave ^ mistura) & _MASCARA_64 for chave in chaves_titulo]
+                cluster = self._cluster_semelhante(assinatura, chaves_titulo, grupo)
+                if cluster is None:
+                    cluster = self._novo_cluster(titulo, atributos, assinatura, grupo)
+                for banda, chave in enumerate(chaves_titulo):
+                    clusters_bucket = self.buckets[banda].setdefault(chave, [])
+                    if cluster not in clusters_bucket:
+                        clusters_bucket.append(cluster)
+                self.cluster_do_titulo[titulo] = cluster
+        self._ajustar_estatisticas()
+
+        clusters = np.fromiter((self.cluster_do_titulo[t] for t in titulos), dtype=np.int32, count=len(titulos))
+        return clusters, [self.atributos[cluster] for cluster in clusters.tolist()]
+
+    def _grupo(self, atributos):
+        return self.grupos_atributos.setdefault(_chave_atributos(atributos), len(self.grupos_atributos))
+
+    def _cluster_semelhante(self, assinatura, chaves_titulo, grupo):
+        """Cluster candidato (mesmo bucket em alguma banda) mais parecido, ou None."""
+        candidatos = {cluster for banda, chave in enumerate(chaves_titulo)
+                      for cluster in self.buckets[banda].get(chave, ())}
+        if not candidatos:
+            return None
+        candidatos = np.fromiter(sorted(candidatos), dtype=np.int64, count=len(candidatos))
+        # Confirma os atributos (duas chaves de bucket podem coincidir por acaso)
+        candidatos = candidatos[self._grupo_do_cluster[candidatos] == grupo]
+        if not len(candidatos):
+            return None
+        similaridades = np.count_nonzero(self._assinaturas[candidatos] == assinatura, axis=1) / NUM_PERMUTACOES
+        melhor = int(np.argmax(similaridades))
+        return int(candidatos[melhor]) if similaridades[melhor] >= LIMIAR_SIMILARIDADE else None
+
+    def _ajustar_estatisticas(self):
+        faltando = len(self.atributos) - len(self.anuncios)
+        if faltando > 0:
+            self.anuncios = np.concatenate([self.anuncios, np.zeros(faltando, dtype=np.int64)])
+            self.soma_precos = np.concatenate([self.soma_precos, np.zeros(faltando)])
+            self.preco_minimo = np.concatenate([self.preco_minimo, np.full(faltando, np.inf)])
+            self.preco_maximo = np.concatenate([self.preco_maximo, np.full(faltando, -np.inf)])
+
+    def atualizar_precos(self, clusters, precos, ids_anuncio):
+        """Registra o cluster e o preço de cada anúncio da coleta e recalcula as estatísticas.
+
+        Cada anúncio conta uma vez, com a última linha em que aparece: um anúncio já registrado
+        tem o cluster e o preço substituídos, então repetir uma coleta não muda as estatísticas.
+        """
+        precos = np.asarray(precos, dtype=np.float64)
+        validos = ~np.isnan(precos)
+        clusters = np.asarray(clusters, dtype=np.int32)[validos]
+        precos, ids_anuncio = precos[validos], np.asarray(ids_anuncio, dtype=np.int64)[validos]
+        # Última linha de cada anúncio da coleta (np.unique sobre a ordem invertida)
+        ids, posicoes = np.unique(ids_anuncio[::-1], return_index=True)
+        ultimas = len(ids_anuncio) - 1 - posicoes
+        mantidos = ~np.isin(self.ids_anuncio, ids, assume_unique=True)
+        todos_ids = np.concatenate([self.ids_anuncio[mantidos], ids])
+        ordem = np.argsort(todos_ids, kind='stable')
+        self.ids_anuncio = todos_ids[ordem]
+        self.cluster_anuncio = np.concatenate([self.cluster_anuncio[mantidos], clusters[ultimas]])[ordem]
+        self.preco_anuncio = np.concatenate([self.preco_anuncio[mantidos], precos[ultimas]])[ordem]
+        self._recalcular_estatisticas()
+
+    def _recalcular_estatisticas(self):
+        total = len(self)
+        self.anuncios = np.bincount(self.cluster_anuncio, minlength=total).astype(np.int64)
+        self.soma_precos = np.bincount(self.cluster_anuncio, weights=self.preco_anuncio, minlength=total)
+        self.preco_minimo = np.full(total, np.inf)
+        self.preco_maximo = np.full(total, -np.inf)
+        np.minimum.at(self.preco_minimo, self.cluster_anuncio, self.preco_anuncio)
+        np.maximum.at(self.preco_maximo, self.cluster_anuncio, self.preco_anuncio)
+
+    def preco_medio(self, clusters=None):
+        """Preço médio de cada cluster (NaN para clusters sem preço registrado)."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            medias = np.where(self.anuncios > 0, self.soma_precos / self.anuncios, np.nan)
+        return medias if clusters is None else medias[clusters]
+
+    def resumo(self, top=20):
+        """Tabela dos maiores clusters (por número de anúncios registrados)."""
+        ordem = np.argsort(-self.anuncios, kind='stable')[:top]
+        tamanhos = np.bincount(np.fromiter(self.cluster_do_titulo.values(), dtype=np.int64), minlength=len(self))
+        return pd.DataFrame({
+            'cluster': ordem,
+            'titulos': tamanhos[ordem],
+            'anuncios': self.anuncios[ordem],
+            'preco_medio': self.preco_medio(ordem),
+            'preco_minimo': np.where(self.anuncios[ordem] > 0, self.preco_minimo[ordem], np.nan),
+            'preco_maximo': np.where(self.anuncios[ordem] > 0, self.preco_maximo[ordem], np.nan),
+            'modelo_cartucho': [self.atributos[c][3] for c in ordem],
+            'compatibilidade': [self.atributos[c][1] for c in ordem],
+            'representante': [self.titulo_representante[c][:60] for c in ordem],
+        }).round(2)
+
+    def salvar(self, caminho=ARQUIVO_CLUSTERS):
+        # Gravação atômica: o índice anterior só é substituído depois de completo
+        bandas, chaves, clusters_buckets = [], [], []
+        for banda, tabela in enumerate(self.buckets):
+            for chave, clusters in tabela.items():
+                bandas.extend([banda] * len(clusters))
+                chaves.extend([chave] * len(clusters))
+                clusters_buckets.extend(clusters)
+        atributos_texto = {}
+        for posicao, nome in enumerate(['categoria', 'compatibilidade', 'capacidade', 'modelo']):
+            valores, codigos = np.unique(np.array([a[posicao] for a in self.atributos], dtype=str), return_inverse=True)
+            atributos_texto[f'{nome}_valores'] = valores
+            atributos_texto[f'{nome}_codigos'] = codigos.astype(np.int32)
+        temporario = caminho + '.tmp.npz'
+        np.savez(temporario,
+                 titulos=_textos_para_bytes(self.cluster_do_titulo.keys()),
+                 cluster_do_titulo=np.fromiter(self.cluster_do_titulo.values(), dtype=np.int32),
+                 representantes=_textos_para_bytes(self.titulo_representante),
+                 rendimento=np.array([a[4] for a in self.atributos], dtype=np.float64),
+                 assinaturas=self.assinaturas,
+                 bucket_banda=np.array(bandas, dtype=np.uint8), bucket_chave=np.array(chaves, dtype=np.uint64),
+                 bucket_cluster=np.array(clusters_buckets, dtype=np.int32),
+                 ids_anuncio=self.ids_anuncio, cluster_anuncio=self.cluster_anuncio,
+                 preco_anuncio=self.preco_anuncio,
+                 parametros=np.array([NUM_PERMUTACOES, BANDAS, TAMANHO_SHINGLE, SEMENTE]),
+                 **atributos_texto)
+        os.replace(temporario, caminho)
+
+    @classmethod
+    def carregar(cls, caminho=ARQUIVO_CLUSTERS):
+        """Lê o índice gravado; levanta ValueError se ele foi gerado com outros parâmetros de MinHash/LSH."""
+        indice = cls()
+        with np.load(caminho, allow_pickle=False) as dados:
+            if dados['parametros'].tolist() != [NUM_PERMUTACOES, BANDAS, TAMANHO_SHINGLE, SEMENTE]:
+                raise ValueError("índice gerado com outros parâmetros de MinHash/LSH")
+            titulos = _bytes_para_textos(dados['titulos'])
+            if len(titulos) != len(dados['cluster_do_titulo']):
+                raise ValueError("lista de títulos do índice corrompida")
+            indice.cluster_do_titulo = dict(zip(titulos, dados['cluster_do_titulo'].tolist()))
+            indice.titulo_representante = _bytes_para_textos(dados['representantes'])
+            colunas = [dados[f'{nome}_valores'].take(dados[f'{nome}_codigos']).tolist()
+                       for nome in ['categoria', 'compatibilidade', 'capacidade', 'modelo']]
+            indice.atributos = list(zip(*colunas, dados['rendimento'].tolist()))
+            indice._assinaturas = dados['assinaturas'].reshape(len(indice.atributos), NUM_PERMUTACOES)
+            indice._grupo_do_cluster = np.array([indice._grupo(atributos) for atributos in indice.atributos], dtype=np.int64)
+            for banda, chave, cluster in zip(dados['bucket_banda'].tolist(), dados['bucket_chave'].tolist(),
+                                             dados['bucket_cluster'].tolist()):
+                indice.buckets[banda].setdefault(chave, []).append(cluster)
+            indice.ids_anuncio = dados['ids_anuncio']
+            indice.cluster_anuncio = dados['cluster_anuncio']
+            indice.preco_anuncio = dados['preco_anuncio']
+        indice._recalcular_estatisticas()
+        return indice
+
+
+def carregar_indice(caminho=ARQUIVO_CLUSTERS):
+    """Índice gravado, ou um índice vazio se ele ainda não existir (ou for incompatível)."""
+    if not os.path.exists(caminho):
+        return IndiceTitulos()
+    try:
+        return IndiceTitulos.carregar(caminho)
+    except (ValueError, KeyError) as e:
+        print(f"Aviso: não foi possível usar '{caminho}' ({e}); o índice de clusters será refeito.")
+        return IndiceTitulos()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clusters de anúncios quase duplicados pelo título.")
+    parser.add_argument('--arquivo', default=ARQUIVO_CLUSTERS)
+    sub = parser.add_subparsers(dest='comando', required=True)
+    exibicao = sub.add_parser('mostrar', help="Mostra os maiores clusters.")
+    exibicao.add_argument('--top', type=int, default=20)
+    insercao = sub.add_parser('inserir', help="Insere uma coleta (CSV bruto do robô) no índice.")
+    insercao.add_argument('csv')
+    insercao.add_argument('--separador', default=',')
+    args = parser.parse_args()
+
+    if args.comando == 'inserir':
+        from funcoes_analise import load_and_clean_data
+        from identificadores import chaves_anuncio
+        df = load_and_clean_data(args.csv, separator=args.separador)
+        if df is None:
+            exit()
+        indice = carregar_indice(args.arquivo)
+        antes = len(indice)
+        clusters, _ = indice.inserir(df['titulo'])
+        indice.atualizar_precos(clusters, df['preco'], chaves_anuncio(df))
+        indice.salvar(args.arquivo)
+        print(f"{len(df)} anúncios ({df['titulo'].nunique()} títulos distintos) em {len(set(clusters.tolist()))} clusters; "
+              f"{len(indice) - antes} clusters novos, {len(indice)} no total.")
+        return
+
+    if not os.path.exists(args.arquivo):
+        print(f"ERRO: Arquivo '{args.arquivo}' não encontrado. Execute 'python clusters_titulos.py inserir <csv>' "
+              "ou 'python analise.py --clusters' primeiro.")
+        exit()
+    indice = IndiceTitulos.carregar(args.arquivo)
+    print(f"{len(indice)} clusters, {len(indice.cluster_do_titulo)} títulos distintos.")
+    print(indice.resumo(args.top).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,38 @@
 # --- SCRIPT: 3_dashboard.py ---
 # Dashboard interativo para visualização dos resultados da análise de risco.
+#
+# Os filtros, as métricas e os gráficos são calculados a partir dos agregados gravados
+# pelo analise.py (relatorio_risco.db): histograma de risco por classificação e amostra
+# para o gráfico de dispersão. A tabela detalhada é paginada e lida do banco por intervalo
+# de posições, então o custo de cada interação não cresce com o tamanho do relatório.
+
+import os
 
 import streamlit as st
 import pandas as pd
 import altair as alt # Para gráficos interativos
 
+from agregados_relatorio import (
+    BANCO_RELATORIO,
+    gravar_agregados,
+    carregar_histograma,
+    carregar_amostra,
+    resumo_filtro,
+    contagem_por_faixa,
+    densidade_por_classe,
+    pagina_relatorio
+)
+from banco_resultados import BANCO_RESULTADOS, historico_execucoes, consultar
+from indice_vendedores import BANCO_VENDEDORES, MIN_ANUNCIOS_RANKING, ORDENACOES, consultar_vendedor, top_vendedores
+from saida_relatorio import BASE_RELATORIO, FORMATOS, localizar_relatorio, ler_relatorio
+
+# Relatório mais recente entre os formatos gravados pelo analise.py (csv, csv.gz, parquet, feather)
+DATA_FILE = localizar_relatorio(BASE_RELATORIO) or BASE_RELATORIO + FORMATOS['csv']
+LINHAS_POR_PAGINA = 100
+
 # 1. Configuração da Página
 st.set_page_config(
-    layout="wide", 
+    layout="wide",
     page_title="Dashboard de Risco",
     page_icon="🚨"
 )
@@ -21,27 +46,42 @@ st.write(
 st.divider()
 
 # 3. Carregamento dos Dados
-# @st.cache_data armazena os dados em cache para performance
+def load_data(filepath, chunksize=100_000):
+    """Lê o relatório em blocos (usado para montar os agregados quando o banco não existe).
+
+    O formato é detectado pela extensão do arquivo.
+    """
+    return ler_relatorio(filepath, chunksize=chunksize)
+
+def preparar_agregados(filepath, banco):
+    """Garante que o banco de agregados existe e está atualizado em relação ao relatório."""
+    if not os.path.exists(filepath) and not os.path.exists(banco):
+        return False
+    if not os.path.exists(banco) or (os.path.exists(filepath) and os.path.getmtime(filepath) > os.path.getmtime(banco)):
+        with st.spinner("Gerando os agregados do relatório (feito uma única vez)..."):
+            gravar_agregados(load_data(filepath), banco, origem=filepath)
+    return True
+
+# @st.cache_data armazena os dados em cache para performance; a data de modificação do
+# banco entra na chave, então um novo relatório invalida o cache
 @st.cache_data
-def load_data(filepath):
-    try:
-        df = pd.read_csv(filepath, sep=';')
-        return df
-    except FileNotFoundError:
-        st.error(f"Erro: Arquivo '{filepath}' não encontrado.")
-        st.info("Por favor, execute o script '2_analise_sprint4.py' primeiro para gerar o relatório.")
-        return pd.DataFrame() # Retorna um dataframe vazio
+def load_aggregates(banco, modificado_em):
+    return carregar_histograma(banco), carregar_amostra(banco)
 
-DATA_FILE = 'relatorio_final_com_risco.csv'
-df = load_data(DATA_FILE)
+if preparar_agregados(DATA_FILE, BANCO_RELATORIO):
+    histograma, amostra = load_aggregates(BANCO_RELATORIO, os.path.getmtime(BANCO_RELATORIO))
+else:
+    st.error(f"Erro: Arquivo '{DATA_FILE}' não encontrado.")
+    st.info("Por favor, execute o script '2_analise_sprint4.py' primeiro para gerar o relatório.")
+    histograma, amostra = pd.DataFrame(), pd.DataFrame()
 
-if not df.empty:
+if not histograma.empty:
 
     # 4. Barra Lateral com Filtros
     st.sidebar.header("Painel de Filtros")
 
     # Filtro por Classificação da IA
-    classificacao_opcoes = ['Todos'] + list(df['classificacao_ia'].unique())
+    classificacao_opcoes = ['Todos'] + list(histograma['classificacao_ia'].unique())
     classificacao_filtro = st.sidebar.selectbox(
         "Filtrar por Classificação da IA:",
         options=classificacao_opcoes,
@@ -55,42 +95,40 @@ if not df.empty:
         max_value=100,
         value=(50, 100) # Default: mostrar produtos com 50% a 100% de risco
     )
-    
-    # 5. Aplicação dos Filtros
-    df_filtrado = df.copy()
-    
-    # Aplicar filtro de classificação
-    if classificacao_filtro != 'Todos':
-        df_filtrado = df_filtrado[df_filtrado['classificacao_ia'] == classificacao_filtro]
-    
-    # Aplicar filtro de risco
-    df_filtrado = df_filtrado[
-        (df_filtrado['indicador_de_risco_pct'] >= risco_slider[0]) &
-        (df_filtrado['indicador_de_risco_pct'] <= risco_slider[1])
-    ]
+
+    # 5. Aplicação dos Filtros (respondidos pelo histograma, sem percorrer o relatório)
+    classe = None if classificacao_filtro == 'Todos' else classificacao_filtro
+    risco_min, risco_max = risco_slider
+
+    amostra_filtrada = amostra
+    if classe is not None:
+        amostra_filtrada = amostra_filtrada[amostra_filtrada['classificacao_ia'] == classe]
+    amostra_filtrada = amostra_filtrada[amostra_filtrada['indicador_de_risco_pct'].between(risco_min, risco_max)]
 
     # 6. Métricas Principais (KPIs)
     st.subheader("Métricas Gerais da Análise")
-    
-    total_produtos = len(df)
-    total_suspeitos = len(df[df['classificacao_ia'] == 'Suspeito'])
-    risco_medio_total = df['indicador_de_risco_pct'].mean()
-    
+
+    geral = resumo_filtro(histograma, None, 0, 100)
+    total_produtos = geral['total']
+    total_suspeitos = resumo_filtro(histograma, 'Suspeito', 0, 100)['total']
+    risco_medio_total = geral['risco_medio']
+
     # Métricas dos dados filtrados
-    total_filtrado = len(df_filtrado)
-    risco_medio_filtrado = df_filtrado['indicador_de_risco_pct'].mean() if total_filtrado > 0 else 0
+    filtro = resumo_filtro(histograma, classe, risco_min, risco_max)
+    total_filtrado = filtro['total']
+    risco_medio_filtrado = filtro['risco_medio']
 
     col1, col2, col3, col4 = st.columns(4)
     col1.metric("Total de Produtos (Geral)", f"{total_produtos}")
     col2.metric("Total 'Suspeitos' (Geral)", f"{total_suspeitos}")
     col3.metric("Risco Médio (Geral)", f"{risco_medio_total:.1f}%")
     col4.metric(
-        label="Produtos no Filtro Atual", 
-        value=f"{total_filtrado}", 
+        label="Produtos no Filtro Atual",
+        value=f"{total_filtrado}",
         delta=f"{total_filtrado - total_produtos} do total",
         delta_color="off"
     )
-    
+
     st.divider()
 
     # 7. Visualização de Dados
@@ -103,22 +141,24 @@ if not df.empty:
 
     with col_graf1:
         st.write("#### 1. Contagem de Produtos por Faixa de Risco")
-        # Gráfico de Barras Empilhadas (Contagem)
-        
-        binned_risk_axis = alt.X('indicador_de_risco_pct', bin=alt.Bin(maxbins=20), title='Faixa de Risco (%)')
-        
-        stacked_bar = alt.Chart(df_filtrado).mark_bar().encode(
-            x=binned_risk_axis,
-            
+        # Gráfico de Barras Empilhadas (Contagem), com as faixas de 5% já somadas
+
+        contagens = contagem_por_faixa(histograma, classe, risco_min, risco_max, largura=5)
+
+        stacked_bar = alt.Chart(contagens).mark_bar().encode(
+            x=alt.X('faixa_inicio:Q', bin='binned', title='Faixa de Risco (%)', scale=alt.Scale(domain=[0, 100])),
+            x2='faixa_fim:Q',
+
             # Eixo Y representa a contagem real de produtos
-            y=alt.Y('count()', title='Contagem de Produtos'), 
-            
+            y=alt.Y('contagem:Q', title='Contagem de Produtos'),
+
             color=alt.Color('classificacao_ia', title='Classificação', scale=color_scale),
-            
+
             tooltip=[
-                alt.Tooltip('indicador_de_risco_pct', bin=alt.Bin(maxbins=20), title='Faixa de Risco (%)'),
+                alt.Tooltip('faixa_inicio:Q', title='Faixa de Risco (%) - início'),
+                alt.Tooltip('faixa_fim:Q', title='Faixa de Risco (%) - fim'),
                 'classificacao_ia',
-                'count()'
+                alt.Tooltip('contagem:Q', title='Contagem')
             ]
 
         ).properties(
@@ -128,21 +168,19 @@ if not df.empty:
 
     with col_graf2:
         st.write("#### 2. Densidade das Populações por Risco")
-        # Gráfico de Densidade (KDE)
-        
-        density_plot = alt.Chart(df_filtrado).transform_density(
-            'indicador_de_risco_pct',
-            as_=['risco', 'densidade'],
-            groupby=['classificacao_ia']
-        ).mark_area(opacity=0.7).encode(
-            # :Q especifica tipo quantitativo para os campos transformados
+        # Gráfico de Densidade (KDE), calculado sobre o histograma
+
+        densidades = densidade_por_classe(histograma, classe, risco_min, risco_max)
+
+        density_plot = alt.Chart(densidades).mark_area(opacity=0.7).encode(
+            # :Q especifica tipo quantitativo para os campos calculados
             x=alt.X('risco:Q', title='Indicador de Risco (%)'),
             y=alt.Y('densidade:Q', title='Densidade', axis=None),
-            
+
             color=alt.Color('classificacao_ia', title='Classificação', scale=color_scale),
-            
+
             tooltip=[
-                alt.Tooltip('risco:Q', title='Indicador de Risco (%)'),
+                alt.Tooltip('risco:Q', title='Indicador de Risco (%)', format='.1f'),
                 'classificacao_ia'
             ]
         ).properties(
@@ -154,9 +192,10 @@ if not df.empty:
     # Gráfico 3: Preço vs. Risco
     st.write("---") # Separador
     st.write("#### 3. Preço dos Produtos vs. Indicador de Risco")
-    
-    scatter_preco_risco = alt.Chart(df_filtrado).mark_circle(size=80, opacity=0.8).encode(
-        x=alt.X('preco', title='Preço (R$)', axis=alt.Axis(format='~s')), 
+    st.caption(f"Amostra estratificada por faixa de risco: {len(amostra_filtrada)} de {total_filtrado} produtos do filtro.")
+
+    scatter_preco_risco = alt.Chart(amostra_filtrada).mark_circle(size=80, opacity=0.8).encode(
+        x=alt.X('preco', title='Preço (R$)', axis=alt.Axis(format='~s')),
         y=alt.Y('indicador_de_risco_pct', title='Indicador de Risco (%)'),
         color=alt.Color('classificacao_ia', title='Classificação', scale=color_scale),
         tooltip=['titulo', 'preco', 'indicador_de_risco_pct', 'classificacao_ia']
@@ -167,21 +206,91 @@ if not df.empty:
 
 
     st.divider() # Final do separador
-    
-    # 8. Tabela de Dados Detalhada
+
+    # 8. Tabela de Dados Detalhada (paginada)
     st.subheader(f"Relatório Detalhado ({total_filtrado} produtos)")
-    
+
+    total_paginas = max(1, -(-total_filtrado // LINHAS_POR_PAGINA))
+    pagina = st.number_input(f"Página (de {total_paginas}):", min_value=1, max_value=total_paginas, value=1, step=1)
+    df_pagina = pagina_relatorio(histograma, classe, risco_min, risco_max, pagina - 1, LINHAS_POR_PAGINA,
+                                 caminho=BANCO_RELATORIO)
+
     # Formatação visual do risco na tabela
     st.dataframe(
-        df_filtrado.style.background_gradient(
-            cmap='Reds', 
+        df_pagina.style.background_gradient(
+            cmap='Reds',
             subset=['indicador_de_risco_pct'],
             vmin=0,
             vmax=100
-        ), 
+        ),
         use_container_width=True,
         height=500
     )
 
+    # 9. Histórico das Execuções (banco de resultados)
+    if os.path.exists(BANCO_RESULTADOS):
+        st.divider()
+        st.subheader("Histórico das Execuções")
+
+        historico = historico_execucoes(BANCO_RESULTADOS)
+        if len(historico) > 1:
+            evolucao = alt.Chart(historico).mark_line(point=True).encode(
+                x=alt.X('iniciada_em:T', title='Execução'),
+                y=alt.Y('total_suspeitos:Q', title="Produtos 'Suspeitos'"),
+                tooltip=['id', 'iniciada_em', 'total_anuncios', 'total_suspeitos', alt.Tooltip('risco_medio:Q', format='.1f')]
+            ).properties(
+                title="Produtos 'Suspeitos' por Execução"
+            )
+            st.altair_chart(evolucao, use_container_width=True)
+        st.dataframe(historico, use_container_width=True, hide_index=True)
+
+        # Consulta indexada: ex. cartuchos 664 suspeitos de vendedores com reputação vermelha na última semana
+        with st.expander("Consultar anúncios no banco de resultados"):
+            col_c1, col_c2, col_c3, col_c4 = st.columns(4)
+            consulta_modelo = col_c1.text_input("Modelo do cartucho (ex: 664):", value="")
+            consulta_reputacao = col_c2.multiselect("Reputação do vendedor:", ['Verde', 'Amarelo', 'Laranja', 'Vermelho'])
+            consulta_dias = col_c3.number_input("Últimos N dias:", min_value=1, max_value=365, value=7)
+            consulta_limite = col_c4.number_input("Máximo de anúncios:", min_value=10, max_value=1000, value=50, step=10)
+            resultado_consulta = consultar(
+                BANCO_RESULTADOS,
+                classificacao=classe,
+                modelo_cartucho=consulta_modelo.strip() or None,
+                reputacoes=consulta_reputacao or None,
+                risco_min=risco_min,
+                dias=consulta_dias,
+                limite=consulta_limite
+            )
+            st.dataframe(resultado_consulta, use_container_width=True, hide_index=True)
+
+    # 10. Vendedores de Maior Risco (índice acumulado entre as execuções)
+    if os.path.exists(BANCO_VENDEDORES):
+        st.divider()
+        st.subheader("Vendedores de Maior Risco")
+
+        col_v1, col_v2, col_v3 = st.columns(3)
+        ordem_vendedores = col_v1.selectbox("Ordenar por:", ORDENACOES)
+        min_anuncios = col_v2.number_input("Mínimo de anúncios:", min_value=1, value=MIN_ANUNCIOS_RANKING)
+        limite_vendedores = col_v3.number_input("Vendedores:", min_value=5, max_value=500, value=20, step=5)
+        ranking = top_vendedores(limite_vendedores, ordem_vendedores, min_anuncios, BANCO_VENDEDORES)
+        st.dataframe(
+            ranking.style.background_gradient(cmap='Reds', subset=['risco_medio'], vmin=0, vmax=100),
+            use_container_width=True,
+            hide_index=True
+        )
+
+        nome_vendedor = st.text_input("Consultar vendedor:", value="")
+        if nome_vendedor.strip():
+            registro, reputacoes = consultar_vendedor(nome_vendedor.strip(), BANCO_VENDEDORES)
+            if registro is None:
+                st.info(f"Vendedor '{nome_vendedor.strip()}' não encontrado no índice.")
+            else:
+                col_m1, col_m2, col_m3, col_m4 = st.columns(4)
+                col_m1.metric("Anúncios", registro['anuncios'])
+                col_m2.metric("Suspeitos", f"{registro['proporcao_suspeitos']:.0%}")
+                col_m3.metric("Risco médio", f"{registro['risco_medio']:.1f}%")
+                col_m4.metric("Preços anômalos", registro['anomalias_preco'])
+                st.caption(f"Visto em {registro['execucoes']} execuções, de {registro['primeira_vez']} a {registro['ultima_vez']}.")
+                st.dataframe(reputacoes, use_container_width=True, hide_index=True)
+
 else:
     st.warning("O arquivo de dados não foi carregado. Execute o script 'analise.py'")
@@ -3,14 +3,19 @@
 
 import pandas as pd
 import re
-import matplotlib.pyplot as plt
-import seaborn as sns
+from functools import lru_cache
+from modelo_fundido import predict_risk
+from instrumentacao import instrumentar, medir_etapa, log, silencioso
 import numpy as np
-from matplotlib.ticker import FuncFormatter
+
+# matplotlib e seaborn só são importados pelas funções de gráficos: a importação leva mais
+# de um segundo e a pontuação (analise.py, workers, serviço) não precisa deles.
 
 # Etapa 0: Configuração de Estilo para os Gráficos
 def setup_visual_style():
     """Define um estilo visual padrão para todos os gráficos."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     sns.set_style("whitegrid")
     plt.rcParams['figure.figsize'] = (12, 7)
     plt.rcParams['axes.titlesize'] = 18
@@ -20,15 +25,75 @@ def setup_visual_style():
     plt.rcParams['figure.dpi'] = 100
 
 # Etapa 1: Leitura e Limpeza dos Dados
-def load_and_clean_data(filepath, separator=','):
-    """Lê o arquivo CSV, renomeia colunas e faz a limpeza inicial."""
-    print("Iniciando a leitura e limpeza dos dados...")
-    
+# Plano de tipos da base de anúncios, para reduzir a memória em coletas grandes:
+# - colunas do robô que nenhuma etapa usa não são lidas do CSV;
+# - textos de baixa cardinalidade viram categóricos (um código por linha + tabela de valores);
+# - a URL perde o fragmento de rastreamento (#...), que não identifica o anúncio, e só é
+#   lida quando necessária (banco de resultados e modo incremental);
+# - o preço continua float64, pois entra no relatório e na comparação com o preço de referência.
+COLUNAS_NAO_USADAS = [
+    'quantidade_vendida', 'reviews_5_estrelas_pct', 'reviews_4_estrelas_pct',
+    'reviews_3_estrelas_pct', 'reviews_2_estrelas_pct', 'reviews_1_estrelas_pct'
+]
+COLUNAS_CATEGORICAS = ['nome_vendedor', 'status_vendedor', 'reputacao_cor']
+COLUNA_URL = 'url_produto'
+# Número do anúncio na URL: o primeiro entre o caminho "/MLB-123...", o filtro "item_id:MLB123..."
+# e o anúncio vencedor das páginas de catálogo ("#wid=MLB123..."); sem nenhum, o catálogo "/p/MLB123..."
+PADRAO_ID_ANUNCIO = r'(?:/MLB-|item_id(?::|%3A)MLB|[#&?]wid=MLB)(\d+)'
+PADRAO_ID_CATALOGO = r'/p/MLB(\d+)'
+
+def opcoes_leitura(manter_url=True):
+    """Argumentos de pd.read_csv com o plano de tipos (colunas lidas e dtypes)."""
+    descartadas = set(COLUNAS_NAO_USADAS) | (set() if manter_url else {COLUNA_URL})
+    return {
+        'usecols': lambda coluna: coluna not in descartadas,
+        'dtype': {coluna: 'category' for coluna in COLUNAS_CATEGORICAS},
+    }
+
+def chave_anuncio(urls):
+    """Identificador estável do anúncio: a URL sem o fragmento de rastreamento (#...)."""
+    return urls.astype(str).str.split('#', n=1).str[0]
+
+def extrair_id_anuncio(urls):
+    """Número do anúncio (MLB) de cada URL completa, como Int64 (nulo quando a URL não tem nenhum)."""
+    urls = urls.astype(object).where(urls.notna())
+    ids = urls.str.extract(PADRAO_ID_ANUNCIO, expand=False)
+    sem_id = ids.isna() & urls.notna()
+    if sem_id.any():
+        ids[sem_id] = urls[sem_id].str.extract(PADRAO_ID_CATALOGO, expand=False)
+    return pd.to_numeric(ids).astype('Int64')
+
+def chave_do_id(ids):
+    """Chave do anúncio a partir do id: 'MLB' + número (nula quando o id é nulo)."""
+    return ('MLB' + ids.astype(str)).where(ids.notna(), None)
+
+def parse_brazilian_prices(precos):
+    """Converte uma coluna de preços no formato brasileiro (ex: "R$ 1.234,56") para float.
+
+    A conversão é feita sobre a coluna inteira de uma vez. Valores que não puderem ser
+    convertidos viram NaN. Colunas já numéricas (ex: bases salvas com ponto decimal)
+    são mantidas como estão. Retorna a série convertida e o número de valores inválidos.
+    """
+    if pd.api.types.is_numeric_dtype(precos):
+        return precos.astype(float), 0
+
+    texto = (
+        precos.astype(str)
+        .str.replace('R$', '', regex=False)
+        .str.replace('.', '', regex=False)
+        .str.replace(',', '.', regex=False)
+    )
     try:
-        df = pd.read_csv(filepath, sep=separator)
-    except FileNotFoundError:
-        print(f"Erro: Arquivo '{filepath}' não encontrado. Certifique-se de que ele está na mesma pasta que o script.")
-        return None
+        # Caminho rápido: conversão em bloco, que falha se houver qualquer valor malformado
+        convertidos = texto.astype(float)
+    except ValueError:
+        convertidos = pd.to_numeric(texto.str.strip(), errors='coerce').astype(float)
+    invalidos = int((convertidos.isna() & precos.notna()).sum())
+    return convertidos, invalidos
+
+def clean_data(df):
+    """Renomeia colunas, converte tipos e remove linhas sem dados essenciais."""
+    df.attrs['linhas_lidas'] = len(df)
 
     # Renomeia colunas para um padrão esperado
     colunas_para_renomear = {
@@ -39,123 +104,276 @@ def load_and_clean_data(filepath, separator=','):
     }
     df.rename(columns=colunas_para_renomear, inplace=True)
 
-    # Parser de preços no formato brasileiro (ex: "R$ 1.234,56")
-    def parse_brazilian_price(price_str):
-        if pd.isna(price_str): return np.nan
-        try:
-            s = str(price_str).replace('R$', '').strip()
-            s = s.replace('.', '').replace(',', '.')
-            return float(s)
-        except (ValueError, TypeError): return np.nan
-
     if 'preco' in df.columns:
-        df['preco'] = df['preco'].apply(parse_brazilian_price)
+        df['preco'], df.attrs['precos_invalidos'] = parse_brazilian_prices(df['preco'])
     
     # Conversão de colunas numéricas
     if 'avaliacao_nota' in df.columns:
-        df['avaliacao_nota'] = pd.to_numeric(df['avaliacao_nota'].astype(str).str.replace(',', '.'), errors='coerce')
+        if not pd.api.types.is_numeric_dtype(df['avaliacao_nota']):
+            df['avaliacao_nota'] = pd.to_numeric(df['avaliacao_nota'].astype(str).str.replace(',', '.'), errors='coerce')
+        df['avaliacao_nota'] = df['avaliacao_nota'].astype(np.float32)
     
     if 'avaliacao_numero' in df.columns:
         df['avaliacao_numero'] = df['avaliacao_numero'].fillna(0)
-        df['avaliacao_numero'] = df['avaliacao_numero'].astype(int)
+        df['avaliacao_numero'] = df['avaliacao_numero'].astype(np.int32)
+
+    if COLUNA_URL in df.columns:
+        # O id é extraído antes de cortar o fragmento: nas páginas de catálogo ele está no "#wid="
+        df['id_anuncio'] = extrair_id_anuncio(df[COLUNA_URL])
+        df[COLUNA_URL] = chave_anuncio(df[COLUNA_URL])
 
     # Remoção de linhas com dados essenciais nulos
     df.dropna(subset=['preco', 'titulo'], inplace=True)
-    
-    print("Limpeza concluída. Resumo dos dados:")
-    print(df.info())
-    print("\nVerificando os dados limpos (5 primeiras linhas):")
-    print(df[['titulo', 'preco', 'avaliacao_numero']].head())
     return df
 
-# Etapa 2: Enriquecimento da Base de Dados
-def enrich_data(df):
-    """Cria novas colunas analíticas para aprofundar a análise."""
-    print("\nIniciando o enriquecimento dos dados...")
-
-    # Categorização de produtos baseada no título
-    def categorize_product(title):
-        title_lower = title.lower()
-        if 'notebook' in title_lower or 'laptop' in title_lower:
-            return 'Notebook'
-        if 'impressora' in title_lower:
-            return 'Impressora'
-        return 'Suprimento de Impressão'
-    df['categoria_produto'] = df['titulo'].apply(categorize_product)
-
-    # Extração de atributos do título
-    df['compatibilidade'] = np.where(df['titulo'].str.contains('compativel|compatível|gen[eé]rico|similar|tipo|remanufaturado', case=False, na=False, regex=True), 'Compatível', 'Original')
-    df['capacidade'] = np.where(df['titulo'].str.contains('XL', case=False, na=False), 'XL (Alto Rendimento)', 'Padrão')
-    df['modelo_cartucho'] = df['titulo'].str.extract(r'\b(662|664|667|954|122)\b', expand=False).fillna('Outro')
+@instrumentar('load_and_clean_data')
+def load_and_clean_data(filepath, separator=',', manter_url=True):
+    """Lê o arquivo CSV, renomeia colunas e faz a limpeza inicial."""
+    log("Iniciando a leitura e limpeza dos dados...")
     
-    # Extrair rendimento do título
-    def extract_yield(text):
-        if not isinstance(text, str): return np.nan
-        match = re.search(r'(\d+)\s*(p[aá]ginas|pg|págs)\b', text, re.IGNORECASE)
-        return int(match.group(1)) if match else np.nan
+    try:
+        df = pd.read_csv(filepath, sep=separator, **opcoes_leitura(manter_url))
+    except FileNotFoundError:
+        print(f"Erro: Arquivo '{filepath}' não encontrado. Certifique-se de que ele está na mesma pasta que o script.")
+        return None
+
+    df = clean_data(df)
     
-    df['rendimento_paginas'] = df['titulo'].apply(extract_yield)
+    if df.attrs.get('precos_invalidos'):
+        print(f"Aviso: {df.attrs['precos_invalidos']} preços não puderam ser convertidos e foram descartados.")
+    # Diagnóstico caro em bases grandes: omitido no modo silencioso
+    if not silencioso():
+        print("Limpeza concluída. Resumo dos dados:")
+        print(df.info())
+        print("\nVerificando os dados limpos (5 primeiras linhas):")
+        print(df[['titulo', 'preco', 'avaliacao_numero']].head())
+    return df
+
+def iter_load_and_clean_data(filepath, separator=',', chunksize=100_000, manter_url=True):
+    """Lê o arquivo CSV em blocos de tamanho fixo e devolve um iterador de blocos já limpos.
+
+    A memória usada fica limitada ao tamanho do bloco, independente do tamanho do arquivo.
+    O índice de cada bloco continua a numeração do arquivo, preservando a ordem original das linhas.
+    """
+    try:
+        leitor = pd.read_csv(filepath, sep=separator, chunksize=chunksize, **opcoes_leitura(manter_url))
+    except FileNotFoundError:
+        print(f"Erro: Arquivo '{filepath}' não encontrado. Certifique-se de que ele está na mesma pasta que o script.")
+        return None
+
+    def blocos():
+        with leitor:
+            while True:
+                # A leitura do bloco entra na medição da etapa, junto com a limpeza
+                with medir_etapa('load_and_clean_data') as etapa:
+                    chunk = next(leitor, None)
+                    if chunk is None:
+                        etapa.ignorar = True
+                    else:
+                        chunk = clean_data(chunk)
+                        etapa.linhas_entrada, etapa.linhas_saida = chunk.attrs['linhas_lidas'], len(chunk)
+                if chunk is None:
+                    break
+                if not chunk.empty:
+                    yield chunk
+
+    return blocos()
+
+# Etapa 2: Enriquecimento da Base de Dados
+# Padrões pré-compilados para a leitura dos títulos
+PADRAO_COMPATIVEL = re.compile(r'compativel|compatível|gen[eé]rico|similar|tipo|remanufaturado', re.IGNORECASE)
+PADRAO_XL = re.compile(r'XL', re.IGNORECASE)
+PADRAO_MODELO = re.compile(r'\b(662|664|667|954|122)\b')
+PADRAO_RENDIMENTO = re.compile(r'(\d+)\s*(p[aá]ginas|pg|págs)\b', re.IGNORECASE)
+
+# Colunas derivadas do título, na ordem da tupla devolvida por parse_title
+COLUNAS_TITULO = ['categoria_produto', 'compatibilidade', 'capacidade', 'modelo_cartucho', 'rendimento_paginas']
+
+@lru_cache(maxsize=2**18)
+def parse_title(title):
+    """Extrai de uma vez todos os atributos derivados de um título.
+
+    Retorna a tupla (categoria, compatibilidade, capacidade, modelo, rendimento).
+    O resultado fica em cache, pois os títulos se repetem muito entre coletas.
+    """
+    title_lower = title.lower()
+    if 'notebook' in title_lower or 'laptop' in title_lower:
+        categoria = 'Notebook'
+    elif 'impressora' in title_lower:
+        categoria = 'Impressora'
+    else:
+        categoria = 'Suprimento de Impressão'
+
+    compatibilidade = 'Compatível' if PADRAO_COMPATIVEL.search(title) else 'Original'
+    capacidade = 'XL (Alto Rendimento)' if PADRAO_XL.search(title) else 'Padrão'
+
+    match_modelo = PADRAO_MODELO.search(title)
+    modelo = match_modelo.group(1) if match_modelo else 'Outro'
+
+    match_rendimento = PADRAO_RENDIMENTO.search(title)
+    rendimento = int(match_rendimento.group(1)) if match_rendimento else np.nan
+
+    return categoria, compatibilidade, capacidade, modelo, rendimento
+
+@instrumentar('enrich_data')
+def enrich_data(df, indice_titulos=None):
+    """Cria novas colunas analíticas para aprofundar a análise.
+
+    Com um índice de clusters de títulos (clusters_titulos.IndiceTitulos), os atributos
+    vêm do cluster de cada título (o parse_title só roda para títulos nunca vistos) e o
+    cluster é gravado na coluna 'cluster_titulo'.
+    """
+    log("\nIniciando o enriquecimento dos dados...")
+
+    # Extração de atributos do título: cada título distinto é lido uma única vez.
+    # Os atributos de texto viram categóricos, montados direto dos códigos dos títulos.
+    codigos, titulos_unicos = pd.factorize(df['titulo'])
+    if indice_titulos is not None:
+        clusters, atributos = indice_titulos.inserir(titulos_unicos)
+        df['cluster_titulo'] = clusters.take(codigos)
+    else:
+        atributos = [parse_title(titulo) for titulo in titulos_unicos]
+    for posicao, coluna in enumerate(COLUNAS_TITULO):
+        valores = [atributo[posicao] for atributo in atributos]
+        if coluna == 'rendimento_paginas':
+            df[coluna] = np.asarray(valores, dtype=np.float32).take(codigos)
+        else:
+            categorias = pd.Categorical(valores)
+            df[coluna] = pd.Categorical.from_codes(categorias.codes.take(codigos), categorias.categories)
     
     # Cálculo de custo por página
     df['custo_por_pagina'] = np.where(df['rendimento_paginas'] > 0, df['preco'] / df['rendimento_paginas'], np.nan)
     
     if df['custo_por_pagina'].notna().sum() > 0:
-        print(f"Sucesso: Rendimento extraído do título para {df['custo_por_pagina'].notna().sum()} produtos.")
+        log(f"Sucesso: Rendimento extraído do título para {df['custo_por_pagina'].notna().sum()} produtos.")
     else:
-        print("Aviso: Não foi possível extrair o rendimento do título dos produtos.")
+        log("Aviso: Não foi possível extrair o rendimento do título dos produtos.")
 
-    print("Enriquecimento concluído.")
+    log("Enriquecimento concluído.")
     return df
 
 # Etapa 3: Criação de Features para ML
+# Limiares usados nas features binárias
+PRICE_THRESHOLD = 0.5 # Fração do preço médio do original abaixo da qual o preço é anômalo
+COST_THRESHOLD = 0.01 # Custo por página (R$) abaixo do qual o valor é suspeito
+REVIEW_THRESHOLD = 5 # Número de avaliações abaixo do qual a reputação é baixa
+BAD_REPUTATIONS = ['vermelho', 'laranja']
+
+@instrumentar('create_features')
 def create_features(df, avg_price_original_map):
-    """Cria colunas numéricas (features) para o modelo de ML."""
-    print("\nIniciando a criação de features para o ML...")
+    """Cria colunas numéricas (features) para o modelo de ML.
+
+    Todas as features são calculadas de forma colunar (sem laços por linha). As features
+    binárias são gravadas como int8.
+    """
+    log("\nIniciando a criação de features para o ML...")
 
     # Tratamento de valores nulos para features numéricas
     df['preco'] = df['preco'].fillna(df['preco'].median())
     df['avaliacao_numero'] = df['avaliacao_numero'].fillna(0)
     df['custo_por_pagina'] = df['custo_por_pagina'].fillna(0)
 
+    preco = df['preco'].to_numpy()
+    custo_por_pagina = df['custo_por_pagina'].to_numpy()
+
     # Feature 1: Compatibilidade (Binário)
-    df['feature_compativel'] = (df['compatibilidade'] == 'Compatível').astype(int)
+    compativel = (df['compatibilidade'] == 'Compatível').to_numpy()
+    df['feature_compativel'] = compativel.astype(np.int8)
 
     # Feature 2: Preço Anômalo (Binário)
-    price_threshold = 0.5
-    def check_price_anomaly(row):
-        if row['compatibilidade'] == 'Original' and row['modelo_cartucho'] in avg_price_original_map:
-            avg_price = avg_price_original_map[row['modelo_cartucho']]
-            return 1 if row['preco'] < (avg_price * price_threshold) else 0
-        return 0
-    df['feature_preco_anomalo'] = df.apply(check_price_anomaly, axis=1)
+    df['feature_preco_anomalo'] = marcar_preco_anomalo(df['compatibilidade'], df['modelo_cartucho'], preco,
+                                                       avg_price_original_map)
 
     # Feature 3: Custo por Página Suspeito (Binário)
-    cost_threshold = 0.01
-    df['feature_custo_pagina_suspeito'] = ((df['custo_por_pagina'].notna()) & (df['custo_por_pagina'] < cost_threshold)).astype(int)
+    custo_suspeito = ~np.isnan(custo_por_pagina) & (custo_por_pagina < COST_THRESHOLD)
+    df['feature_custo_pagina_suspeito'] = custo_suspeito.astype(np.int8)
 
     # Feature 4: Baixa Reputação (Binário)
-    review_threshold = 5
-    df['feature_baixa_reputacao'] = (df['avaliacao_numero'] < review_threshold).astype(int)
+    baixa_reputacao = (df['avaliacao_numero'] < REVIEW_THRESHOLD).to_numpy()
+    df['feature_baixa_reputacao'] = baixa_reputacao.astype(np.int8)
 
     # Feature 5: Interação (Compatível + Baixa Reputação)
-    df['feature_compativel_baixa_rep'] = ((df['feature_compativel'] == 1) & (df['feature_baixa_reputacao'] == 1)).astype(int)
+    df['feature_compativel_baixa_rep'] = (compativel & baixa_reputacao).astype(np.int8)
 
     # Feature 6: Reputação do Vendedor (Binário)
     if 'reputacao_cor' in df.columns:
-        bad_reputations = ['vermelho', 'laranja']
-        df['feature_vendedor_ruim'] = df['reputacao_cor'].str.lower().isin(bad_reputations).astype(int)
+        vendedor_ruim = df['reputacao_cor'].str.lower().isin(BAD_REPUTATIONS).to_numpy()
+        df['feature_vendedor_ruim'] = vendedor_ruim.astype(np.int8)
     else:
-        df['feature_vendedor_ruim'] = 0 # Valor neutro se a coluna não existir
+        df['feature_vendedor_ruim'] = np.zeros(len(df), dtype=np.int8) # Valor neutro se a coluna não existir
 
-    print("Criação de features concluída.")
+    log("Criação de features concluída.")
     return df
 
+def marcar_preco_anomalo(compatibilidade, modelo_cartucho, preco, avg_price_original_map):
+    """feature_preco_anomalo: anúncio "Original" com preço abaixo de PRICE_THRESHOLD vezes a referência do modelo.
+
+    O preço de referência é mapeado uma única vez por linha; modelos fora do mapa ficam NaN
+    e nunca são anômalos, pois qualquer comparação com NaN é falsa.
+    """
+    original = np.asarray(compatibilidade, dtype=object) == 'Original'
+    preco_referencia = pd.Series(np.asarray(modelo_cartucho, dtype=object)).map(avg_price_original_map).to_numpy(dtype=float)
+    return (original & (np.asarray(preco, dtype=float) < preco_referencia * PRICE_THRESHOLD)).astype(np.int8)
+
+def parse_brazilian_price(valor):
+    """Versão escalar de parse_brazilian_prices, para registros individuais."""
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return float(valor)
+    if valor is None:
+        return np.nan
+    try:
+        return float(str(valor).replace('R$', '').replace('.', '').replace(',', '.'))
+    except ValueError:
+        return np.nan
+
+def create_features_record(registro, avg_price_original_map):
+    """Calcula as features de um único anúncio sem passar pelo pandas.
+
+    Aceita um dicionário no esquema bruto do robô (nome_produto, preco_produto, ...)
+    ou já renomeado (titulo, preco, ...). Reproduz exatamente clean_data, enrich_data
+    e create_features para uma linha. Retorna None se o anúncio seria descartado na
+    limpeza (título ou preço ausentes).
+    """
+    titulo = registro.get('titulo', registro.get('nome_produto'))
+    preco = parse_brazilian_price(registro.get('preco', registro.get('preco_produto')))
+    if not isinstance(titulo, str) or np.isnan(preco):
+        return None
+
+    avaliacao_numero = registro.get('avaliacao_numero', registro.get('reviews_quantidade_total'))
+    avaliacao_numero = 0 if avaliacao_numero is None or pd.isna(avaliacao_numero) else int(avaliacao_numero)
+    reputacao_cor = registro.get('reputacao_cor')
+
+    categoria, compatibilidade, capacidade, modelo, rendimento = parse_title(titulo)
+    custo_por_pagina = preco / rendimento if rendimento > 0 else 0.0
+
+    feature_compativel = int(compatibilidade == 'Compatível')
+    preco_referencia = avg_price_original_map.get(modelo, np.nan)
+    feature_baixa_reputacao = int(avaliacao_numero < REVIEW_THRESHOLD)
+    return {
+        'categoria_produto': categoria,
+        'compatibilidade': compatibilidade,
+        'capacidade': capacidade,
+        'modelo_cartucho': modelo,
+        'titulo': titulo,
+        'preco': preco,
+        'avaliacao_numero': avaliacao_numero,
+        'custo_por_pagina': custo_por_pagina,
+        'feature_compativel': feature_compativel,
+        'feature_preco_anomalo': int(compatibilidade == 'Original' and preco < preco_referencia * PRICE_THRESHOLD),
+        'feature_custo_pagina_suspeito': int(custo_por_pagina < COST_THRESHOLD),
+        'feature_baixa_reputacao': feature_baixa_reputacao,
+        'feature_compativel_baixa_rep': int(feature_compativel == 1 and feature_baixa_reputacao == 1),
+        'feature_vendedor_ruim': int(isinstance(reputacao_cor, str) and reputacao_cor.lower() in BAD_REPUTATIONS),
+    }
+
 # Etapa 4: Geração de Gráficos
 def generate_visualizations(df):
     """Gera e salva os gráficos para a análise exploratória."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     print("\nIniciando a geração das visualizações...")
 
-    df_suprimentos = df[df['categoria_produto'] == 'Suprimento de Impressão'].copy()
+    df_suprimentos = df[df['categoria_produto'] == 'Suprimento de Impressão']
     
     if df_suprimentos.empty:
         print("Nenhum 'Suprimento de Impressão' encontrado para gerar gráficos.")
@@ -189,3 +407,26 @@ def generate_visualizations(df):
     plt.close()
 
     print("Visualizações geradas.")
+
+# Etapa 5: Aplicação do Modelo de IA
+MAPA_CLASSIFICACAO = {0: 'Original/Legítimo', 1: 'Suspeito'}
+
+def score_data(df, modelo, avg_price_original_map, features_list, enriquecer=True):
+    """Enriquece, cria features e aplica o modelo, adicionando a classificação e o indicador de risco.
+
+    Use enriquecer=False quando o DataFrame já tiver passado por enrich_data.
+    """
+    if enriquecer:
+        df = enrich_data(df)
+    df = create_features(df, avg_price_original_map)
+
+    # Preparar dados para o modelo
+    X_para_prever = df[features_list].fillna(0)
+
+    # Classificação (0 ou 1) e probabilidade da classe "Suspeito" (Indicador de Risco)
+    with medir_etapa('inferencia', len(X_para_prever)) as etapa:
+        classes, probabilidades_risco = predict_risk(modelo, X_para_prever)
+        df['classificacao_ia'] = pd.Series(classes, index=df.index).map(MAPA_CLASSIFICACAO)
+        df['indicador_de_risco_pct'] = (probabilidades_risco.astype(float) * 100).round(2)
+        etapa.linhas_saida = len(df)
+    return df
@@ -1,71 +1,157 @@
+import argparse
+import json
+import os
+
 import pandas as pd
 import numpy as np
 
 # Configuração
 INPUT_FILE = 'dados_enriquecidos_com_alertas.csv'
 OUTPUT_FILE = 'base_treino_manual.csv'
+ARQUIVO_REGRAS = 'regras_rotulagem.json' # Usado no lugar de REGRAS_PADRAO quando existir
 
-def simular_rotulagem_humana(row):
-    """
-    Simula a rotulagem de dados para criar o alvo (target) do modelo de ML.
-    """
-    
+# Regras de rotulagem, avaliadas em ordem: cada produto recebe o rótulo da primeira regra
+# cujas condições (todas) forem verdadeiras; se nenhuma valer, recebe o rótulo padrão.
+# Condição sobre coluna inexistente ou valor nulo é sempre falsa.
+ROTULO_PADRAO = 0 # 0 = Legítimo
+REGRAS_PADRAO = [
     # Regra 1: "Compatíveis" são tratados como legítimos (não-piratas).
-    if row['compatibilidade'] == 'Compatível':
-        return 0 # 0 = Legítimo
-
+    {'nome': 'compativel_legitimo', 'rotulo': 0, 'condicoes': [
+        {'coluna': 'compatibilidade', 'operador': '==', 'valor': 'Compatível'},
+    ]},
     # Regra 2: "Original" com alerta de suspeita.
-    if row['compatibilidade'] == 'Original' and row['alerta_suspeita'] == True:
-        return 1 # 1 = Suspeito
-
-    # Regra 3: "Original" sem alerta (requer análise extra).
-    if row['compatibilidade'] == 'Original' and row['alerta_suspeita'] == False:
-        
-        # Pista 3a: Reputação do vendedor ruim.
-        if 'reputacao_cor' in row.index and pd.notna(row['reputacao_cor']):
-            if row['reputacao_cor'].lower() in ['vermelho', 'laranja']:
-                return 1 # Suspeito (vendedor ruim)
-
-        # Pista 3b: Número de avaliações muito baixo.
-        if pd.notna(row['avaliacao_numero']) and row['avaliacao_numero'] < 3:
-            return 1 # Suspeito (baixas avaliações)
-
-        # Caso padrão para Originais sem alerta
-        return 0
-
-    # Default: Legítimo
-    return 0
-
-# Execução Principal
-print(f"Iniciando a geração da base de treino...")
-print(f"Carregando arquivo de entrada: {INPUT_FILE}")
-
-# Carregamento dos Dados
-try:
-    df = pd.read_csv(INPUT_FILE, sep=';')
-except FileNotFoundError:
-    print(f"ERRO: Arquivo '{INPUT_FILE}' não encontrado.")
-    print("Certifique-se de que ele está na mesma pasta que este script.")
-    exit()
-except Exception as e:
-    print(f"Erro ao ler o CSV: {e}")
-    exit()
-
-print("Aplicando lógica de rotulagem simulada em todos os produtos...")
-
-# Aplicação da Rotulagem
-df['label_risco_real'] = df.apply(simular_rotulagem_humana, axis=1)
-
-# Conversão de Tipo
-df['label_risco_real'] = df['label_risco_real'].astype(int)
-
-print("\nDistribuição dos rótulos gerados:")
-print(df['label_risco_real'].value_counts())
-
-# Salvamento do Resultado
-try:
-    df.to_csv(OUTPUT_FILE, index=False, sep=';', encoding='utf-8-sig')
-    print(f"\nSUCESSO! Base de treino gerada e salva como: {OUTPUT_FILE}")
-    print(f"Total de {len(df)} produtos rotulados.")
-except Exception as e:
-    print(f"\nERRO ao salvar o arquivo final: {e}")
+    {'nome': 'original_com_alerta', 'rotulo': 1, 'condicoes': [
+        {'coluna': 'compatibilidade', 'operador': '==', 'valor': 'Original'},
+        {'coluna': 'alerta_suspeita', 'operador': '==', 'valor': True},
+    ]},
+    # Regra 3a: "Original" sem alerta, com reputação do vendedor ruim.
+    {'nome': 'original_vendedor_ruim', 'rotulo': 1, 'condicoes': [
+        {'coluna': 'compatibilidade', 'operador': '==', 'valor': 'Original'},
+        {'coluna': 'alerta_suspeita', 'operador': '==', 'valor': False},
+        {'coluna': 'reputacao_cor', 'operador': 'em_minusculas', 'valor': ['vermelho', 'laranja']},
+    ]},
+    # Regra 3b: "Original" sem alerta, com número de avaliações muito baixo.
+    {'nome': 'original_poucas_avaliacoes', 'rotulo': 1, 'condicoes': [
+        {'coluna': 'compatibilidade', 'operador': '==', 'valor': 'Original'},
+        {'coluna': 'alerta_suspeita', 'operador': '==', 'valor': False},
+        {'coluna': 'avaliacao_numero', 'operador': '<', 'valor': 3},
+    ]},
+]
+
+# Operadores aceitos nas condições; cada um devolve uma máscara booleana sobre a coluna inteira
+OPERADORES = {
+    '==': lambda serie, valor: serie == valor,
+    '!=': lambda serie, valor: serie.notna() & (serie != valor),
+    '<': lambda serie, valor: serie < valor,
+    '<=': lambda serie, valor: serie <= valor,
+    '>': lambda serie, valor: serie > valor,
+    '>=': lambda serie, valor: serie >= valor,
+    'em': lambda serie, valor: serie.isin(valor),
+    'em_minusculas': lambda serie, valor: serie.astype('string').str.lower().isin([v.lower() for v in valor]),
+    'contem': lambda serie, valor: serie.astype('string').str.contains(valor, case=False, regex=False),
+    'nulo': lambda serie, valor: serie.isna(),
+    'nao_nulo': lambda serie, valor: serie.notna(),
+}
+
+
+def carregar_regras(caminho=None):
+    """Carrega as regras de um arquivo JSON ({"rotulo_padrao": 0, "regras": [...]}) ou usa as regras padrão."""
+    if caminho is None:
+        if not os.path.exists(ARQUIVO_REGRAS):
+            return REGRAS_PADRAO, ROTULO_PADRAO
+        caminho = ARQUIVO_REGRAS
+
+    with open(caminho, encoding='utf-8') as f:
+        config = json.load(f)
+    regras = config['regras'] if isinstance(config, dict) else config
+    rotulo_padrao = config.get('rotulo_padrao', ROTULO_PADRAO) if isinstance(config, dict) else ROTULO_PADRAO
+
+    for posicao, regra in enumerate(regras, start=1):
+        nome = regra.get('nome', f'regra {posicao}')
+        if 'rotulo' not in regra or not regra.get('condicoes'):
+            raise ValueError(f"Regra '{nome}' precisa de 'rotulo' e de ao menos uma condição.")
+        for condicao in regra['condicoes']:
+            if condicao.get('operador') not in OPERADORES:
+                raise ValueError(f"Regra '{nome}': operador desconhecido '{condicao.get('operador')}'. "
+                                 f"Use um de: {', '.join(OPERADORES)}.")
+    print(f"Regras de rotulagem carregadas de: {caminho} ({len(regras)} regras)")
+    return regras, rotulo_padrao
+
+
+def avaliar_condicao(df, condicao):
+    """Máscara booleana de uma condição; coluna inexistente ou valor nulo resultam em False."""
+    if condicao['coluna'] not in df.columns:
+        return np.zeros(len(df), dtype=bool)
+    mascara = OPERADORES[condicao['operador']](df[condicao['coluna']], condicao.get('valor'))
+    return mascara.to_numpy(dtype=bool, na_value=False)
+
+
+def rotular(df, regras=REGRAS_PADRAO, rotulo_padrao=ROTULO_PADRAO):
+    """Aplica as regras em uma única passada colunar e devolve a série de rótulos (int)."""
+    mascaras = []
+    for regra in regras:
+        mascara = np.ones(len(df), dtype=bool)
+        for condicao in regra['condicoes']:
+            mascara &= avaliar_condicao(df, condicao)
+        mascaras.append(mascara)
+    # np.select escolhe, para cada linha, o rótulo da primeira máscara verdadeira
+    rotulos = np.select(mascaras, [regra['rotulo'] for regra in regras], default=rotulo_padrao)
+    return pd.Series(rotulos, index=df.index).astype(int)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera a base de treino rotulada a partir da base enriquecida.")
+    parser.add_argument('--regras', default=None,
+                        help=f"Arquivo JSON com as regras de rotulagem (padrão: '{ARQUIVO_REGRAS}' se existir, "
+                             "senão as regras embutidas).")
+    parser.add_argument('--exportar-regras', metavar='ARQUIVO', default=None,
+                        help="Grava as regras padrão em um arquivo JSON, como ponto de partida para novas regras.")
+    args = parser.parse_args()
+
+    if args.exportar_regras:
+        with open(args.exportar_regras, 'w', encoding='utf-8') as f:
+            json.dump({'rotulo_padrao': ROTULO_PADRAO, 'regras': REGRAS_PADRAO}, f, ensure_ascii=False, indent=2)
+        print(f"Regras padrão exportadas para: {args.exportar_regras}")
+        return
+
+    # Execução Principal
+    print(f"Iniciando a geração da base de treino...")
+
+    try:
+        regras, rotulo_padrao = carregar_regras(args.regras)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"ERRO: Não foi possível carregar as regras de rotulagem: {e}")
+        exit()
+
+    print(f"Carregando arquivo de entrada: {INPUT_FILE}")
+
+    # Carregamento dos Dados
+    try:
+        df = pd.read_csv(INPUT_FILE, sep=';')
+    except FileNotFoundError:
+        print(f"ERRO: Arquivo '{INPUT_FILE}' não encontrado.")
+        print("Certifique-se de que ele está na mesma pasta que este script.")
+        exit()
+    except Exception as e:
+        print(f"Erro ao ler o CSV: {e}")
+        exit()
+
+    print("Aplicando lógica de rotulagem simulada em todos os produtos...")
+
+    # Aplicação da Rotulagem
+    df['label_risco_real'] = rotular(df, regras, rotulo_padrao)
+
+    print("\nDistribuição dos rótulos gerados:")
+    print(df['label_risco_real'].value_counts())
+
+    # Salvamento do Resultado
+    try:
+        df.to_csv(OUTPUT_FILE, index=False, sep=';', encoding='utf-8-sig')
+        print(f"\nSUCESSO! Base de treino gerada e salva como: {OUTPUT_FILE}")
+        print(f"Total de {len(df)} produtos rotulados.")
+    except Exception as e:
+        print(f"\nERRO ao salvar o arquivo final: {e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+# --- MÓDULO: identificadores.py ---
+# Identificadores compactos dos anúncios e vendedores, com dicionário persistente.
+#
+# Cada linha trazia a url_produto (algumas centenas de bytes, quase tudo parâmetros de
+# rastreamento como tracking_id, ad_click_id e searchVariation), copiada por todas as etapas
+# do analise.py. A limpeza (clean_data) já extrai da URL o id_anuncio, o número do anúncio no
+# Mercado Livre (ver PADRAO_ID_ANUNCIO em funcoes_analise.py); aqui a URL é trocada por:
+#   - codigo_anuncio e codigo_vendedor: códigos int32 sequenciais (0, 1, 2...), estáveis entre
+#     execuções, guardados em identificadores.npz junto com o id MLB e a URL de cada anúncio
+#     (a primeira vista, já sem o fragmento #...), que continua recuperável por url() ou pela
+#     linha de comando.
+# O banco de resultados e a pontuação incremental identificam o anúncio pelo id_anuncio; os
+# índices de vendedores e de clusters usam chaves_anuncio, que cobre as linhas sem ele.
+#
+# Uso:
+#   python identificadores.py mostrar
+#   python identificadores.py url MLB3891187225      (ou o código do anúncio)
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from funcoes_analise import extrair_id_anuncio, COLUNA_URL
+
+ARQUIVO_IDENTIFICADORES = 'identificadores.npz'
+_SEPARADOR = '\x1f' # Separa as URLs e os nomes gravados no .npz
+
+
+def url_canonica(id_anuncio):
+    """Link curto do anúncio, sem parâmetros de rastreamento."""
+    return f'https://produto.mercadolivre.com.br/MLB-{int(id_anuncio)}'
+
+
+def chaves_anuncio(df):
+    """id_anuncio de cada linha. Sem ele (URL não lida ou sem número do anúncio), a chave é um
+    hash negativo do vendedor (sem diferenciar maiúsculas) e do título, que não colide com os
+    ids do Mercado Livre."""
+    def texto(coluna):
+        if coluna not in df.columns:
+            return pd.Series('', index=df.index)
+        return df[coluna].astype(object).fillna('').astype(str)
+    campos = pd.DataFrame({'vendedor': texto('nome_vendedor').str.lower(), 'titulo': texto('titulo')})
+    hashes = pd.util.hash_pandas_object(campos, index=False).to_numpy()
+    substitutos = pd.Series(-(hashes >> np.uint64(1)).astype(np.int64) - 1, index=df.index)
+    if 'id_anuncio' not in df.columns:
+        return substitutos.to_numpy()
+    return df['id_anuncio'].astype('Int64').fillna(substitutos).to_numpy(dtype=np.int64)
+
+
+def _textos_para_bytes(textos):
+    return np.frombuffer(_SEPARADOR.join(textos).encode('utf-8'), dtype=np.uint8)
+
+
+def _bytes_para_textos(dados):
+    return dados.tobytes().decode('utf-8').split(_SEPARADOR) if len(dados) else []
+
+
+class DicionarioIds:
+    """Códigos inteiros sequenciais e persistentes para os valores de uma coluna."""
+
+    def __init__(self, valores=()):
+        self.valores = list(valores)
+        self._codigos = {valor: codigo for codigo, valor in enumerate(self.valores)}
+
+    def __len__(self):
+        return len(self.valores)
+
+    def codificar(self, serie):
+        """Código de cada valor (valores novos recebem os próximos códigos; nulos ficam -1)."""
+        locais, unicos = pd.factorize(serie)
+        mapa = np.empty(len(unicos) + 1, dtype=np.int32)
+        mapa[-1] = -1
+        for posicao, valor in enumerate(unicos.tolist()):
+            codigo = self._codigos.get(valor)
+            if codigo is None:
+                codigo = self._codigos[valor] = len(self.valores)
+                self.valores.append(valor)
+            mapa[posicao] = codigo
+        return mapa[locais]
+
+    def codigo(self, valor):
+        return self._codigos.get(valor, -1)
+
+
+class Identificadores:
+    """Dicionários de anúncios (id MLB e URL original) e de vendedores."""
+
+    def __init__(self):
+        self.anuncios = DicionarioIds()
+        self.urls = []
+        self.vendedores = DicionarioIds()
+
+    def internar(self, df, descartar_url=True):
+        """Acrescenta id_anuncio, codigo_anuncio e codigo_vendedor ao DataFrame.
+
+        Os anúncios novos guardam a URL da primeira linha em que aparecem. Com descartar_url,
+        a coluna url_produto sai do DataFrame (ela continua recuperável por url()).
+        """
+        df = df.copy(deep=False)
+        if COLUNA_URL in df.columns:
+            urls = df[COLUNA_URL].to_numpy(dtype=object)
+            if 'id_anuncio' not in df.columns:
+                df['id_anuncio'] = extrair_id_anuncio(df[COLUNA_URL])
+            codigos = self.anuncios.codificar(df['id_anuncio'])
+            novos = codigos >= len(self.urls)
+            if novos.any():
+                # Códigos novos são consecutivos: a primeira URL de cada um, na ordem do código
+                self.urls.extend(pd.Series(urls[novos]).groupby(codigos[novos]).first().tolist())
+            df['codigo_anuncio'] = codigos
+            if descartar_url:
+                df = df.drop(columns=COLUNA_URL)
+        if 'nome_vendedor' in df.columns:
+            df['codigo_vendedor'] = self.vendedores.codificar(df['nome_vendedor'].astype(object))
+        return df
+
+    def url(self, codigos):
+        """URL original de cada código de anúncio (None para -1)."""
+        return [self.urls[codigo] if 0 <= codigo < len(self.urls) else None for codigo in np.atleast_1d(codigos)]
+
+    def id_anuncio(self, codigos):
+        return [self.anuncios.valores[codigo] if 0 <= codigo < len(self.anuncios) else None
+                for codigo in np.atleast_1d(codigos)]
+
+    def vendedor(self, codigos):
+        return [self.vendedores.valores[codigo] if 0 <= codigo < len(self.vendedores) else None
+                for codigo in np.atleast_1d(codigos)]
+
+    def salvar(self, caminho=ARQUIVO_IDENTIFICADORES):
+        # Gravação atômica: o dicionário anterior só é substituído depois de completo
+        temporario = caminho + '.tmp.npz'
+        np.savez(temporario,
+                 ids_anuncio=np.array(self.anuncios.valores, dtype=np.int64),
+                 urls=_textos_para_bytes(self.urls),
+                 vendedores=_textos_para_bytes(self.vendedores.valores))
+        os.replace(temporario, caminho)
+
+    @classmethod
+    def carregar(cls, caminho=ARQUIVO_IDENTIFICADORES):
+        identificadores = cls()
+        with np.load(caminho, allow_pickle=False) as dados:
+            identificadores.anuncios = DicionarioIds(dados['ids_anuncio'].tolist())
+            identificadores.urls = _bytes_para_textos(dados['urls'])
+            identificadores.vendedores = DicionarioIds(_bytes_para_textos(dados['vendedores']))
+        return identificadores
+
+
+def carregar_identificadores(caminho=ARQUIVO_IDENTIFICADORES):
+    """Dicionário persistente, ou um vazio na primeira execução."""
+    if os.path.exists(caminho):
+        return Identificadores.carregar(caminho)
+    return Identificadores()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dicionário de identificadores de anúncios e vendedores.")
+    parser.add_argument('--arquivo', default=ARQUIVO_IDENTIFICADORES)
+    sub = parser.add_subparsers(dest='comando', required=True)
+    sub.add_parser('mostrar', help="Mostra o tamanho dos dicionários.")
+    consulta = sub.add_parser('url', help="URL original de um anúncio (pelo id MLB ou pelo código).")
+    consulta.add_argument('anuncio')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.arquivo):
+        print(f"ERRO: Arquivo '{args.arquivo}' não encontrado. Execute o script 'analise.py' primeiro.")
+        sys.exit()
+    identificadores = Identificadores.carregar(args.arquivo)
+
+    if args.comando == 'mostrar':
+        print(f"{len(identificadores.anuncios)} anúncios e {len(identificadores.vendedores)} vendedores "
+              f"({os.path.getsize(args.arquivo) / 1024:.0f} KB).")
+    elif args.comando == 'url':
+        texto = args.anuncio.upper().replace('MLB-', 'MLB')
+        if texto.startswith('MLB'):
+            codigo = identificadores.anuncios.codigo(int(texto[3:]))
+        else:
+            codigo = int(texto)
+        if codigo < 0 or codigo >= len(identificadores.anuncios):
+            print(f"Anúncio '{args.anuncio}' não encontrado no dicionário.")
+            return
+        id_anuncio = identificadores.anuncios.valores[codigo]
+        print(f"Código {codigo}: MLB{id_anuncio}")
+        print(f"URL original: {identificadores.urls[codigo]}")
+        print(f"URL canônica: {url_canonica(id_anuncio)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,318 @@
+# --- MÓDULO: indice_vendedores.py ---
+# Índice de risco por vendedor, mantido de forma incremental a cada execução.
+#
+# O banco de resultados guarda anúncio por anúncio; responder "quais vendedores concentram
+# mais anúncios suspeitos" exigiria reagrupar todas as execuções. Aqui cada execução do
+# analise.py atualiza o índice:
+#   - anuncios_vendedores: um registro por anúncio (id_anuncio), com o vendedor e o último
+#     resultado dele (suspeito, preço anômalo, indicador de risco). Uma coleta repetida só
+#     atualiza os registros, então as contagens não dobram a cada execução;
+#   - vendedores: anúncios distintos, suspeitos, anúncios com preço anômalo, soma, média e
+#     máximo do indicador de risco, recalculados a partir de anuncios_vendedores só para os
+#     vendedores vistos na execução e para os donos anteriores dos anúncios dela, quando um
+#     anúncio muda de vendedor (busca pelo índice do vendedor, sem reler o histórico);
+#   - reputacao_vendedores: as cores de reputação vistas, com o número de anúncios de cada
+#     cor na última execução em que ela apareceu.
+# Os blocos de uma execução ficam em memória (um registro por anúncio distinto) e são
+# gravados em uma única transação ao final. A consulta de um vendedor é uma busca pela
+# chave primária e os rankings usam índices por métrica (ORDER BY ... LIMIT n percorre só
+# o início do índice).
+#
+# Uso:
+#   python indice_vendedores.py top [--ordem proporcao_suspeitos] [--min-anuncios 5] [--limite 20]
+#   python indice_vendedores.py vendedor "NOME DO VENDEDOR"
+
+import argparse
+import sqlite3
+import time
+from contextlib import closing
+
+import pandas as pd
+
+from identificadores import chaves_anuncio
+
+BANCO_VENDEDORES = 'vendedores_risco.db'
+MIN_ANUNCIOS_RANKING = 3 # Vendedores com menos anúncios acumulados ficam fora dos rankings
+ORDENACOES = ['risco_medio', 'proporcao_suspeitos', 'risco_maximo', 'suspeitos', 'anomalias_preco']
+
+COLUNAS_VENDEDOR = [
+    'nome_vendedor', 'anuncios', 'suspeitos', 'proporcao_suspeitos', 'risco_medio', 'risco_maximo',
+    'anomalias_preco', 'reputacao_atual', 'execucoes', 'anuncios_ultima_execucao', 'primeira_vez', 'ultima_vez'
+]
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS vendedores (
+    nome_vendedor TEXT PRIMARY KEY COLLATE NOCASE,
+    anuncios INTEGER NOT NULL,
+    suspeitos INTEGER NOT NULL,
+    anomalias_preco INTEGER NOT NULL,
+    soma_risco REAL NOT NULL,
+    risco_maximo REAL NOT NULL,
+    risco_medio REAL NOT NULL,
+    proporcao_suspeitos REAL NOT NULL,
+    reputacao_atual TEXT,
+    execucoes INTEGER NOT NULL,
+    anuncios_ultima_execucao INTEGER NOT NULL,
+    primeira_vez TEXT NOT NULL,
+    ultima_vez TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS anuncios_vendedores (
+    id_anuncio INTEGER PRIMARY KEY,
+    nome_vendedor TEXT NOT NULL COLLATE NOCASE,
+    suspeito INTEGER NOT NULL,
+    anomalia_preco INTEGER NOT NULL,
+    risco REAL NOT NULL,
+    ultima_vez TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_anuncios_vendedores_nome ON anuncios_vendedores (nome_vendedor);
+CREATE TABLE IF NOT EXISTS reputacao_vendedores (
+    nome_vendedor TEXT NOT NULL COLLATE NOCASE,
+    reputacao_cor TEXT NOT NULL COLLATE NOCASE,
+    anuncios INTEGER NOT NULL,
+    primeira_vez TEXT NOT NULL,
+    ultima_vez TEXT NOT NULL,
+    PRIMARY KEY (nome_vendedor, reputacao_cor)
+);
+""" + ''.join(
+    f"CREATE INDEX IF NOT EXISTS idx_vendedores_{coluna} ON vendedores ({coluna}, anuncios);\n"
+    for coluna in ORDENACOES
+)
+
+# O último resultado de cada anúncio substitui o anterior
+UPSERT_ANUNCIO = """
+INSERT INTO anuncios_vendedores (id_anuncio, nome_vendedor, suspeito, anomalia_preco, risco, ultima_vez)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (id_anuncio) DO UPDATE SET
+    nome_vendedor = excluded.nome_vendedor,
+    suspeito = excluded.suspeito,
+    anomalia_preco = excluded.anomalia_preco,
+    risco = excluded.risco,
+    ultima_vez = excluded.ultima_vez
+"""
+
+# Dados da execução; os totais são preenchidos por RECALCULAR_VENDEDORES
+UPSERT_VENDEDOR = """
+INSERT INTO vendedores (nome_vendedor, anuncios, suspeitos, anomalias_preco, soma_risco, risco_maximo, risco_medio,
+                        proporcao_suspeitos, reputacao_atual, execucoes, anuncios_ultima_execucao, primeira_vez, ultima_vez)
+VALUES (?, 0, 0, 0, 0, 0, 0, 0, ?, 1, ?, ?, ?)
+ON CONFLICT (nome_vendedor) DO UPDATE SET
+    reputacao_atual = COALESCE(excluded.reputacao_atual, reputacao_atual),
+    execucoes = execucoes + 1,
+    anuncios_ultima_execucao = excluded.anuncios_ultima_execucao,
+    ultima_vez = excluded.ultima_vez
+"""
+
+# Vendedores a recalcular (tabela temporária vendedores_execucao): os da execução e os donos
+# anteriores dos anúncios dela, que podem ter ficado sem nenhum anúncio
+ZERAR_VENDEDORES = """
+UPDATE vendedores SET anuncios = 0, suspeitos = 0, anomalias_preco = 0, soma_risco = 0, risco_maximo = 0,
+                      risco_medio = 0, proporcao_suspeitos = 0
+WHERE nome_vendedor IN (SELECT nome_vendedor FROM temp.vendedores_execucao)
+"""
+
+# Totais dos vendedores a recalcular, a partir dos anúncios distintos
+RECALCULAR_VENDEDORES = """
+UPDATE vendedores SET
+    anuncios = totais.anuncios,
+    suspeitos = totais.suspeitos,
+    anomalias_preco = totais.anomalias_preco,
+    soma_risco = totais.soma_risco,
+    risco_maximo = totais.risco_maximo,
+    risco_medio = totais.soma_risco / totais.anuncios,
+    proporcao_suspeitos = CAST(totais.suspeitos AS REAL) / totais.anuncios
+FROM (
+    SELECT nome_vendedor, COUNT(*) AS anuncios, SUM(suspeito) AS suspeitos, SUM(anomalia_preco) AS anomalias_preco,
+           SUM(risco) AS soma_risco, MAX(risco) AS risco_maximo
+    FROM anuncios_vendedores
+    WHERE nome_vendedor IN (SELECT nome_vendedor FROM temp.vendedores_execucao)
+    GROUP BY nome_vendedor
+) AS totais
+WHERE vendedores.nome_vendedor = totais.nome_vendedor
+"""
+
+UPSERT_REPUTACAO = """
+INSERT INTO reputacao_vendedores (nome_vendedor, reputacao_cor, anuncios, primeira_vez, ultima_vez)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (nome_vendedor, reputacao_cor) DO UPDATE SET
+    anuncios = excluded.anuncios,
+    ultima_vez = excluded.ultima_vez
+"""
+
+
+def conectar(caminho=BANCO_VENDEDORES):
+    conexao = sqlite3.connect(caminho)
+    conexao.execute('PRAGMA journal_mode = WAL')
+    conexao.execute('PRAGMA synchronous = NORMAL')
+    conexao.executescript(ESQUEMA)
+    return conexao
+
+
+def _como_texto(serie):
+    """Valores de uma coluna (categórica ou não) como texto, com NaN para ausentes."""
+    return serie.astype(object).where(serie.notna())
+
+
+def _primeira_grafia(serie):
+    """Troca cada valor pela primeira grafia vista entre os que só diferem em maiúsculas."""
+    minusculas = serie.str.lower()
+    return serie.groupby(minusculas, sort=False).transform('first').where(serie.notna())
+
+
+class AtualizadorVendedores:
+    """Acumula os anúncios pontuados de uma execução e os grava no índice de vendedores.
+
+    Uso:
+        vendedores = AtualizadorVendedores()
+        for df_pontuado in blocos:
+            vendedores.acrescentar(df_pontuado)
+        vendedores.gravar()
+
+    Fica em memória um registro por anúncio distinto da execução (id, vendedor, cor de
+    reputação e resultado), qualquer que seja o número de blocos. Anúncios sem vendedor são
+    ignorados; um anúncio repetido na execução conta uma vez, com a última linha.
+    """
+
+    def __init__(self, caminho=BANCO_VENDEDORES):
+        self.caminho = caminho
+        self._blocos = []
+
+    def acrescentar(self, df):
+        if 'nome_vendedor' not in df.columns:
+            return 0
+        vendedores = _como_texto(df['nome_vendedor'])
+        com_vendedor = vendedores.notna()
+        if not com_vendedor.any():
+            return 0
+        anomalo = df['feature_preco_anomalo'] if 'feature_preco_anomalo' in df.columns else pd.Series(0, index=df.index)
+        anuncios = pd.DataFrame({
+            'id_anuncio': chaves_anuncio(df),
+            'nome_vendedor': vendedores,
+            'reputacao_cor': _como_texto(df['reputacao_cor']) if 'reputacao_cor' in df.columns else None,
+            'suspeito': (df['classificacao_ia'] == 'Suspeito').astype(int),
+            'anomalia_preco': anomalo.fillna(0).astype(int),
+            'risco': df['indicador_de_risco_pct'].astype(float),
+        })[com_vendedor]
+        self._blocos.append(anuncios.drop_duplicates('id_anuncio', keep='last'))
+        if len(self._blocos) > 1:
+            # Reagrupa a cada bloco: a memória fica proporcional ao número de anúncios distintos
+            self._blocos = [pd.concat(self._blocos).drop_duplicates('id_anuncio', keep='last')]
+        return int(com_vendedor.sum())
+
+    def gravar(self):
+        """Grava os anúncios da execução e recalcula os seus vendedores em uma única transação.
+
+        Devolve o número de vendedores atualizados.
+        """
+        if not self._blocos:
+            return 0
+        agora = time.strftime('%Y-%m-%d %H:%M:%S')
+        anuncios = self._blocos[0]
+        # Nomes que só diferem em maiúsculas são o mesmo vendedor no banco (COLLATE NOCASE)
+        anuncios['nome_vendedor'] = _primeira_grafia(anuncios['nome_vendedor'])
+        anuncios['reputacao_cor'] = _primeira_grafia(anuncios['reputacao_cor'].astype(object))
+        por_vendedor = anuncios.groupby('nome_vendedor', sort=False).size()
+        reputacoes = anuncios.dropna(subset=['reputacao_cor']).groupby(['nome_vendedor', 'reputacao_cor'], sort=False).size()
+        # Reputação atual: a cor mais frequente do vendedor nesta execução
+        cores = reputacoes.rename('anuncios').reset_index().sort_values('anuncios', ascending=False, kind='stable')
+        reputacao_atual = cores.drop_duplicates('nome_vendedor').set_index('nome_vendedor')['reputacao_cor'].to_dict()
+
+        conexao = conectar(self.caminho)
+        try:
+            with conexao:
+                conexao.execute('CREATE TEMP TABLE IF NOT EXISTS vendedores_execucao '
+                                '(nome_vendedor TEXT PRIMARY KEY COLLATE NOCASE)')
+                conexao.execute('CREATE TEMP TABLE IF NOT EXISTS anuncios_execucao (id_anuncio INTEGER PRIMARY KEY)')
+                conexao.execute('DELETE FROM temp.vendedores_execucao')
+                conexao.execute('DELETE FROM temp.anuncios_execucao')
+                conexao.executemany('INSERT INTO temp.anuncios_execucao VALUES (?)',
+                                    ((int(id_anuncio),) for id_anuncio in anuncios['id_anuncio']))
+                # Um anúncio que mudou de vendedor sai dos totais do dono anterior
+                conexao.execute('INSERT OR IGNORE INTO temp.vendedores_execucao SELECT DISTINCT nome_vendedor '
+                                'FROM anuncios_vendedores WHERE id_anuncio IN (SELECT id_anuncio FROM temp.anuncios_execucao)')
+                conexao.executemany(UPSERT_ANUNCIO, (
+                    (int(a.id_anuncio), a.nome_vendedor, int(a.suspeito), int(a.anomalia_preco), float(a.risco), agora)
+                    for a in anuncios.itertuples(index=False)
+                ))
+                conexao.executemany(UPSERT_VENDEDOR, [
+                    (nome, reputacao_atual.get(nome), int(quantidade), agora, agora)
+                    for nome, quantidade in por_vendedor.items()
+                ])
+                conexao.executemany('INSERT OR IGNORE INTO temp.vendedores_execucao VALUES (?)',
+                                    ((nome,) for nome in por_vendedor.index))
+                conexao.execute(ZERAR_VENDEDORES)
+                conexao.execute(RECALCULAR_VENDEDORES)
+                conexao.executemany(UPSERT_REPUTACAO, [
+                    (nome, cor, int(quantidade), agora, agora) for (nome, cor), quantidade in reputacoes.items()
+                ])
+        finally:
+            conexao.close()
+        self._blocos = []
+        return len(por_vendedor)
+
+
+def consultar_vendedor(nome, caminho=BANCO_VENDEDORES):
+    """Devolve (registro do vendedor como dict, histórico de reputação), ou (None, None) se ele não estiver no índice."""
+    with closing(conectar(caminho)) as conexao:
+        conexao.row_factory = sqlite3.Row
+        linha = conexao.execute(f'SELECT {", ".join(COLUNAS_VENDEDOR)} FROM vendedores WHERE nome_vendedor = ?',
+                                (nome,)).fetchone()
+        if linha is None:
+            return None, None
+        conexao.row_factory = None
+        reputacoes = pd.read_sql_query(
+            'SELECT reputacao_cor, anuncios, primeira_vez, ultima_vez FROM reputacao_vendedores '
+            'WHERE nome_vendedor = ? ORDER BY primeira_vez, anuncios DESC', conexao, params=(nome,)
+        )
+    return dict(linha), reputacoes
+
+
+def top_vendedores(limite=20, ordem='risco_medio', min_anuncios=MIN_ANUNCIOS_RANKING, caminho=BANCO_VENDEDORES):
+    """Os `limite` vendedores com maior valor da métrica `ordem` (entre os que têm ao menos `min_anuncios`)."""
+    if ordem not in ORDENACOES:
+        raise ValueError(f"Ordenação desconhecida: '{ordem}'. Use uma de: {', '.join(ORDENACOES)}.")
+    with closing(conectar(caminho)) as conexao:
+        return pd.read_sql_query(
+            f'SELECT {", ".join(COLUNAS_VENDEDOR)} FROM vendedores WHERE anuncios >= ? '
+            f'ORDER BY {ordem} DESC, anuncios DESC LIMIT ?', conexao, params=(min_anuncios, limite)
+        )
+
+
+def total_vendedores(caminho=BANCO_VENDEDORES):
+    with closing(conectar(caminho)) as conexao:
+        return conexao.execute('SELECT COUNT(*) FROM vendedores').fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consultas ao índice de risco por vendedor.")
+    parser.add_argument('--banco', default=BANCO_VENDEDORES)
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    ranking = sub.add_parser('top', help="Vendedores de maior risco.")
+    ranking.add_argument('--ordem', choices=ORDENACOES, default='risco_medio')
+    ranking.add_argument('--min-anuncios', type=int, default=MIN_ANUNCIOS_RANKING)
+    ranking.add_argument('--limite', type=int, default=20)
+
+    consulta = sub.add_parser('vendedor', help="Indicadores e histórico de reputação de um vendedor.")
+    consulta.add_argument('nome')
+
+    args = parser.parse_args()
+    pd.set_option('display.width', 200)
+
+    if args.comando == 'top':
+        resultado = top_vendedores(args.limite, args.ordem, args.min_anuncios, args.banco)
+        print(f"{total_vendedores(args.banco)} vendedores no índice.")
+        print(resultado.round(3).to_string(index=False) if not resultado.empty else "Nenhum vendedor encontrado.")
+    elif args.comando == 'vendedor':
+        registro, reputacoes = consultar_vendedor(args.nome, args.banco)
+        if registro is None:
+            print(f"Vendedor '{args.nome}' não encontrado no índice.")
+            return
+        for campo, valor in registro.items():
+            print(f"{campo:>25}: {round(valor, 3) if isinstance(valor, float) else valor}")
+        if not reputacoes.empty:
+            print("\nHistórico de reputação:")
+            print(reputacoes.to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+# --- MÓDULO: instrumentacao.py ---
+# Instrumentação por etapa do pipeline de análise.
+#
+# Cada etapa instrumentada (leitura e limpeza, enriquecimento, features, inferência e
+# escrita do relatório) registra o tempo de parede, as linhas de entrada e saída, as
+# linhas descartadas e a variação de memória do processo. Os registros ficam em memória
+# e, se configurado, são acrescentados a um arquivo JSON lines. Opcionalmente cada etapa
+# é perfilada com cProfile, gerando um arquivo .prof por etapa.
+#
+# O modo silencioso desliga as mensagens de diagnóstico das funções do pipeline
+# (incluindo df.info() e head() na leitura), que custam tempo e poluem os logs em bases grandes.
+
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import time
+
+import pandas as pd
+
+ARQUIVO_METRICAS = 'metricas_pipeline.jsonl'
+PASTA_PERFIS = 'perfis'
+
+# Configuração do processo atual (ver configurar)
+_config = {'silencioso': False, 'arquivo_metricas': None, 'perfil': False, 'execucao': None}
+_registros = []
+
+
+def configurar(silencioso=False, arquivo_metricas=None, perfil=False, execucao=None):
+    """Define o modo silencioso, o arquivo de métricas (JSON lines) e o perfilamento com cProfile."""
+    _config.update({
+        'silencioso': silencioso,
+        'arquivo_metricas': arquivo_metricas,
+        'perfil': perfil,
+        'execucao': execucao or time.strftime('%Y%m%d-%H%M%S') + f'-{os.getpid()}',
+    })
+    _registros.clear()
+
+
+def configuracao():
+    """Configuração atual, para repassar a processos filhos (ver pontuacao_paralela)."""
+    return dict(_config)
+
+
+def silencioso():
+    return _config['silencioso']
+
+
+def log(*mensagem):
+    """print() para mensagens de diagnóstico, suprimido no modo silencioso."""
+    if not _config['silencioso']:
+        print(*mensagem)
+
+
+def registros():
+    """Registros das etapas da execução atual.
+
+    Com arquivo de métricas, inclui os registros gravados por processos filhos (workers).
+    """
+    caminho = _config['arquivo_metricas']
+    if not caminho or not os.path.exists(caminho):
+        return list(_registros)
+    with open(caminho, encoding='utf-8') as f:
+        todos = (json.loads(linha) for linha in f if linha.strip())
+        return [registro for registro in todos if registro.get('execucao') == _config['execucao']]
+
+
+def _memoria_rss_mb():
+    """Memória residente atual do processo em MB, ou None se não for possível medir."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class _Etapa:
+    """Contadores de uma etapa em andamento; quem mede preenche linhas_entrada/linhas_saida.
+
+    ignorar=True descarta a medição (ex: a leitura que só encontra o fim do arquivo).
+    """
+
+    def __init__(self, nome, linhas_entrada):
+        self.nome = nome
+        self.linhas_entrada = linhas_entrada
+        self.linhas_saida = None
+        self.ignorar = False
+
+
+@contextlib.contextmanager
+def medir_etapa(nome, linhas_entrada=None):
+    """Mede uma etapa do pipeline e registra o resultado ao final do bloco `with`."""
+    etapa = _Etapa(nome, linhas_entrada)
+    perfilador = cProfile.Profile() if _config['perfil'] else None
+    memoria_inicio = _memoria_rss_mb()
+    inicio = time.perf_counter()
+    if perfilador is not None:
+        perfilador.enable()
+    try:
+        yield etapa
+    finally:
+        if perfilador is not None:
+            perfilador.disable()
+        duracao = time.perf_counter() - inicio
+        if not etapa.ignorar:
+            _registrar(etapa, duracao, memoria_inicio, _memoria_rss_mb(), perfilador)
+
+
+def _registrar(etapa, duracao, memoria_inicio, memoria_fim, perfilador):
+    registro = {
+        'execucao': _config['execucao'],
+        'pid': os.getpid(),
+        'etapa': etapa.nome,
+        'inicio': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'segundos': round(duracao, 6),
+        'linhas_entrada': etapa.linhas_entrada,
+        'linhas_saida': etapa.linhas_saida,
+        'linhas_descartadas': (etapa.linhas_entrada - etapa.linhas_saida
+                               if etapa.linhas_entrada is not None and etapa.linhas_saida is not None else None),
+        'memoria_rss_mb': round(memoria_fim, 1) if memoria_fim is not None else None,
+        'memoria_delta_mb': round(memoria_fim - memoria_inicio, 1) if memoria_fim is not None else None,
+    }
+    if perfilador is not None:
+        os.makedirs(PASTA_PERFIS, exist_ok=True)
+        caminho = os.path.join(PASTA_PERFIS, f"{_config['execucao']}_{os.getpid()}_{len(_registros):04d}_{etapa.nome}.prof")
+        perfilador.dump_stats(caminho)
+        registro['perfil'] = caminho
+
+    _registros.append(registro)
+    if _config['arquivo_metricas']:
+        # Uma única escrita por registro: linhas de processos diferentes não se misturam
+        with open(_config['arquivo_metricas'], 'a', encoding='utf-8') as f:
+            f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+
+
+def instrumentar(nome):
+    """Decorador: mede a função como a etapa `nome`.
+
+    As linhas de entrada vêm do primeiro argumento, se for um DataFrame, ou do atributo
+    'linhas_lidas' do resultado (definido por clean_data); as de saída, do DataFrame devolvido.
+    """
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            entrada = len(args[0]) if args and isinstance(args[0], pd.DataFrame) else None
+            with medir_etapa(nome, entrada) as etapa:
+                resultado = funcao(*args, **kwargs)
+                if isinstance(resultado, pd.DataFrame):
+                    etapa.linhas_saida = len(resultado)
+                    if etapa.linhas_entrada is None:
+                        etapa.linhas_entrada = resultado.attrs.get('linhas_lidas')
+            return resultado
+        return envolvida
+    return decorador
+
+
+def resumo(registros_etapas=None):
+    """Tabela com o total por etapa: chamadas, tempo, linhas e maior variação de memória."""
+    tabela = pd.DataFrame(registros_etapas if registros_etapas is not None else registros())
+    if tabela.empty:
+        return tabela
+    return tabela.groupby('etapa', sort=False).agg(
+        chamadas=('segundos', 'size'),
+        segundos=('segundos', 'sum'),
+        linhas_entrada=('linhas_entrada', 'sum'),
+        linhas_saida=('linhas_saida', 'sum'),
+        linhas_descartadas=('linhas_descartadas', 'sum'),
+        memoria_delta_max_mb=('memoria_delta_mb', 'max'),
+    ).round({'segundos': 3})
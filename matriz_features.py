@@ -0,0 +1,211 @@
+# --- MÓDULO: matriz_features.py ---
+# Matriz de features em disco, lida por memory-map (sem cópia) por qualquer processo.
+#
+# O treino montava X como uma fatia do DataFrame de features, e cada worker de avaliação
+# (validação cruzada da busca, por exemplo) recebia uma cópia serializada dela. Aqui a
+# matriz de features e o vetor de rótulos são gravados uma vez em um arquivo binário:
+#   - cabeçalho de TAMANHO_CABECALHO bytes: assinatura + JSON com a lista de features, o
+#     número de linhas, os tipos e as posições de X e y (e quantas linhas iniciais são de treino);
+#   - X: linhas x colunas contíguas (ordem C) no tipo indicado (float64 por padrão);
+#   - y: vetor int8 com os rótulos (opcional, ausente em bases sem rótulo).
+# abrir_matriz devolve np.memmap de X e y: abrir o arquivo custa o mesmo qualquer que seja
+# o tamanho da base, as páginas só são lidas quando usadas e são compartilhadas entre os
+# processos pelo cache do sistema. Como a gravação é feita em blocos, a matriz de uma
+# base maior que a memória pode ser gerada e percorrida em blocos de linhas.
+#
+# Uso:
+#   python matriz_features.py mostrar [--arquivo matriz_treino.bin]
+#   python matriz_features.py gerar base_treino_manual.csv --separador ';' --chunksize 100000
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+
+ARQUIVO_MATRIZ = 'matriz_treino.bin'
+ASSINATURA = b'MATRIZF1'
+VERSAO_FORMATO = 1
+TAMANHO_CABECALHO = 4096 # Reservado inteiro, para que o cabeçalho possa ser reescrito ao final da gravação
+TIPO_X = 'float64'
+TIPO_Y = 'int8'
+
+
+class EscritorMatriz:
+    """Grava a matriz bloco a bloco; o arquivo só substitui o anterior ao final.
+
+    Uso:
+        with EscritorMatriz(caminho, features) as escritor:
+            for X_bloco, y_bloco in blocos:
+                escritor.escrever(X_bloco, y_bloco)
+            escritor.linhas_treino = ...  # opcional: as N primeiras linhas são de treino
+
+    Os rótulos vão para um arquivo auxiliar e são acrescentados depois de X, quando o
+    número de linhas já é conhecido.
+    """
+
+    def __init__(self, caminho, features, tipo_x=TIPO_X, origem=None):
+        self.caminho = caminho
+        self.features = list(features)
+        self.tipo_x = np.dtype(tipo_x)
+        self.origem = origem
+        self.linhas = 0
+        self.linhas_treino = None
+        self.com_rotulos = None
+
+    def __enter__(self):
+        self._temporario = self.caminho + '.tmp'
+        self._temporario_y = self.caminho + '.y.tmp'
+        self._arquivo = open(self._temporario, 'wb')
+        self._arquivo.write(b'\0' * TAMANHO_CABECALHO)
+        self._arquivo_y = open(self._temporario_y, 'w+b')
+        return self
+
+    def escrever(self, X, y=None):
+        X = np.ascontiguousarray(X, dtype=self.tipo_x)
+        if X.ndim != 2 or X.shape[1] != len(self.features):
+            raise ValueError(f"o bloco tem forma {X.shape}; esperado (linhas, {len(self.features)})")
+        if self.com_rotulos is None:
+            self.com_rotulos = y is not None
+        if (y is not None) != self.com_rotulos:
+            raise ValueError("todos os blocos devem ter rótulos, ou nenhum")
+        if y is not None:
+            y = np.asarray(y)
+            if len(y) != len(X):
+                raise ValueError(f"o bloco tem {len(X)} linhas e {len(y)} rótulos")
+            y.astype(TIPO_Y).tofile(self._arquivo_y)
+        X.tofile(self._arquivo)
+        self.linhas += len(X)
+
+    def cabecalho(self):
+        offset_y = TAMANHO_CABECALHO + self.linhas * len(self.features) * self.tipo_x.itemsize
+        return {
+            'formato': VERSAO_FORMATO,
+            'features': self.features,
+            'linhas': self.linhas,
+            'colunas': len(self.features),
+            'tipo_x': self.tipo_x.name,
+            'tipo_y': TIPO_Y if self.com_rotulos else None,
+            'offset_x': TAMANHO_CABECALHO,
+            'offset_y': offset_y if self.com_rotulos else None,
+            'linhas_treino': self.linhas_treino,
+            'origem': self.origem,
+            'criado_em': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+    def __exit__(self, tipo_erro, erro, rastreamento):
+        concluido = False
+        try:
+            if tipo_erro is None:
+                self._arquivo_y.seek(0)
+                shutil.copyfileobj(self._arquivo_y, self._arquivo)
+                cabecalho = ASSINATURA + json.dumps(self.cabecalho(), ensure_ascii=False).encode('utf-8')
+                if len(cabecalho) > TAMANHO_CABECALHO:
+                    raise ValueError(f"cabeçalho com {len(cabecalho)} bytes não cabe nos {TAMANHO_CABECALHO} reservados")
+                self._arquivo.seek(0)
+                self._arquivo.write(cabecalho)
+                concluido = True
+        finally:
+            self._arquivo.close()
+            self._arquivo_y.close()
+            os.remove(self._temporario_y)
+            if not concluido:
+                os.remove(self._temporario)
+        # Com erro no bloco, o arquivo anterior fica como estava e o erro original é propagado
+        if concluido:
+            os.replace(self._temporario, self.caminho)
+        return False
+
+
+def gravar_matriz(X, y=None, caminho=ARQUIVO_MATRIZ, features=None, linhas_treino=None, tipo_x=TIPO_X, origem=None):
+    """Grava uma matriz inteira (array ou DataFrame) de uma vez; devolve o cabeçalho."""
+    if features is None:
+        features = list(X.columns)
+    with EscritorMatriz(caminho, features, tipo_x, origem) as escritor:
+        escritor.escrever(X, y)
+        escritor.linhas_treino = linhas_treino
+    return escritor.cabecalho()
+
+
+def ler_cabecalho(caminho=ARQUIVO_MATRIZ):
+    with open(caminho, 'rb') as f:
+        bloco = f.read(TAMANHO_CABECALHO)
+    if not bloco.startswith(ASSINATURA):
+        raise ValueError(f"'{caminho}' não é uma matriz de features")
+    cabecalho = json.loads(bloco[len(ASSINATURA):].rstrip(b'\0').decode('utf-8'))
+    if cabecalho.get('formato') != VERSAO_FORMATO:
+        raise ValueError(f"formato {cabecalho.get('formato')} da matriz não é suportado (esperado: {VERSAO_FORMATO})")
+    return cabecalho
+
+
+def _mapear(caminho, tipo, offset, forma):
+    if forma[0] == 0:
+        return np.zeros(forma, dtype=tipo)
+    return np.memmap(caminho, dtype=tipo, mode='r', offset=offset, shape=forma)
+
+
+def abrir_matriz(caminho=ARQUIVO_MATRIZ, features=None):
+    """Devolve (X, y, cabeçalho), com X e y mapeados do arquivo (somente leitura, sem cópia).
+
+    y é None se a matriz não tiver rótulos. Com `features`, levanta ValueError se as colunas
+    da matriz não forem exatamente essas, na mesma ordem.
+    """
+    cabecalho = ler_cabecalho(caminho)
+    if features is not None and list(features) != cabecalho['features']:
+        raise ValueError(f"as colunas da matriz ({cabecalho['features']}) não conferem com as esperadas ({list(features)})")
+    linhas, colunas = cabecalho['linhas'], cabecalho['colunas']
+    X = _mapear(caminho, cabecalho['tipo_x'], cabecalho['offset_x'], (linhas, colunas))
+    y = None
+    if cabecalho['tipo_y'] is not None:
+        y = _mapear(caminho, cabecalho['tipo_y'], cabecalho['offset_y'], (linhas,))
+    return X, y, cabecalho
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Matriz de features em disco (memory-map).")
+    parser.add_argument('--arquivo', default=ARQUIVO_MATRIZ)
+    sub = parser.add_subparsers(dest='comando', required=True)
+    sub.add_parser('mostrar', help="Mostra o cabeçalho da matriz e a distribuição dos rótulos.")
+    geracao = sub.add_parser('gerar', help="Gera a matriz a partir de um CSV rotulado, lido em blocos.")
+    geracao.add_argument('csv')
+    geracao.add_argument('--separador', default=';')
+    geracao.add_argument('--chunksize', type=int, default=100_000)
+    geracao.add_argument('--mapa', default='avg_price_map.pkl')
+    args = parser.parse_args()
+
+    if args.comando == 'gerar':
+        from funcoes_analise import iter_load_and_clean_data, enrich_data, create_features
+        from referencia_precos import carregar_mapa_precos
+        from treinar_modelo import FEATURES_LIST, TARGET
+        try:
+            avg_price_map = carregar_mapa_precos(args.mapa, usar_referencia=False)
+        except FileNotFoundError:
+            print(f"ERRO: Arquivo '{args.mapa}' não encontrado. Execute o script 'treinar_modelo.py' primeiro.")
+            sys.exit()
+        blocos = iter_load_and_clean_data(args.csv, separator=args.separador, chunksize=args.chunksize, manter_url=False)
+        if blocos is None:
+            sys.exit()
+        with EscritorMatriz(args.arquivo, FEATURES_LIST, origem=os.path.abspath(args.csv)) as escritor:
+            for bloco in blocos:
+                bloco = create_features(enrich_data(bloco), avg_price_map)
+                if TARGET in bloco.columns:
+                    bloco = bloco.dropna(subset=[TARGET])
+                    escritor.escrever(bloco[FEATURES_LIST].fillna(0), bloco[TARGET])
+                else:
+                    escritor.escrever(bloco[FEATURES_LIST].fillna(0))
+        print(f"Matriz com {escritor.linhas} linhas salva em: {args.arquivo}")
+
+    if not os.path.exists(args.arquivo):
+        print(f"ERRO: Arquivo '{args.arquivo}' não encontrado. Execute o script 'treinar_modelo.py' primeiro.")
+        sys.exit()
+    X, y, cabecalho = abrir_matriz(args.arquivo)
+    print(json.dumps(cabecalho, ensure_ascii=False, indent=2))
+    if y is not None and len(y):
+        print(f"Rótulos: {dict(zip(*(valores.tolist() for valores in np.unique(y, return_counts=True))))}")
+
+
+if __name__ == '__main__':
+    main()
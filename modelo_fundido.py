@@ -0,0 +1,82 @@
+# --- MÓDULO: modelo_fundido.py ---
+# Inferência em NumPy puro para o pipeline StandardScaler + LogisticRegression.
+#
+# A padronização é linear, então pode ser incorporada aos pesos da regressão:
+#   z = ((x - media) / escala) . w + b  =  x . (w / escala) + (b - (media / escala) . w)
+# O artefato resultante guarda só os pesos, o intercepto e a lista de features, e a
+# probabilidade e a classe saem de uma única passada sobre a matriz float32.
+
+import os
+
+import numpy as np
+
+ARQUIVO_MODELO_FUNDIDO = 'modelo_risco_fundido.npz'
+
+
+class ModeloFundido:
+    """Regressão logística com o StandardScaler incorporado aos pesos."""
+
+    def __init__(self, pesos, intercepto, features):
+        self.pesos = np.ascontiguousarray(pesos, dtype=np.float32)
+        self.intercepto = np.float32(intercepto)
+        self.features = list(features)
+
+    @classmethod
+    def from_pipeline(cls, pipeline, features_list):
+        """Gera o modelo fundido a partir de um Pipeline treinado (scaler opcional + modelo linear)."""
+        modelo = pipeline.steps[-1][1]
+        pesos = np.asarray(modelo.coef_, dtype=np.float64).ravel()
+        intercepto = float(np.ravel(modelo.intercept_)[0])
+
+        scaler = dict(pipeline.steps).get('scaler')
+        if scaler is not None:
+            escala = scaler.scale_ if scaler.scale_ is not None else np.ones_like(pesos)
+            media = scaler.mean_ if scaler.mean_ is not None else np.zeros_like(pesos)
+            pesos = pesos / escala
+            intercepto -= float(np.dot(pesos, media))
+        return cls(pesos, intercepto, features_list)
+
+    def salvar(self, caminho=ARQUIVO_MODELO_FUNDIDO):
+        np.savez(caminho, pesos=self.pesos, intercepto=self.intercepto, features=np.array(self.features))
+
+    @classmethod
+    def carregar(cls, caminho=ARQUIVO_MODELO_FUNDIDO):
+        with np.load(caminho, allow_pickle=False) as dados:
+            return cls(dados['pesos'], dados['intercepto'], dados['features'].tolist())
+
+    def prever(self, X):
+        """Devolve (classes, probabilidades da classe 1) em uma única passada.
+
+        X pode ser uma matriz (n, features) ou um único vetor de features; neste caso
+        a classe e a probabilidade são devolvidas como escalares.
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        unico = X.ndim == 1
+        z = np.atleast_2d(X) @ self.pesos
+        z += self.intercepto
+        classes = (z > 0).astype(np.int64)
+        # Sigmoide numericamente estável: 1 / (1 + e^-z) = e^(-log(1 + e^-z))
+        np.logaddexp(0, -z, out=z)
+        np.negative(z, out=z)
+        np.exp(z, out=z)
+        if unico:
+            return classes[0], z[0]
+        return classes, z
+
+
+def carregar_modelo(caminho_pipeline='modelo_risco.pkl', caminho_fundido=ARQUIVO_MODELO_FUNDIDO, usar_fundido=True):
+    """Carrega o modelo de pontuação, preferindo o artefato fundido quando ele existir."""
+    if usar_fundido and os.path.exists(caminho_fundido):
+        return ModeloFundido.carregar(caminho_fundido)
+    import joblib
+    return joblib.load(caminho_pipeline)
+
+
+def predict_risk(modelo, X):
+    """Aplica o modelo e devolve (classes, probabilidades da classe 1).
+
+    Aceita tanto o ModeloFundido quanto um estimador do sklearn (predict + predict_proba).
+    """
+    if isinstance(modelo, ModeloFundido):
+        return modelo.prever(X)
+    return modelo.predict(X), modelo.predict_proba(X)[:, 1]
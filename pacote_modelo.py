@@ -0,0 +1,130 @@
+# --- MÓDULO: pacote_modelo.py ---
+# Pacote único e versionado com os artefatos de pontuação.
+#
+# O analise.py precisava de três pickles (modelo_risco.pkl, avg_price_map.pkl e
+# features_list.pkl) mais o modelo fundido. O pacote junta em um único .npz, lido com
+# allow_pickle=False (nenhum objeto arbitrário é desserializado):
+#   - manifesto: JSON com a versão do formato, a versão do conteúdo, a lista de features,
+#     o hash do esquema e a origem (treino completo ou incremental);
+#   - pesos e intercepto do modelo fundido (StandardScaler incorporado à regressão);
+#   - mapa de preços do treino, como dois vetores (modelos e preços).
+# O hash do esquema identifica as features esperadas e o tipo da matriz (float32); ele é
+# conferido na leitura e pode ser comparado por quem monta a matriz de features.
+#
+# Uso:
+#   python pacote_modelo.py mostrar
+#   python pacote_modelo.py gerar     (monta o pacote a partir dos artefatos separados)
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from modelo_fundido import ModeloFundido, ARQUIVO_MODELO_FUNDIDO
+
+ARQUIVO_PACOTE = 'modelo_risco_pacote.npz'
+VERSAO_FORMATO = 1
+TIPO_MATRIZ = 'float32' # Tipo da matriz de features recebida pelo ModeloFundido.prever
+
+
+def hash_esquema(features):
+    """Hash da lista de features (nomes e ordem) e do tipo da matriz de entrada."""
+    esquema = json.dumps({'formato': VERSAO_FORMATO, 'features': list(features), 'tipo': TIPO_MATRIZ})
+    return hashlib.blake2b(esquema.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def _versao_conteudo(modelo, modelos_preco, valores_preco):
+    h = hashlib.blake2b(digest_size=8)
+    for parte in (modelo.pesos, np.float32(modelo.intercepto), modelos_preco, valores_preco):
+        h.update(np.ascontiguousarray(parte).tobytes())
+    h.update(json.dumps(modelo.features).encode('utf-8'))
+    return h.hexdigest()
+
+
+def salvar_pacote(modelo, avg_price_map, caminho=ARQUIVO_PACOTE, origem='treinar_modelo', extras=None):
+    """Grava o pacote (modelo fundido + mapa de preços + manifesto) e devolve o manifesto."""
+    modelos_preco = np.array(list(avg_price_map.keys()), dtype=str)
+    valores_preco = np.array(list(avg_price_map.values()), dtype=np.float64)
+    manifesto = {
+        'formato': VERSAO_FORMATO,
+        'versao': _versao_conteudo(modelo, modelos_preco, valores_preco),
+        'criado_em': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'origem': origem,
+        'features': modelo.features,
+        'hash_esquema': hash_esquema(modelo.features),
+        'modelos_preco': len(modelos_preco),
+    }
+    manifesto.update(extras or {})
+    # Gravação atômica: o pacote anterior só é substituído depois de completo
+    temporario = caminho + '.tmp.npz'
+    np.savez(temporario, manifesto=np.array(json.dumps(manifesto, ensure_ascii=False)),
+             pesos=modelo.pesos, intercepto=modelo.intercepto,
+             modelos_preco=modelos_preco, valores_preco=valores_preco)
+    os.replace(temporario, caminho)
+    return manifesto
+
+
+def ler_manifesto(caminho=ARQUIVO_PACOTE):
+    """Só o manifesto do pacote (os vetores do .npz não são lidos)."""
+    with np.load(caminho, allow_pickle=False) as dados:
+        return json.loads(str(dados['manifesto']))
+
+
+def carregar_pacote(caminho=ARQUIVO_PACOTE):
+    """Devolve (modelo fundido, mapa de preços, lista de features, manifesto).
+
+    Levanta ValueError se o formato for de outra versão ou se o esquema não conferir.
+    """
+    with np.load(caminho, allow_pickle=False) as dados:
+        manifesto = json.loads(str(dados['manifesto']))
+        if manifesto.get('formato') != VERSAO_FORMATO:
+            raise ValueError(f"formato {manifesto.get('formato')} do pacote não é suportado (esperado: {VERSAO_FORMATO})")
+        features = manifesto['features']
+        if manifesto.get('hash_esquema') != hash_esquema(features) or len(dados['pesos']) != len(features):
+            raise ValueError("o esquema de features do pacote não confere com os pesos gravados")
+        modelo = ModeloFundido(dados['pesos'], dados['intercepto'], features)
+        avg_price_map = dict(zip(dados['modelos_preco'].tolist(), dados['valores_preco'].tolist()))
+    return modelo, avg_price_map, list(features), manifesto
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pacote de artefatos do modelo de risco.")
+    parser.add_argument('--arquivo', default=ARQUIVO_PACOTE)
+    sub = parser.add_subparsers(dest='comando', required=True)
+    sub.add_parser('mostrar', help="Mostra o manifesto do pacote.")
+    geracao = sub.add_parser('gerar', help="Monta o pacote a partir dos artefatos separados do treino.")
+    geracao.add_argument('--modelo', default='modelo_risco.pkl')
+    geracao.add_argument('--mapa', default='avg_price_map.pkl')
+    geracao.add_argument('--features', default='features_list.pkl')
+    args = parser.parse_args()
+
+    if args.comando == 'gerar':
+        import joblib
+        try:
+            features_list = joblib.load(args.features)
+            avg_price_map = joblib.load(args.mapa)
+            if os.path.exists(ARQUIVO_MODELO_FUNDIDO):
+                modelo = ModeloFundido.carregar(ARQUIVO_MODELO_FUNDIDO)
+            else:
+                modelo = ModeloFundido.from_pipeline(joblib.load(args.modelo), features_list)
+        except FileNotFoundError as e:
+            print(f"ERRO: {e}. Execute o script 'treinar_modelo.py' primeiro.")
+            sys.exit()
+        if modelo.features != list(features_list):
+            print(f"ERRO: '{ARQUIVO_MODELO_FUNDIDO}' não corresponde a '{args.features}'. Execute o script 'treinar_modelo.py' novamente.")
+            sys.exit()
+        salvar_pacote(modelo, avg_price_map, args.arquivo, origem='pacote_modelo gerar')
+        print(f"Pacote de artefatos salvo em: {args.arquivo}")
+
+    if not os.path.exists(args.arquivo):
+        print(f"ERRO: Arquivo '{args.arquivo}' não encontrado. Execute o script 'treinar_modelo.py' primeiro.")
+        sys.exit()
+    print(json.dumps(ler_manifesto(args.arquivo), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
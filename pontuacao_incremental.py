@@ -0,0 +1,129 @@
+# --- MÓDULO: pontuacao_incremental.py ---
+# Pontuação incremental (delta) entre coletas.
+#
+# Coletas consecutivas repetem a maior parte dos anúncios. Este módulo mantém um
+# histórico persistente das pontuações já calculadas, indexado pela impressão digital
+# de cada anúncio (URL sem parâmetros de rastreamento + campos usados pelo modelo).
+# A cada execução, apenas anúncios novos ou alterados passam por enrich_data,
+# create_features e pelo modelo; os demais reaproveitam o resultado guardado.
+# O preço de referência (referencia_precos.npz) muda a cada coleta incorporada: um anúncio
+# conhecido só é pontuado de novo se a feature de preço anômalo, recalculada com o mapa
+# atual a partir do modelo de cartucho guardado, mudar.
+
+import hashlib
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from funcoes_analise import score_data, chave_anuncio, marcar_preco_anomalo
+from cache_dados import versao_parser
+
+HISTORICO_PONTUACAO = 'historico_pontuacao.pkl'
+RETENCAO_DIAS = 30 # Anúncios não vistos há mais tempo que isso são descartados do histórico
+
+# Campos que determinam o resultado do modelo para um anúncio
+CAMPOS_IMPRESSAO = ['titulo', 'preco', 'avaliacao_numero', 'reputacao_cor']
+
+
+def impressao_digital(df):
+    """Calcula um hash de 64 bits por linha a partir da chave do anúncio e dos campos do modelo."""
+    campos = pd.DataFrame(index=df.index)
+    if 'id_anuncio' in df.columns:
+        campos['chave'] = df['id_anuncio']
+    elif 'url_produto' in df.columns:
+        campos['chave'] = chave_anuncio(df['url_produto'])
+    else:
+        campos['chave'] = ''
+    for coluna in CAMPOS_IMPRESSAO:
+        campos[coluna] = df[coluna] if coluna in df.columns else None
+    return pd.util.hash_pandas_object(campos.astype(str), index=False)
+
+
+def versao_modelo(caminhos_artefatos):
+    """Identifica a versão do modelo e do código de features; pontuações de outra versão são descartadas."""
+    h = hashlib.blake2b(versao_parser().encode(), digest_size=8)
+    for caminho in caminhos_artefatos:
+        with open(caminho, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def carregar_historico(caminho, versao):
+    """Carrega o histórico de pontuações, ou devolve None se não existir ou for de outra versão do modelo."""
+    if not os.path.exists(caminho):
+        return None
+    historico = joblib.load(caminho)
+    if historico.get('versao') != versao:
+        print("Modelo ou código de features mudou desde a última execução: o histórico de pontuações será refeito.")
+        return None
+    return historico['pontuacoes']
+
+
+def salvar_historico(caminho, versao, pontuacoes):
+    joblib.dump({'versao': versao, 'pontuacoes': pontuacoes}, caminho + '.tmp')
+    os.replace(caminho + '.tmp', caminho)
+
+
+def pontuar_incremental(df, modelo, avg_price_map, features_list, versao, caminho=HISTORICO_PONTUACAO):
+    """Pontua a base limpa reaproveitando o histórico; só anúncios novos ou alterados vão ao modelo.
+
+    Retorna o mesmo DataFrame que score_data(df, ...) devolveria, na mesma ordem de linhas.
+    """
+    if df.empty:
+        # Coleta vazia: nada a pontuar nem a registrar no histórico
+        return score_data(df, modelo, avg_price_map, features_list)
+
+    impressoes = impressao_digital(df)
+    historico = carregar_historico(caminho, versao)
+
+    if historico is not None:
+        conhecidos = impressoes.isin(historico.index).to_numpy(copy=True)
+    else:
+        conhecidos = np.zeros(len(df), dtype=bool)
+
+    # Anúncios conhecidos cuja feature de preço anômalo muda com o mapa de preços atual
+    referencia_mudou = 0
+    if conhecidos.any():
+        guardados = historico.loc[impressoes[conhecidos]]
+        anomalo = marcar_preco_anomalo(guardados['compatibilidade'], guardados['modelo_cartucho'],
+                                       df['preco'].to_numpy()[conhecidos], avg_price_map)
+        mudou = anomalo != guardados['feature_preco_anomalo'].to_numpy()
+        conhecidos[np.flatnonzero(conhecidos)[mudou]] = False
+        referencia_mudou = int(mudou.sum())
+
+    print(f"Pontuação incremental: {int(conhecidos.sum())} anúncios reaproveitados, "
+          f"{int((~conhecidos).sum())} novos ou alterados"
+          + (f" ({referencia_mudou} pelo preço de referência)." if referencia_mudou else "."))
+
+    partes = []
+    colunas_pontuacao = None
+    if (~conhecidos).any():
+        df_novos = score_data(df[~conhecidos], modelo, avg_price_map, features_list)
+        colunas_pontuacao = [col for col in df_novos.columns if col not in df.columns]
+        partes.append(df_novos)
+
+    if conhecidos.any():
+        if colunas_pontuacao is None:
+            colunas_pontuacao = [col for col in historico.columns if col != 'visto_em']
+        df_conhecidos = df[conhecidos].copy()
+        reaproveitados = historico.loc[impressoes[conhecidos], colunas_pontuacao]
+        for coluna in colunas_pontuacao:
+            df_conhecidos[coluna] = reaproveitados[coluna].to_numpy()
+        partes.append(df_conhecidos)
+
+    df_final = pd.concat(partes).reindex(df.index) if len(partes) > 1 else partes[0]
+
+    # Atualização do histórico: entram as pontuações desta coleta, saem as não vistas há muito tempo
+    agora = time.time()
+    atuais = df_final[colunas_pontuacao].copy()
+    atuais.index = pd.Index(impressoes.to_numpy(), dtype='uint64')
+    atuais = atuais[~atuais.index.duplicated(keep='last')]
+    atuais['visto_em'] = agora
+    if historico is not None:
+        retidos = historico[~historico.index.isin(atuais.index) & (historico['visto_em'] >= agora - RETENCAO_DIAS * 86400)]
+        atuais = pd.concat([retidos, atuais])
+    salvar_historico(caminho, versao, atuais)
+    return df_final
@@ -0,0 +1,99 @@
+# --- MÓDULO: pontuacao_paralela.py ---
+# Pontuação paralela em múltiplos núcleos.
+#
+# O CSV de entrada é lido em blocos pelo processo principal e cada bloco é enviado a um
+# pool de processos. Cada worker carrega os artefatos do modelo uma única vez (no
+# inicializador: o pacote de artefatos ou os arquivos separados do treino) e executa limpeza -> enriquecimento -> features -> modelo no seu bloco.
+# Os resultados são devolvidos na ordem original dos blocos, então a saída é idêntica
+# à do modo serial.
+
+import signal
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import instrumentacao
+from funcoes_analise import clean_data, score_data, opcoes_leitura
+from instrumentacao import medir_etapa
+from modelo_fundido import carregar_modelo
+from pacote_modelo import carregar_pacote
+
+# Artefatos carregados uma vez por worker
+_modelo = None
+_avg_price_map = None
+_features_list = None
+
+
+def _iniciar_worker(caminhos_artefatos, usar_fundido, configuracao_instrumentacao, avg_price_map=None,
+                    ignorar_interrupcao=False):
+    global _modelo, _avg_price_map, _features_list
+    if ignorar_interrupcao:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Os workers usam o mesmo modo silencioso, arquivo de métricas e id de execução do processo principal
+    instrumentacao.configurar(**configuracao_instrumentacao)
+    if len(caminhos_artefatos) == 1:
+        # Pacote de artefatos: um único .npz, sem desserializar pickles
+        _modelo, mapa_pacote, _features_list, _ = carregar_pacote(caminhos_artefatos[0])
+        _avg_price_map = avg_price_map if avg_price_map is not None else mapa_pacote
+        return
+    import joblib
+    caminho_modelo, caminho_mapa, caminho_features = caminhos_artefatos[:3]
+    _modelo = carregar_modelo(caminho_modelo, usar_fundido=usar_fundido)
+    # O mapa de preços pode vir pronto do processo principal (referência de preços incremental)
+    _avg_price_map = avg_price_map if avg_price_map is not None else joblib.load(caminho_mapa)
+    _features_list = joblib.load(caminho_features)
+
+
+def pontuar_bloco(bloco):
+    """Limpa e pontua um bloco bruto do CSV com os artefatos do worker (None se nada sobrar)."""
+    with medir_etapa('load_and_clean_data', len(bloco)) as etapa:
+        bloco = clean_data(bloco)
+        etapa.linhas_saida = len(bloco)
+    if bloco.empty:
+        return None
+    return score_data(bloco, _modelo, _avg_price_map, _features_list)
+
+
+def criar_pool(workers, caminhos_artefatos, usar_fundido=True, avg_price_map=None, ignorar_interrupcao=False):
+    """Pool de processos em que cada worker já carregou os artefatos do modelo (use com pontuar_bloco).
+
+    Com ignorar_interrupcao=True os workers não recebem o Ctrl+C, para que quem criou o pool
+    conclua o trabalho em andamento antes de encerrá-lo.
+    """
+    return ProcessPoolExecutor(max_workers=workers, initializer=_iniciar_worker,
+                               initargs=(list(caminhos_artefatos), usar_fundido, instrumentacao.configuracao(),
+                                         avg_price_map, ignorar_interrupcao))
+
+
+def iter_pontuar_paralelo(filepath, separator, chunksize, workers, caminhos_artefatos, usar_fundido=True,
+                          avg_price_map=None, manter_url=True):
+    """Pontua o CSV em blocos distribuídos entre `workers` processos.
+
+    Devolve um iterador dos blocos pontuados, na ordem original do arquivo, ou None se o
+    arquivo não existir. No máximo 2 * workers blocos ficam em processamento ao mesmo
+    tempo, o que mantém a memória limitada mesmo em arquivos muito grandes. `caminhos_artefatos`
+    é [pacote] ou [modelo, mapa, features] (mais o modelo fundido, ignorado aqui). Se
+    `avg_price_map` for informado, é usado no lugar do mapa gravado nos artefatos.
+    """
+    try:
+        leitor = pd.read_csv(filepath, sep=separator, chunksize=chunksize, **opcoes_leitura(manter_url))
+    except FileNotFoundError:
+        print(f"Erro: Arquivo '{filepath}' não encontrado. Certifique-se de que ele está na mesma pasta que o script.")
+        return None
+
+    def blocos_pontuados():
+        with leitor, criar_pool(workers, caminhos_artefatos, usar_fundido, avg_price_map) as pool:
+            pendentes = deque()
+            for bloco in leitor:
+                pendentes.append(pool.submit(pontuar_bloco, bloco))
+                if len(pendentes) >= 2 * workers:
+                    resultado = pendentes.popleft().result()
+                    if resultado is not None:
+                        yield resultado
+            while pendentes:
+                resultado = pendentes.popleft().result()
+                if resultado is not None:
+                    yield resultado
+
+    return blocos_pontuados()
@@ -0,0 +1,220 @@
+# --- MÓDULO: referencia_precos.py ---
+# Preços de referência por modelo de cartucho, atualizados a cada coleta.
+#
+# O avg_price_map.pkl é calculado no treino e fica congelado até o próximo treinamento.
+# Esta estrutura guarda, para cada modelo de cartucho (só anúncios "Original"):
+#   - a soma ponderada dos preços e dos pesos, para a média exata;
+#   - um histograma de preços em escala logarítmica com NUM_FAIXAS faixas, de onde saem
+#     a mediana e outros quantis.
+# A memória é constante (NUM_FAIXAS + 2 números por modelo), qualquer que seja o número de
+# anúncios vistos. O decaimento temporal multiplica todos os pesos por 0,5 a cada
+# `meia_vida_dias`, de modo que coletas recentes pesam mais que as antigas.
+# Para que reprocessar o mesmo arquivo não conte os seus preços duas vezes, a referência
+# guarda o hash do conteúdo das últimas ENTRADAS_LEMBRADAS coletas incorporadas.
+#
+# Uso:
+#   python referencia_precos.py mostrar
+#   python referencia_precos.py atualizar dataset_mercado_livre.csv
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+ARQUIVO_REFERENCIA = 'referencia_precos.npz'
+MEIA_VIDA_DIAS = 30.0 # Após esse período, o peso de uma coleta cai pela metade (0 = sem decaimento)
+ESTATISTICA_REFERENCIA = 'media' # Estatística usada como preço de referência nas features
+ENTRADAS_LEMBRADAS = 256 # Hashes das últimas coletas incorporadas guardados na referência
+
+# Faixas do histograma: preços de R$ 1 a R$ 10.000 em escala logarítmica (~3,7% por faixa)
+NUM_FAIXAS = 256
+PRECO_MIN, PRECO_MAX = 1.0, 10_000.0
+_LOG_MIN, _LOG_MAX = np.log(PRECO_MIN), np.log(PRECO_MAX)
+
+# Estatísticas aceitas além da média: quantis do histograma
+QUANTIS = {'mediana': 0.5, 'p10': 0.1, 'p25': 0.25, 'p75': 0.75, 'p90': 0.9}
+
+
+class ReferenciaPrecos:
+    """Estatísticas de preço por modelo de cartucho, com atualização incremental e decaimento."""
+
+    def __init__(self, meia_vida_dias=MEIA_VIDA_DIAS):
+        self.meia_vida_dias = meia_vida_dias
+        self.modelos = []
+        self.histogramas = np.zeros((0, NUM_FAIXAS))
+        self.soma_pesos = np.zeros(0)
+        self.soma_precos = np.zeros(0)
+        self.atualizado_em = None
+        self.entradas = [] # Hash do conteúdo das coletas já incorporadas (as mais recentes no fim)
+
+    def _indice_modelo(self, modelo):
+        try:
+            return self.modelos.index(modelo)
+        except ValueError:
+            self.modelos.append(modelo)
+            self.histogramas = np.vstack([self.histogramas, np.zeros(NUM_FAIXAS)])
+            self.soma_pesos = np.append(self.soma_pesos, 0.0)
+            self.soma_precos = np.append(self.soma_precos, 0.0)
+            return len(self.modelos) - 1
+
+    def _decair(self, agora):
+        if self.atualizado_em is not None and self.meia_vida_dias and agora > self.atualizado_em:
+            fator = 0.5 ** ((agora - self.atualizado_em) / 86400 / self.meia_vida_dias)
+            self.histogramas *= fator
+            self.soma_pesos *= fator
+            self.soma_precos *= fator
+        self.atualizado_em = agora if self.atualizado_em is None else max(agora, self.atualizado_em)
+
+    def atualizar(self, df, agora=None):
+        """Incorpora os anúncios "Original" de uma coleta (colunas compatibilidade, modelo_cartucho, preco).
+
+        Os pesos acumulados decaem pelo tempo desde a última atualização antes da soma.
+        Devolve o número de anúncios incorporados.
+        """
+        self._decair(time.time() if agora is None else agora)
+        originais = df[(df['compatibilidade'] == 'Original') & df['preco'].notna() & df['modelo_cartucho'].notna()]
+        if originais.empty:
+            return 0
+
+        precos = originais['preco'].to_numpy(dtype=float)
+        faixas = _faixa(precos)
+        codigos, modelos = _fatorar(originais['modelo_cartucho'].to_numpy())
+        for codigo, modelo in enumerate(modelos):
+            mascara = codigos == codigo
+            indice = self._indice_modelo(modelo)
+            self.histogramas[indice] += np.bincount(faixas[mascara], minlength=NUM_FAIXAS)
+            self.soma_pesos[indice] += mascara.sum()
+            self.soma_precos[indice] += precos[mascara].sum()
+        return len(originais)
+
+    def incorporada(self, entrada):
+        """Indica se a coleta com esse hash de conteúdo já foi incorporada."""
+        return entrada in self.entradas
+
+    def registrar_entrada(self, entrada):
+        """Marca a coleta como incorporada; só as ENTRADAS_LEMBRADAS mais recentes são guardadas."""
+        self.entradas = [e for e in self.entradas if e != entrada][-(ENTRADAS_LEMBRADAS - 1):] + [entrada]
+
+    def valor(self, modelo, estatistica=ESTATISTICA_REFERENCIA):
+        """Preço de referência de um modelo, ou NaN se o modelo nunca foi visto."""
+        if modelo not in self.modelos:
+            return np.nan
+        indice = self.modelos.index(modelo)
+        if self.soma_pesos[indice] <= 0:
+            return np.nan
+        if estatistica == 'media':
+            return float(self.soma_precos[indice] / self.soma_pesos[indice])
+        if estatistica not in QUANTIS:
+            raise ValueError(f"Estatística desconhecida: '{estatistica}'. Use 'media' ou um de: {', '.join(QUANTIS)}.")
+        return _quantil(self.histogramas[indice], QUANTIS[estatistica])
+
+    def mapa(self, estatistica=ESTATISTICA_REFERENCIA):
+        """Dicionário modelo -> preço de referência, no formato do avg_price_map usado por create_features."""
+        valores = {modelo: self.valor(modelo, estatistica) for modelo in self.modelos}
+        return {modelo: valor for modelo, valor in valores.items() if not np.isnan(valor)}
+
+    def resumo(self):
+        """Tabela com o peso efetivo, a média e os quantis de cada modelo."""
+        import pandas as pd
+        linhas = []
+        for indice, modelo in enumerate(self.modelos):
+            linha = {'modelo_cartucho': modelo, 'peso': round(float(self.soma_pesos[indice]), 2),
+                     'media': self.valor(modelo, 'media')}
+            linha.update({nome: self.valor(modelo, nome) for nome in QUANTIS})
+            linhas.append(linha)
+        return pd.DataFrame(linhas).round(2)
+
+    def salvar(self, caminho=ARQUIVO_REFERENCIA):
+        # Gravação atômica: o arquivo anterior só é substituído depois de completo
+        temporario = caminho + '.tmp.npz'
+        np.savez(temporario, modelos=np.array(self.modelos, dtype=str), histogramas=self.histogramas,
+                 soma_pesos=self.soma_pesos, soma_precos=self.soma_precos,
+                 atualizado_em=np.float64(np.nan if self.atualizado_em is None else self.atualizado_em),
+                 meia_vida_dias=np.float64(self.meia_vida_dias), entradas=np.array(self.entradas, dtype=str))
+        os.replace(temporario, caminho)
+
+    @classmethod
+    def carregar(cls, caminho=ARQUIVO_REFERENCIA):
+        with np.load(caminho, allow_pickle=False) as dados:
+            referencia = cls(float(dados['meia_vida_dias']))
+            referencia.modelos = dados['modelos'].tolist()
+            referencia.histogramas = dados['histogramas'].reshape(len(referencia.modelos), NUM_FAIXAS)
+            referencia.soma_pesos = dados['soma_pesos']
+            referencia.soma_precos = dados['soma_precos']
+            atualizado_em = float(dados['atualizado_em'])
+            referencia.atualizado_em = None if np.isnan(atualizado_em) else atualizado_em
+            # Referências gravadas antes do registro de coletas não têm a lista
+            referencia.entradas = dados['entradas'].tolist() if 'entradas' in dados.files else []
+        return referencia
+
+
+def _faixa(precos):
+    posicao = (np.log(np.clip(precos, PRECO_MIN, PRECO_MAX)) - _LOG_MIN) / (_LOG_MAX - _LOG_MIN) * NUM_FAIXAS
+    return np.minimum(posicao.astype(np.int64), NUM_FAIXAS - 1)
+
+
+def _fatorar(valores):
+    modelos, codigos = np.unique(valores.astype(str), return_inverse=True)
+    return codigos, modelos.tolist()
+
+
+def _quantil(histograma, q):
+    """Quantil do histograma, interpolando linearmente (em escala log) dentro da faixa."""
+    acumulado = np.cumsum(histograma)
+    alvo = q * acumulado[-1]
+    faixa = int(np.searchsorted(acumulado, alvo))
+    anterior = acumulado[faixa - 1] if faixa > 0 else 0.0
+    fracao = (alvo - anterior) / histograma[faixa] if histograma[faixa] > 0 else 0.0
+    log_preco = _LOG_MIN + (faixa + fracao) / NUM_FAIXAS * (_LOG_MAX - _LOG_MIN)
+    return float(np.exp(log_preco))
+
+
+def carregar_mapa_precos(caminho_mapa_fixo='avg_price_map.pkl', caminho_referencia=ARQUIVO_REFERENCIA,
+                         usar_referencia=True):
+    """Mapa modelo -> preço de referência usado nas features.
+
+    Usa a referência incremental quando ela existir (e usar_referencia=True); senão, o
+    avg_price_map.pkl congelado no treino.
+    """
+    if usar_referencia and os.path.exists(caminho_referencia):
+        return ReferenciaPrecos.carregar(caminho_referencia).mapa()
+    import joblib
+    return joblib.load(caminho_mapa_fixo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preços de referência por modelo de cartucho.")
+    parser.add_argument('--arquivo', default=ARQUIVO_REFERENCIA)
+    sub = parser.add_subparsers(dest='comando', required=True)
+    sub.add_parser('mostrar', help="Mostra as estatísticas de cada modelo.")
+    atualizacao = sub.add_parser('atualizar', help="Incorpora uma coleta (CSV bruto do robô) à referência.")
+    atualizacao.add_argument('csv')
+    atualizacao.add_argument('--separador', default=',')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.arquivo):
+        print(f"ERRO: Arquivo '{args.arquivo}' não encontrado. Execute o script 'treinar_modelo.py' primeiro.")
+        exit()
+    referencia = ReferenciaPrecos.carregar(args.arquivo)
+
+    if args.comando == 'atualizar':
+        from funcoes_analise import load_and_clean_data, enrich_data
+        from cache_dados import hash_arquivo
+        entrada = hash_arquivo(args.csv, args.separador)
+        if referencia.incorporada(entrada):
+            print(f"A coleta '{args.csv}' já foi incorporada à referência de preços.")
+        else:
+            df = load_and_clean_data(args.csv, separator=args.separador)
+            if df is None:
+                exit()
+            incorporados = referencia.atualizar(enrich_data(df))
+            referencia.registrar_entrada(entrada)
+            referencia.salvar(args.arquivo)
+            print(f"{incorporados} anúncios incorporados à referência de preços.")
+
+    print(referencia.resumo().to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
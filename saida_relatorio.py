@@ -0,0 +1,222 @@
+# --- MÓDULO: saida_relatorio.py ---
+# Gravação e leitura do relatório final em vários formatos.
+#
+#   csv      formato original (separador ';', UTF-8 com BOM), aberto por qualquer planilha
+#   csv.gz   o mesmo CSV comprimido; cada bloco de linhas é comprimido em uma thread como
+#            um membro gzip independente e os membros são gravados em ordem (o arquivo
+#            resultante é um gzip válido, que descomprime no CSV original)
+#   parquet  colunar e comprimido, o menor e mais rápido de ler (requer pyarrow)
+#   feather  colunar (Arrow IPC com lz4), o mais rápido de gravar (requer pyarrow)
+#
+# O relatório é gravado em blocos, então o modo streaming não precisa montá-lo em memória.
+# ler_relatorio e localizar_relatorio identificam o formato pela extensão do arquivo.
+
+import csv
+import gzip
+import io
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+BASE_RELATORIO = 'relatorio_final_com_risco'
+FORMATOS = {'csv': '.csv', 'csv.gz': '.csv.gz', 'parquet': '.parquet', 'feather': '.feather'}
+LINHAS_POR_BLOCO = 100_000 # Linhas formatadas (e comprimidas) de cada vez
+NIVEL_GZIP = 6
+THREADS_COMPRESSAO = os.cpu_count() or 1
+
+
+def caminho_relatorio(formato='csv', base=BASE_RELATORIO):
+    return base + FORMATOS[formato]
+
+
+def formato_do_arquivo(caminho):
+    """Formato do relatório pela extensão do arquivo (o mais longo que casar, para .csv.gz)."""
+    for formato, extensao in sorted(FORMATOS.items(), key=lambda item: -len(item[1])):
+        if caminho.endswith(extensao):
+            return formato
+    raise ValueError(f"Formato de relatório não reconhecido: '{caminho}'. Use uma das extensões: {', '.join(FORMATOS.values())}.")
+
+
+def localizar_relatorio(base=BASE_RELATORIO):
+    """Relatório mais recente entre os formatos existentes, ou None se não houver nenhum."""
+    existentes = [caminho_relatorio(formato, base) for formato in FORMATOS if os.path.exists(caminho_relatorio(formato, base))]
+    return max(existentes, key=os.path.getmtime) if existentes else None
+
+
+def _sem_categorias(df):
+    """Troca colunas categóricas pelos valores, para que todos os blocos tenham o mesmo esquema Arrow."""
+    categoricas = [coluna for coluna in df.columns if isinstance(df[coluna].dtype, pd.CategoricalDtype)]
+    if not categoricas:
+        return df
+    return df.astype({coluna: df[coluna].cat.categories.dtype for coluna in categoricas})
+
+
+class EscritorRelatorio:
+    """Grava o relatório bloco a bloco no formato indicado pela extensão do caminho.
+
+    Use escrever(df) para blocos de DataFrame e escrever_linhas(linhas) para linhas já
+    formatadas como texto (ex.: a intercalação dos runs do modo streaming); nas linhas de
+    texto, as colunas em `colunas_numericas` são convertidas de volta nos formatos colunares.
+    O arquivo é gravado com um nome temporário e só substitui o anterior ao final.
+    """
+
+    def __init__(self, caminho, colunas, colunas_numericas=(), threads=THREADS_COMPRESSAO):
+        self.caminho = caminho
+        self.formato = formato_do_arquivo(caminho)
+        self.colunas = list(colunas)
+        self.colunas_numericas = [coluna for coluna in colunas_numericas if coluna in self.colunas]
+        self.threads = max(1, threads)
+        self.linhas = 0
+        if self.formato in ('parquet', 'feather') and pa is None:
+            raise ImportError(f"O formato '{self.formato}' requer o pacote 'pyarrow' (pip install pyarrow).")
+
+    def __enter__(self):
+        self._temporario = self.caminho + '.tmp'
+        self._escritor_arrow = None
+        self._pool = None
+        self._pendentes = deque()
+        if self.formato in ('csv', 'csv.gz'):
+            self._arquivo = open(self._temporario, 'wb')
+            if self.formato == 'csv.gz':
+                self._pool = ThreadPoolExecutor(max_workers=self.threads)
+            # BOM + cabeçalho, como no to_csv(..., encoding='utf-8-sig')
+            self._gravar_texto('\ufeff' + self._formatar_linhas([self.colunas]))
+        return self
+
+    def _formatar_linhas(self, linhas):
+        texto = io.StringIO()
+        csv.writer(texto, delimiter=';', lineterminator=os.linesep).writerows(linhas)
+        return texto.getvalue()
+
+    def _gravar_texto(self, texto):
+        dados = texto.encode('utf-8')
+        if self._pool is None:
+            self._arquivo.write(dados)
+            return
+        # No máximo 2 blocos por thread em compressão; os membros são gravados na ordem de envio
+        self._pendentes.append(self._pool.submit(gzip.compress, dados, NIVEL_GZIP, mtime=0))
+        while len(self._pendentes) > 2 * self.threads:
+            self._arquivo.write(self._pendentes.popleft().result())
+
+    def _gravar_tabela(self, df):
+        tabela = pa.Table.from_pandas(_sem_categorias(df[self.colunas]), preserve_index=False)
+        if self._escritor_arrow is None:
+            self._esquema = tabela.schema
+            if self.formato == 'parquet':
+                self._escritor_arrow = pq.ParquetWriter(self._temporario, tabela.schema)
+            else:
+                # Compressão lz4, a mesma do pyarrow.feather.write_feather
+                self._escritor_arrow = pa.ipc.new_file(self._temporario, tabela.schema,
+                                                       options=pa.ipc.IpcWriteOptions(compression='lz4'))
+        else:
+            tabela = tabela.cast(self._esquema)
+        self._escritor_arrow.write_table(tabela)
+
+    def escrever(self, df):
+        """Acrescenta um bloco de DataFrame ao relatório (na ordem em que os blocos chegam)."""
+        for inicio in range(0, len(df), LINHAS_POR_BLOCO):
+            bloco = df.iloc[inicio:inicio + LINHAS_POR_BLOCO]
+            if self.formato in ('csv', 'csv.gz'):
+                self._gravar_texto(bloco[self.colunas].to_csv(index=False, header=False, sep=';'))
+            else:
+                self._gravar_tabela(bloco)
+            self.linhas += len(bloco)
+
+    def escrever_linhas(self, linhas):
+        """Acrescenta linhas de texto (listas de strings na ordem de `colunas`), em blocos."""
+        iterador = iter(linhas)
+        while True:
+            bloco = [linha for _, linha in zip(range(LINHAS_POR_BLOCO), iterador)]
+            if not bloco:
+                break
+            if self.formato in ('csv', 'csv.gz'):
+                self._gravar_texto(self._formatar_linhas(bloco))
+            else:
+                df = pd.DataFrame(bloco, columns=self.colunas)
+                for coluna in self.colunas_numericas:
+                    df[coluna] = pd.to_numeric(df[coluna], errors='coerce')
+                self._gravar_tabela(df)
+            self.linhas += len(bloco)
+
+    def __exit__(self, tipo_erro, erro, rastreamento):
+        try:
+            if self._pool is not None:
+                for futuro in self._pendentes:
+                    if tipo_erro is None:
+                        self._arquivo.write(futuro.result())
+                self._pool.shutdown(cancel_futures=True)
+            if self.formato in ('csv', 'csv.gz'):
+                self._arquivo.close()
+            elif self._escritor_arrow is not None:
+                self._escritor_arrow.close()
+            elif tipo_erro is None:
+                # Relatório sem linhas: grava só o esquema
+                self._gravar_tabela(pd.DataFrame(columns=self.colunas))
+                self._escritor_arrow.close()
+        except Exception:
+            if tipo_erro is None:
+                raise
+        if tipo_erro is not None:
+            if os.path.exists(self._temporario):
+                os.remove(self._temporario)
+            return False
+        os.replace(self._temporario, self.caminho)
+        return False
+
+
+def escrever_relatorio(df, caminho):
+    """Grava um DataFrame inteiro como relatório; devolve o número de linhas gravadas."""
+    with EscritorRelatorio(caminho, df.columns) as escritor:
+        escritor.escrever(df)
+    return escritor.linhas
+
+
+def _blocos_arrow(lotes, chunksize):
+    """Reagrupa lotes Arrow em DataFrames de `chunksize` linhas."""
+    acumulados, linhas = [], 0
+    for lote in lotes:
+        while lote.num_rows:
+            parte = lote.slice(0, chunksize - linhas)
+            acumulados.append(parte)
+            linhas += parte.num_rows
+            lote = lote.slice(parte.num_rows)
+            if linhas == chunksize:
+                yield pa.Table.from_batches(acumulados).to_pandas()
+                acumulados, linhas = [], 0
+    if acumulados:
+        yield pa.Table.from_batches(acumulados).to_pandas()
+
+
+def ler_relatorio(caminho, chunksize=None, nrows=None):
+    """Lê o relatório em qualquer formato suportado.
+
+    Sem chunksize devolve um DataFrame; com chunksize, um iterador de DataFrames na ordem do arquivo.
+    """
+    formato = formato_do_arquivo(caminho)
+    if formato in ('csv', 'csv.gz'):
+        return pd.read_csv(caminho, sep=';', chunksize=chunksize, nrows=nrows)
+
+    if pa is None:
+        raise ImportError(f"O formato '{formato}' requer o pacote 'pyarrow' (pip install pyarrow).")
+    if formato == 'parquet':
+        arquivo = pq.ParquetFile(caminho)
+        lotes = arquivo.iter_batches(batch_size=chunksize or nrows or 65_536)
+    else:
+        leitor = pa.ipc.open_file(pa.memory_map(caminho))
+        lotes = (leitor.get_batch(i) for i in range(leitor.num_record_batches))
+
+    if nrows is not None:
+        return next(_blocos_arrow(lotes, nrows), pd.DataFrame())
+    if chunksize is not None:
+        return _blocos_arrow(lotes, chunksize)
+    if formato == 'parquet':
+        return arquivo.read().to_pandas()
+    return leitor.read_all().to_pandas()
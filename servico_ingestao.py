@@ -0,0 +1,351 @@
+# --- SCRIPT: servico_ingestao.py ---
+# Serviço contínuo de ingestão: pontua as coletas do robô assim que elas chegam.
+#
+# O analise.py é executado manualmente, recarrega o modelo e reprocessa a base inteira.
+# Aqui o modelo é carregado uma vez e a pasta de coletas é observada continuamente:
+#   observador  verifica a pasta a cada INTERVALO_S; um .csv entra na fila quando o tamanho
+#               e a data de modificação não mudam entre duas verificações (o robô terminou
+#               de gravá-lo)
+#   leitor      lê cada arquivo em micro-lotes e envia cada lote ao pool de processos, que
+#               faz limpeza -> enriquecimento -> features -> modelo (pontuacao_paralela)
+#   gravador    troca a URL de cada lote pontuado pelos códigos do dicionário de
+#               identificadores e o acrescenta ao banco de resultados (uma execução por
+#               arquivo), a um relatório parcial do arquivo e ao índice de vendedores; ao final
+#               do arquivo, confirma a execução, grava o dicionário, acrescenta o relatório
+#               parcial ao relatório de ingestão e move o arquivo para processados/
+# As filas entre as etapas são limitadas: se o modelo ou o banco ficarem para trás, o
+# leitor para de ler (e o observador de enfileirar) até que haja espaço, e a memória fica
+# limitada a FILA_LOTES micro-lotes. SIGINT/SIGTERM encerram o serviço sem perder dados:
+# o arquivo em andamento é concluído e os que ainda não começaram ficam na pasta para a
+# próxima execução. Um arquivo só sai da pasta depois de gravado, então uma queda no meio
+# faz com que ele seja processado de novo; como o banco, o relatório de ingestão só recebe
+# as linhas de arquivos concluídos (um arquivo com erro não deixa linhas nele).
+#
+# Uso:
+#   python servico_ingestao.py                       (observa a pasta 'coletas')
+#   python servico_ingestao.py --pasta coletas --lote 5000 --workers 2
+#   python servico_ingestao.py --uma-vez             (processa o que já está na pasta e encerra)
+
+import argparse
+import asyncio
+import os
+import shutil
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import instrumentacao
+from banco_resultados import GravadorExecucao, BANCO_RESULTADOS
+from funcoes_analise import opcoes_leitura
+from identificadores import carregar_identificadores, ARQUIVO_IDENTIFICADORES
+from indice_vendedores import AtualizadorVendedores, BANCO_VENDEDORES
+from pacote_modelo import ARQUIVO_PACOTE
+from pontuacao_paralela import criar_pool, pontuar_bloco
+from referencia_precos import ReferenciaPrecos, ARQUIVO_REFERENCIA
+
+PASTA_COLETAS = 'coletas'
+SUBPASTA_PROCESSADOS = 'processados'
+SUBPASTA_ERROS = 'erros'
+ARQUIVOS_MODELO = ['modelo_risco.pkl', 'avg_price_map.pkl', 'features_list.pkl']
+RELATORIO_INGESTAO = 'relatorio_ingestao.csv'
+COLUNAS_RELATORIO = [
+    'titulo', 'preco', 'compatibilidade', 'modelo_cartucho',
+    'classificacao_ia', 'indicador_de_risco_pct'
+]
+INTERVALO_S = 2.0 # Intervalo entre as verificações da pasta de coletas
+LINHAS_POR_LOTE = 5_000 # Linhas de cada micro-lote enviado ao modelo
+FILA_ARQUIVOS = 8 # Arquivos prontos aguardando leitura
+FILA_LOTES = 4 # Micro-lotes em pontuação ou aguardando gravação
+
+
+class _Arquivo:
+    """Estado de um arquivo em processamento, compartilhado entre o leitor e o gravador."""
+
+    def __init__(self, caminho, detectado_em):
+        self.caminho = caminho
+        self.detectado_em = detectado_em
+        self.gravador = None
+        self.vendedores = None
+        self.anuncios = 0
+        self.suspeitos = 0
+        self.erro = None
+        self.relatorio_parcial = None
+
+
+class ServicoIngestao:
+    """Observa a pasta de coletas e pontua cada arquivo novo em micro-lotes.
+
+    O pool de processos recebe os artefatos do modelo uma única vez (no inicializador dos
+    workers). Toda a gravação (SQLite e relatório) é feita em uma única thread, pois a
+    conexão SQLite não pode ser usada por threads diferentes.
+    """
+
+    def __init__(self, caminhos_artefatos, avg_price_map=None, pasta=PASTA_COLETAS, workers=1,
+                 linhas_por_lote=LINHAS_POR_LOTE, intervalo_s=INTERVALO_S, separador=',',
+                 relatorio=RELATORIO_INGESTAO, usar_banco=True, usar_vendedores=True, reter_dias=None):
+        self.caminhos_artefatos = caminhos_artefatos
+        self.avg_price_map = avg_price_map
+        self.pasta = pasta
+        self.workers = workers
+        self.linhas_por_lote = linhas_por_lote
+        self.intervalo_s = intervalo_s
+        self.separador = separador
+        self.relatorio = relatorio
+        self.usar_banco = usar_banco
+        self.usar_vendedores = usar_vendedores
+        self.reter_dias = reter_dias
+        self.parar = None
+        self.identificadores = None
+        self.arquivos_processados = 0
+        self.anuncios_processados = 0
+
+    # --- Observador ---
+
+    def _arquivos_prontos(self, tamanhos_anteriores, exigir_estavel=True):
+        """Arquivos .csv da pasta cujo tamanho e data não mudaram desde a verificação anterior."""
+        prontos, tamanhos = [], {}
+        with os.scandir(self.pasta) as entradas:
+            for entrada in sorted(entradas, key=lambda e: e.name):
+                if not entrada.is_file() or not entrada.name.lower().endswith('.csv'):
+                    continue
+                estado = entrada.stat()
+                tamanhos[entrada.path] = (estado.st_size, estado.st_mtime_ns)
+                if not exigir_estavel or tamanhos_anteriores.get(entrada.path) == tamanhos[entrada.path]:
+                    prontos.append(entrada.path)
+        return prontos, tamanhos
+
+    async def _observar(self, fila_arquivos, uma_vez):
+        loop = asyncio.get_running_loop()
+        enfileirados = set()
+        tamanhos = {}
+        while not self.parar.is_set():
+            prontos, tamanhos = await loop.run_in_executor(None, self._arquivos_prontos, tamanhos, not uma_vez)
+            for caminho in prontos:
+                if caminho in enfileirados:
+                    continue
+                enfileirados.add(caminho)
+                # Fila cheia: espera o leitor abrir espaço (ou o pedido de encerramento)
+                await self._colocar(fila_arquivos, _Arquivo(caminho, time.time()))
+            # Arquivos já movidos saem do controle (um novo arquivo com o mesmo nome é outra coleta)
+            enfileirados &= set(tamanhos)
+            if uma_vez:
+                break
+            try:
+                await asyncio.wait_for(self.parar.wait(), timeout=self.intervalo_s)
+            except asyncio.TimeoutError:
+                pass
+        if self.parar.is_set():
+            # Encerramento: os arquivos que ainda não começaram ficam na pasta para a próxima execução
+            while not fila_arquivos.empty():
+                fila_arquivos.get_nowait()
+            fila_arquivos.put_nowait(None)
+        else:
+            await fila_arquivos.put(None)
+
+    async def _colocar(self, fila, item):
+        """put() que desiste se o serviço for encerrado enquanto a fila estiver cheia."""
+        colocar = asyncio.ensure_future(fila.put(item))
+        parar = asyncio.ensure_future(self.parar.wait())
+        await asyncio.wait([colocar, parar], return_when=asyncio.FIRST_COMPLETED)
+        parar.cancel()
+        if not colocar.done():
+            colocar.cancel()
+
+    # --- Leitor ---
+
+    async def _ler(self, fila_arquivos, fila_lotes, pool):
+        loop = asyncio.get_running_loop()
+        while True:
+            arquivo = await fila_arquivos.get()
+            if arquivo is None or self.parar.is_set():
+                break
+            if not os.path.exists(arquivo.caminho):
+                continue
+            try:
+                leitor = pd.read_csv(arquivo.caminho, sep=self.separador, chunksize=self.linhas_por_lote,
+                                     **opcoes_leitura(manter_url=True))
+                with leitor:
+                    while True:
+                        bloco = await loop.run_in_executor(None, next, leitor, None)
+                        if bloco is None:
+                            break
+                        # Fila cheia: a leitura espera o modelo e a gravação (backpressure)
+                        await fila_lotes.put((arquivo, loop.run_in_executor(pool, pontuar_bloco, bloco)))
+            except Exception as e:
+                arquivo.erro = e
+            await fila_lotes.put((arquivo, None))
+        await fila_lotes.put(None)
+
+    # --- Gravador ---
+
+    def _gravar_lote(self, arquivo, df):
+        df = self.identificadores.internar(df)
+        # A execução do arquivo só começa aqui: uma transação aberta de cada vez no banco
+        if self.usar_banco and arquivo.gravador is None:
+            arquivo.gravador = GravadorExecucao(BANCO_RESULTADOS, origem=arquivo.caminho, modo='ingestao',
+                                               reter_dias=self.reter_dias).__enter__()
+        if self.usar_vendedores and arquivo.vendedores is None:
+            arquivo.vendedores = AtualizadorVendedores(BANCO_VENDEDORES)
+        if arquivo.gravador is not None:
+            arquivo.gravador.inserir(df)
+        if arquivo.vendedores is not None:
+            arquivo.vendedores.acrescentar(df)
+        if self.relatorio:
+            # As linhas ficam no relatório parcial até o arquivo ser confirmado
+            colunas = [col for col in COLUNAS_RELATORIO if col in df.columns]
+            saida = df[colunas].assign(arquivo_origem=os.path.basename(arquivo.caminho))
+            novo = arquivo.relatorio_parcial is None
+            if novo:
+                arquivo.relatorio_parcial = f"{self.relatorio}.parcial"
+            saida.to_csv(arquivo.relatorio_parcial, mode='w' if novo else 'a', header=novo, index=False,
+                         sep=';', encoding='utf-8-sig' if novo else 'utf-8')
+
+    def _concluir_relatorio(self, arquivo):
+        """Acrescenta o relatório parcial do arquivo ao relatório de ingestão."""
+        if not os.path.exists(self.relatorio):
+            os.replace(arquivo.relatorio_parcial, self.relatorio)
+            return
+        with open(arquivo.relatorio_parcial, 'rb') as parcial, open(self.relatorio, 'ab') as relatorio:
+            parcial.readline() # Cabeçalho (o relatório já tem o seu)
+            shutil.copyfileobj(parcial, relatorio)
+        os.remove(arquivo.relatorio_parcial)
+
+    def _concluir_arquivo(self, arquivo):
+        """Confirma (ou desfaz) a execução e o relatório do arquivo e o move para processados/ ou erros/."""
+        erro = arquivo.erro
+        if arquivo.gravador is not None:
+            arquivo.gravador.__exit__(type(erro) if erro else None, erro, None)
+        if erro is None and arquivo.vendedores is not None:
+            arquivo.vendedores.gravar()
+        if erro is None:
+            self.identificadores.salvar(ARQUIVO_IDENTIFICADORES)
+        if arquivo.relatorio_parcial is not None:
+            if erro is None:
+                self._concluir_relatorio(arquivo)
+            elif os.path.exists(arquivo.relatorio_parcial):
+                os.remove(arquivo.relatorio_parcial)
+        destino = os.path.join(self.pasta, SUBPASTA_ERROS if erro else SUBPASTA_PROCESSADOS)
+        os.makedirs(destino, exist_ok=True)
+        nome = os.path.basename(arquivo.caminho)
+        if os.path.exists(os.path.join(destino, nome)):
+            nome = f"{time.strftime('%Y%m%d_%H%M%S')}_{nome}"
+        os.replace(arquivo.caminho, os.path.join(destino, nome))
+
+    async def _gravar(self, fila_lotes, io):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await fila_lotes.get()
+            if item is None:
+                break
+            arquivo, futuro = item
+            if futuro is None:
+                await self._finalizar(arquivo, io)
+                continue
+            try:
+                df = await futuro
+                if df is not None and arquivo.erro is None:
+                    await loop.run_in_executor(io, self._gravar_lote, arquivo, df)
+                    arquivo.anuncios += len(df)
+                    arquivo.suspeitos += int((df['classificacao_ia'] == 'Suspeito').sum())
+            except Exception as e:
+                arquivo.erro = arquivo.erro or e
+
+    async def _finalizar(self, arquivo, io):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(io, self._concluir_arquivo, arquivo)
+        except Exception as e:
+            print(f"Erro ao concluir o arquivo '{arquivo.caminho}': {e}")
+            return
+        nome = os.path.basename(arquivo.caminho)
+        if arquivo.erro is not None:
+            print(f"Erro ao processar '{nome}' (movido para {SUBPASTA_ERROS}/): {type(arquivo.erro).__name__}: {arquivo.erro}")
+            return
+        self.arquivos_processados += 1
+        self.anuncios_processados += arquivo.anuncios
+        print(f"'{nome}': {arquivo.anuncios} anúncios pontuados, {arquivo.suspeitos} suspeitos "
+              f"({time.time() - arquivo.detectado_em:.1f} s desde a detecção).")
+
+    # --- Execução ---
+
+    async def executar(self, uma_vez=False):
+        """Roda até SIGINT/SIGTERM (ou, com uma_vez=True, até esvaziar a pasta)."""
+        loop = asyncio.get_running_loop()
+        self.parar = asyncio.Event()
+        for sinal in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sinal, self._pedir_encerramento)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows ou fora da thread principal: só Ctrl+C padrão
+        os.makedirs(self.pasta, exist_ok=True)
+        self.identificadores = carregar_identificadores(ARQUIVO_IDENTIFICADORES)
+
+        fila_arquivos = asyncio.Queue(maxsize=FILA_ARQUIVOS)
+        fila_lotes = asyncio.Queue(maxsize=max(FILA_LOTES, 2 * self.workers))
+        # Os workers ignoram o Ctrl+C: o encerramento é conduzido pelo processo principal
+        with criar_pool(self.workers, self.caminhos_artefatos, avg_price_map=self.avg_price_map,
+                        ignorar_interrupcao=True) as pool, \
+                ThreadPoolExecutor(max_workers=1, thread_name_prefix='gravacao') as io:
+            await asyncio.gather(
+                self._observar(fila_arquivos, uma_vez),
+                self._ler(fila_arquivos, fila_lotes, pool),
+                self._gravar(fila_lotes, io),
+            )
+        return self.arquivos_processados
+
+    def _pedir_encerramento(self):
+        if not self.parar.is_set():
+            print("\nEncerrando: concluindo o arquivo em andamento...")
+            self.parar.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serviço de ingestão contínua das coletas do robô.")
+    parser.add_argument('--pasta', default=PASTA_COLETAS, help=f"Pasta observada (padrão: {PASTA_COLETAS}).")
+    parser.add_argument('--separador', default=',')
+    parser.add_argument('--lote', type=int, default=LINHAS_POR_LOTE,
+                        help=f"Linhas por micro-lote (padrão: {LINHAS_POR_LOTE}).")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Processos de pontuação (padrão: 1; a pontuação nunca roda no laço de eventos).")
+    parser.add_argument('--intervalo', type=float, default=INTERVALO_S,
+                        help=f"Segundos entre as verificações da pasta (padrão: {INTERVALO_S}).")
+    parser.add_argument('--relatorio', default=RELATORIO_INGESTAO,
+                        help=f"CSV ao qual os anúncios pontuados são acrescentados (padrão: {RELATORIO_INGESTAO}; '' desliga).")
+    parser.add_argument('--sem-banco', action='store_true',
+                        help=f"Não registra os arquivos no banco de resultados ({BANCO_RESULTADOS}).")
+    parser.add_argument('--reter-dias', type=float, default=None,
+                        help="Remove do banco de resultados as execuções iniciadas há mais de N dias (padrão: mantém todas).")
+    parser.add_argument('--sem-vendedores', action='store_true',
+                        help=f"Não soma os arquivos ao índice de vendedores ({BANCO_VENDEDORES}).")
+    parser.add_argument('--uma-vez', action='store_true',
+                        help="Processa os arquivos que já estão na pasta e encerra.")
+    args = parser.parse_args()
+
+    instrumentacao.configurar(silencioso=True)
+    if os.path.exists(ARQUIVO_PACOTE):
+        caminhos_artefatos = [ARQUIVO_PACOTE]
+    elif all(os.path.exists(caminho) for caminho in ARQUIVOS_MODELO):
+        caminhos_artefatos = ARQUIVOS_MODELO
+    else:
+        print("ERRO: Artefatos do modelo não encontrados. Execute o script 'treinar_modelo.py' primeiro.")
+        sys.exit()
+    # O mapa de preços é o da referência incremental (quando existir), fixo durante o serviço
+    avg_price_map = ReferenciaPrecos.carregar(ARQUIVO_REFERENCIA).mapa() if os.path.exists(ARQUIVO_REFERENCIA) else None
+
+    servico = ServicoIngestao(caminhos_artefatos, avg_price_map, args.pasta, max(1, args.workers), args.lote,
+                              args.intervalo, args.separador, args.relatorio,
+                              usar_banco=not args.sem_banco, usar_vendedores=not args.sem_vendedores,
+                              reter_dias=args.reter_dias)
+    if not args.uma_vez:
+        print(f"Observando '{args.pasta}' a cada {args.intervalo} s (Ctrl+C para encerrar)...")
+    inicio = time.time()
+    asyncio.run(servico.executar(uma_vez=args.uma_vez))
+    print(f"Serviço encerrado: {servico.arquivos_processados} arquivos e {servico.anuncios_processados} anúncios "
+          f"pontuados em {time.time() - inicio:.1f} s.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+# --- SCRIPT: servico_pontuacao.py ---
+# Serviço HTTP local de pontuação online.
+#
+# Carrega o pacote de artefatos (modelo_risco_pacote.npz) ou, na falta dele, modelo_risco.pkl,
+# avg_price_map.pkl e features_list.pkl uma única vez (o mapa de preços vem de
+# referencia_precos.npz quando ela existir) e
+# responde a anúncios individuais ou micro-lotes no esquema bruto do robô.
+#
+# Rotas:
+#   POST /pontuar   corpo JSON: um anúncio (objeto) ou vários (lista)
+#   GET  /metricas  latências p50/p90/p99 e tamanho médio dos lotes
+#   GET  /saude     verificação simples de disponibilidade
+#
+# Exemplo:
+#   python servico_pontuacao.py --porta 8765
+#   curl -X POST localhost:8765/pontuar -d '{"nome_produto": "Cartucho HP 664 Preto", "preco_produto": "59,90"}'
+
+import argparse
+import json
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+import warnings
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from funcoes_analise import create_features_record, MAPA_CLASSIFICACAO
+from modelo_fundido import carregar_modelo, predict_risk
+from pacote_modelo import carregar_pacote, ARQUIVO_PACOTE
+from referencia_precos import ReferenciaPrecos, ARQUIVO_REFERENCIA, carregar_mapa_precos
+
+ARQUIVOS_MODELO = ['modelo_risco.pkl', 'avg_price_map.pkl', 'features_list.pkl']
+JANELA_METRICAS = 10_000 # Número de requisições recentes usadas no cálculo das latências
+
+# Sem o modelo fundido, o pipeline do sklearn (treinado com DataFrame) recebe a matriz NumPy
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+
+class _Pedido:
+    """Linhas de features de uma requisição, aguardando a pontuação em lote."""
+
+    def __init__(self, linhas):
+        self.linhas = linhas
+        self.resultado = None
+        self.erro = None
+        self.pronto = threading.Event()
+
+
+class Loteador:
+    """Agrupa as requisições concorrentes em micro-lotes para uma única chamada ao modelo.
+
+    A thread de pontuação pega o primeiro pedido da fila e junta a ele os que já estiverem
+    esperando (e, se espera_ms > 0, os que chegarem dentro desse prazo), até tamanho_max linhas.
+    Uma requisição maior que tamanho_max é dividida em pedidos de até tamanho_max linhas, e um
+    pedido que não cabe no lote em formação abre o lote seguinte.
+    Sem concorrência, cada pedido é pontuado imediatamente, sem espera adicional.
+    """
+
+    def __init__(self, modelo, tamanho_max=256, espera_ms=0.0):
+        self.modelo = modelo
+        self.tamanho_max = tamanho_max
+        self.espera_s = espera_ms / 1000
+        self.fila = queue.Queue()
+        self.adiado = None # Pedido que não coube no último lote
+        self.tamanhos_lote = deque(maxlen=JANELA_METRICAS)
+        threading.Thread(target=self._laco, daemon=True).start()
+
+    def pontuar(self, linhas):
+        """Bloqueia até que as linhas sejam pontuadas; devolve (classes, probabilidades)."""
+        pedidos = [_Pedido(linhas[inicio:inicio + self.tamanho_max])
+                   for inicio in range(0, len(linhas), self.tamanho_max)]
+        for pedido in pedidos:
+            self.fila.put(pedido)
+        for pedido in pedidos:
+            pedido.pronto.wait()
+        for pedido in pedidos:
+            if pedido.erro is not None:
+                raise pedido.erro
+        if len(pedidos) == 1:
+            return pedidos[0].resultado
+        classes, probabilidades = zip(*(pedido.resultado for pedido in pedidos))
+        return np.concatenate(classes), np.concatenate(probabilidades)
+
+    def _coletar_lote(self):
+        if self.adiado is not None:
+            pedidos, self.adiado = [self.adiado], None
+        else:
+            pedidos = [self.fila.get()]
+        total = len(pedidos[0].linhas)
+        prazo = time.perf_counter() + self.espera_s
+        while total < self.tamanho_max:
+            try:
+                restante = prazo - time.perf_counter()
+                pedido = self.fila.get(timeout=restante) if restante > 0 else self.fila.get_nowait()
+            except queue.Empty:
+                break
+            if total + len(pedido.linhas) > self.tamanho_max:
+                self.adiado = pedido
+                break
+            pedidos.append(pedido)
+            total += len(pedido.linhas)
+        return pedidos, total
+
+    def _laco(self):
+        while True:
+            pedidos, total = self._coletar_lote()
+            self.tamanhos_lote.append(total)
+            try:
+                X = np.array([linha for pedido in pedidos for linha in pedido.linhas], dtype=float)
+                classes, probabilidades = predict_risk(self.modelo, X)
+                inicio = 0
+                for pedido in pedidos:
+                    fim = inicio + len(pedido.linhas)
+                    pedido.resultado = (classes[inicio:fim], probabilidades[inicio:fim])
+                    inicio = fim
+            except Exception as e:
+                for pedido in pedidos:
+                    pedido.erro = e
+            for pedido in pedidos:
+                pedido.pronto.set()
+
+
+class ServicoPontuacao:
+    """Estado do serviço: artefatos do modelo, loteador e métricas de latência."""
+
+    def __init__(self, modelo, avg_price_map, features_list, tamanho_lote=256, espera_ms=0.0):
+        self.avg_price_map = avg_price_map
+        self.features_list = features_list
+        self.loteador = Loteador(modelo, tamanho_lote, espera_ms)
+        self.latencias_ms = deque(maxlen=JANELA_METRICAS)
+        self.total_requisicoes = 0
+        self.total_anuncios = 0
+
+    def pontuar(self, registros):
+        """Pontua uma lista de anúncios, devolvendo um dicionário de resultado para cada um."""
+        resultados = [None] * len(registros)
+        linhas, posicoes = [], []
+        for posicao, registro in enumerate(registros):
+            try:
+                features = create_features_record(registro, self.avg_price_map) if isinstance(registro, dict) else None
+            except (ValueError, TypeError):
+                features = None
+            if features is None:
+                resultados[posicao] = {'erro': "Anúncio sem título ou com preço inválido."}
+                continue
+            linhas.append([features[nome] for nome in self.features_list])
+            posicoes.append(posicao)
+
+        if linhas:
+            classes, probabilidades = self.loteador.pontuar(linhas)
+            for posicao, classe, probabilidade in zip(posicoes, classes, probabilidades):
+                resultados[posicao] = {
+                    'classificacao_ia': MAPA_CLASSIFICACAO[int(classe)],
+                    'indicador_de_risco_pct': float(np.round(float(probabilidade) * 100, 2)),
+                }
+        return resultados
+
+    def registrar_latencia(self, inicio, n_anuncios):
+        self.latencias_ms.append((time.perf_counter() - inicio) * 1000)
+        self.total_requisicoes += 1
+        self.total_anuncios += n_anuncios
+
+    def metricas(self):
+        latencias = np.array(self.latencias_ms)
+        tamanhos = np.array(self.loteador.tamanhos_lote)
+        metricas = {
+            'requisicoes': self.total_requisicoes,
+            'anuncios': self.total_anuncios,
+            'janela': len(latencias),
+            'tamanho_medio_lote': round(float(tamanhos.mean()), 2) if len(tamanhos) else None,
+        }
+        for nome, percentil in (('p50_ms', 50), ('p90_ms', 90), ('p99_ms', 99)):
+            metricas[nome] = round(float(np.percentile(latencias, percentil)), 3) if len(latencias) else None
+        return metricas
+
+
+class _Handler(BaseHTTPRequestHandler):
+    servico = None  # definido em criar_servidor
+
+    def _responder(self, status, corpo):
+        dados = json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_GET(self):
+        if self.path == '/metricas':
+            self._responder(200, self.servico.metricas())
+        elif self.path == '/saude':
+            self._responder(200, {'status': 'ok'})
+        else:
+            self._responder(404, {'erro': 'Rota não encontrada.'})
+
+    def do_POST(self):
+        if self.path != '/pontuar':
+            self._responder(404, {'erro': 'Rota não encontrada.'})
+            return
+
+        inicio = time.perf_counter()
+        try:
+            tamanho = int(self.headers.get('Content-Length', 0))
+            corpo = json.loads(self.rfile.read(tamanho) or b'null')
+        except (ValueError, json.JSONDecodeError):
+            self._responder(400, {'erro': 'Corpo da requisição não é um JSON válido.'})
+            return
+
+        if isinstance(corpo, dict):
+            resposta = self.servico.pontuar([corpo])[0]
+            n_anuncios = 1
+        elif isinstance(corpo, list):
+            resposta = self.servico.pontuar(corpo)
+            n_anuncios = len(corpo)
+        else:
+            self._responder(400, {'erro': 'Envie um anúncio (objeto JSON) ou uma lista de anúncios.'})
+            return
+
+        self._responder(200, resposta)
+        self.servico.registrar_latencia(inicio, n_anuncios)
+
+    def log_message(self, format, *args):
+        pass  # sem log por requisição no caminho crítico
+
+
+def criar_servidor(servico, host='127.0.0.1', porta=8765):
+    handler = type('Handler', (_Handler,), {'servico': servico})
+    return ThreadingHTTPServer((host, porta), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serviço HTTP de pontuação de risco online.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8765)
+    parser.add_argument('--lote-max', type=int, default=256,
+                        help="Máximo de anúncios por chamada ao modelo (padrão: 256).")
+    parser.add_argument('--espera-ms', type=float, default=0.0,
+                        help="Tempo máximo de espera para completar um micro-lote (padrão: 0, sem espera).")
+    args = parser.parse_args()
+
+    try:
+        if os.path.exists(ARQUIVO_PACOTE):
+            modelo_ia, avg_price_map, features_list, _ = carregar_pacote(ARQUIVO_PACOTE)
+            if os.path.exists(ARQUIVO_REFERENCIA):
+                avg_price_map = ReferenciaPrecos.carregar(ARQUIVO_REFERENCIA).mapa()
+        else:
+            import joblib
+            modelo_ia = carregar_modelo(ARQUIVOS_MODELO[0])
+            avg_price_map = carregar_mapa_precos(ARQUIVOS_MODELO[1])
+            features_list = joblib.load(ARQUIVOS_MODELO[2])
+    except FileNotFoundError:
+        print("ERRO: Arquivos 'modelo_risco.pkl', 'avg_price_map.pkl' ou 'features_list.pkl' não encontrados.")
+        print("Por favor, execute o script 'treinar_modelo.py' primeiro.")
+        sys.exit()
+
+    servico = ServicoPontuacao(modelo_ia, avg_price_map, features_list, args.lote_max, args.espera_ms)
+    servidor = criar_servidor(servico, args.host, args.porta)
+    print(f"Serviço de pontuação ouvindo em http://{args.host}:{args.porta} (Ctrl+C para encerrar)")
+
+    def _encerrar(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, _encerrar)
+
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        print(f"\nServiço encerrado. Métricas finais: {servico.metricas()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,8 @@
 # --- SCRIPT: treinar_modelo.py ---
 # Treinamento do modelo de classificação de risco.
 
+import argparse
+import numpy as np
 import pandas as pd
 import joblib
 from sklearn.model_selection import train_test_split
@@ -8,48 +10,30 @@ from sklearn.linear_model import LogisticRegression
 from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import Pipeline
 from sklearn.metrics import classification_report, ConfusionMatrixDisplay
-import matplotlib.pyplot as plt
 
 # Importação de funções locais
 try:
-    from funcoes_analise import load_and_clean_data, enrich_data, create_features
+    from funcoes_analise import create_features
 except ImportError:
     print("ERRO: Arquivo 'funcoes_analise.py' não encontrado ou com erro.")
     print("Certifique-se de ter renomeado seu 'analise.py' e adicionado a função 'create_features'.")
     exit()
 
+from cache_dados import carregar_dados
+from modelo_fundido import ModeloFundido, ARQUIVO_MODELO_FUNDIDO
+from pacote_modelo import salvar_pacote, ARQUIVO_PACOTE
+from busca_modelo import buscar, ARQUIVO_RESULTADOS_BUSCA, MAX_ITER, METRICAS
+from matriz_features import gravar_matriz, abrir_matriz, ARQUIVO_MATRIZ
+from treino_incremental import treinar_incremental, registrar_treino_completo, hash_linhas
+from referencia_precos import ReferenciaPrecos, ARQUIVO_REFERENCIA
+
 # Configuração de Arquivos
 BASE_DE_TREINO = 'base_treino_manual.csv'
 MODELO_SAIDA = 'modelo_risco.pkl'
 MAPA_PRECOS_SAIDA = 'avg_price_map.pkl'
 FEATURES_LIST_SAIDA = 'features_list.pkl'
 
-# Execução do Treinamento
-print("--- Iniciando Treinamento do Modelo de Risco ---")
-
-# 1. Carregamento dos Dados
-print(f"Carregando base de treino: {BASE_DE_TREINO}")
-df_treino = load_and_clean_data(BASE_DE_TREINO, separator=';')
-
-if df_treino is None:
-    print(f"ERRO: Não foi possível carregar a base de treino '{BASE_DE_TREINO}'.")
-    exit()
-
-# 2. Enriquecimento de Dados
-df_treino_enriquecido = enrich_data(df_treino.copy())
-
-# Calcular e salvar mapa de preços médios
-avg_price_map = df_treino_enriquecido[
-    df_treino_enriquecido['compatibilidade'] == 'Original'
-].groupby('modelo_cartucho')['preco'].mean().to_dict()
-
-joblib.dump(avg_price_map, MAPA_PRECOS_SAIDA)
-print(f"Mapa de preços médios salvo em: {MAPA_PRECOS_SAIDA}")
-
-# 3. Criação de Features
-df_treino_features = create_features(df_treino_enriquecido, avg_price_map)
-
-# 4. Definição de Features (X) e Alvo (y)
+# Features candidatas (X) e alvo (y)
 FEATURES_LIST = [
     'preco',
     'avaliacao_numero',
@@ -62,58 +46,184 @@ FEATURES_LIST = [
     'feature_vendedor_ruim'
 ]
 
-TARGET = 'label_risco_real' 
-
-# Validar lista de features
-FEATURES_LIST = [f for f in FEATURES_LIST if f in df_treino_features.columns]
-print(f"\nFeatures que serão usadas no modelo: {FEATURES_LIST}")
-
-# Preparar dataframe final
-df_treino_final = df_treino_features.dropna(subset=[TARGET])
-
-X = df_treino_final[FEATURES_LIST]
-y = df_treino_final[TARGET]
-
-# 5. Divisão Treino/Teste
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.25, random_state=42, stratify=y)
-
-print(f"\nDados de treino: {len(X_train)} | Dados de teste: {len(X_test)}")
-print(f"Distribuição do alvo no treino:\n{y_train.value_counts(normalize=True)}")
-
-# 6. Criação do Pipeline de ML
-pipeline_ml = Pipeline([
-    ('scaler', StandardScaler()),
-    ('model', LogisticRegression(class_weight='balanced', random_state=42)) 
-    # class_weight='balanced' para lidar com classes desbalanceadas
-])
-
-# 7. Treinamento do Modelo
-print("\nTreinando o modelo de Regressão Logística...")
-pipeline_ml.fit(X_train, y_train)
-
-# 8. Avaliação do Modelo
-print("\n--- AVALIAÇÃO DO MODELO (nos dados de teste) ---")
-y_pred = pipeline_ml.predict(X_test)
-print(classification_report(y_test, y_pred, target_names=['Classe 0 (Legítimo)', 'Classe 1 (Suspeito)']))
-
-# 9. Geração da Matriz de Confusão
-try:
-    print("Gerando Matriz de Confusão...")
-    ConfusionMatrixDisplay.from_estimator(pipeline_ml, X_test, y_test, cmap='Blues', display_labels=['Legítimo', 'Suspeito'])
-    plt.title('Matriz de Confusão (Dados de Teste)')
-    plt.savefig('grafico_matriz_confusao.png')
-    print("Gráfico 'grafico_matriz_confusao.png' salvo.")
-    plt.close()
-except Exception as e:
-    print(f"Erro ao gerar Matriz de Confusão (ignorando): {e}")
-
-
-# 10. Salvamento dos Artefatos
-print("\nSalvando artefatos do modelo...")
-joblib.dump(pipeline_ml, MODELO_SAIDA)
-joblib.dump(FEATURES_LIST, FEATURES_LIST_SAIDA)
-
-print("\n--- SUCESSO! ---")
-print(f"Modelo salvo em: {MODELO_SAIDA}")
-print(f"Lista de features salva em: {FEATURES_LIST_SAIDA}")
-print("Treinamento concluído.")
+TARGET = 'label_risco_real'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Treinamento do modelo de classificação de risco.")
+    parser.add_argument('--sem-cache', action='store_true',
+                        help="Ignora o cache colunar e processa a base de treino do zero.")
+    parser.add_argument('--busca', action='store_true',
+                        help="Escolhe C, balanceamento de classes e subconjunto de features por validação cruzada "
+                             "estratificada antes do ajuste final.")
+    parser.add_argument('--folds', type=int, default=5,
+                        help="Número de folds da validação cruzada na busca (padrão: 5).")
+    parser.add_argument('--metrica', choices=METRICAS, default='f1',
+                        help="Métrica (média dos folds) usada para ordenar os candidatos (padrão: f1 da classe Suspeito).")
+    parser.add_argument('--tempo-limite', type=float, default=None, metavar='SEGUNDOS',
+                        help="Tempo máximo da busca; os candidatos não avaliados até lá são descartados.")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Processos usados na busca (padrão: todos os núcleos).")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Atualiza o modelo só com as linhas rotuladas ainda não vistas (partial_fit), "
+                             "gerando uma nova versão em modelos/.")
+    parser.add_argument('--lote', default=None, metavar='ARQUIVO',
+                        help=f"Com --incremental, lê as linhas novas deste arquivo em vez de '{BASE_DE_TREINO}'.")
+    parser.add_argument('--comparar-refit', action='store_true',
+                        help="Com --incremental, avalia também um ajuste completo nas mesmas linhas, para comparação.")
+    return parser.parse_args()
+
+
+def criar_pipeline(C=1.0, class_weight='balanced', max_iter=100):
+    return Pipeline([
+        ('scaler', StandardScaler()),
+        ('model', LogisticRegression(C=C, class_weight=class_weight, random_state=42, max_iter=max_iter))
+        # class_weight='balanced' para lidar com classes desbalanceadas
+    ])
+
+
+def main():
+    args = parse_args()
+
+    # Execução do Treinamento
+    print("--- Iniciando Treinamento do Modelo de Risco ---")
+
+    if args.incremental:
+        treinar_incremental(args.lote or BASE_DE_TREINO, ';', FEATURES_LIST, TARGET, MAPA_PRECOS_SAIDA,
+                            (MODELO_SAIDA, FEATURES_LIST_SAIDA), comparar_refit=args.comparar_refit)
+        return
+
+    # 1. Carregamento dos Dados e 2. Enriquecimento (reaproveitando o cache colunar)
+    print(f"Carregando base de treino: {BASE_DE_TREINO}")
+    df_treino_enriquecido = carregar_dados(BASE_DE_TREINO, separator=';', enriquecer=True, usar_cache=not args.sem_cache)
+
+    if df_treino_enriquecido is None:
+        print(f"ERRO: Não foi possível carregar a base de treino '{BASE_DE_TREINO}'.")
+        exit()
+
+    # Calcular e salvar mapa de preços médios
+    avg_price_map = df_treino_enriquecido[
+        df_treino_enriquecido['compatibilidade'] == 'Original'
+    ].groupby('modelo_cartucho')['preco'].mean().to_dict()
+
+    joblib.dump(avg_price_map, MAPA_PRECOS_SAIDA)
+    print(f"Mapa de preços médios salvo em: {MAPA_PRECOS_SAIDA}")
+
+    # Referência de preços incremental: parte da base de treino e é atualizada pelo analise.py a cada coleta
+    referencia_precos = ReferenciaPrecos()
+    referencia_precos.atualizar(df_treino_enriquecido)
+    referencia_precos.salvar(ARQUIVO_REFERENCIA)
+    print(f"Referência de preços incremental salva em: {ARQUIVO_REFERENCIA}")
+
+    # Hashes das linhas rotuladas (antes das features, que preenchem nulos): o treino
+    # incremental seguinte ignora as linhas que este treino já usou
+    hashes_linhas = hash_linhas(df_treino_enriquecido.dropna(subset=[TARGET]))
+
+    # 3. Criação de Features
+    df_treino_features = create_features(df_treino_enriquecido, avg_price_map)
+
+    # 4. Definição de Features (X) e Alvo (y)
+    # Validar lista de features
+    features_list = [f for f in FEATURES_LIST if f in df_treino_features.columns]
+    print(f"\nFeatures que serão usadas no modelo: {features_list}")
+
+    # Preparar dataframe final
+    df_treino_final = df_treino_features.dropna(subset=[TARGET])
+
+    # 5. Divisão Treino/Teste (estratificada, sobre as posições das linhas)
+    linhas_treino, linhas_teste = train_test_split(np.arange(len(df_treino_final)), test_size=0.25, random_state=42,
+                                                   stratify=df_treino_final[TARGET])
+
+    # Matriz de features em disco: as linhas de treino vêm primeiro e as de teste depois, então
+    # os dois conjuntos são fatias contíguas do memory-map, abertas sem cópia por este processo
+    # e pelos workers da busca
+    ordem = np.concatenate([linhas_treino, linhas_teste])
+    gravar_matriz(df_treino_final[features_list].iloc[ordem], df_treino_final[TARGET].iloc[ordem], ARQUIVO_MATRIZ,
+                  linhas_treino=len(linhas_treino), origem=BASE_DE_TREINO)
+    del df_treino_enriquecido, df_treino_features, df_treino_final
+    X, y, _ = abrir_matriz(ARQUIVO_MATRIZ, features_list)
+    print(f"Matriz de features salva em: {ARQUIVO_MATRIZ}")
+
+    corte = len(linhas_treino)
+    X_train = pd.DataFrame(X[:corte], columns=features_list, copy=False)
+    X_test = pd.DataFrame(X[corte:], columns=features_list, copy=False)
+    y_train = pd.Series(y[:corte], name=TARGET, dtype=np.int64)
+    y_test = pd.Series(y[corte:], name=TARGET, dtype=np.int64)
+
+    print(f"\nDados de treino: {len(X_train)} | Dados de teste: {len(X_test)}")
+    print(f"Distribuição do alvo no treino:\n{y_train.value_counts(normalize=True)}")
+
+    # 6. Criação do Pipeline de ML
+    if args.busca:
+        # Validação cruzada só nos dados de treino: o teste continua separado para a avaliação final
+        # Os workers abrem a matriz em disco (memory-map) em vez de receber uma cópia de X_train
+        tabela, candidatos = buscar(ARQUIVO_MATRIZ, None, features_list, folds=args.folds,
+                                    metrica=args.metrica, tempo_limite=args.tempo_limite, workers=args.workers)
+        if not candidatos:
+            print("ERRO: nenhum candidato foi avaliado dentro do tempo limite.")
+            exit()
+        tabela.to_csv(ARQUIVO_RESULTADOS_BUSCA, index=False, sep=';', encoding='utf-8-sig')
+        print(f"\n--- Melhores candidatos (ordenados por {args.metrica}) ---")
+        print(tabela.head(10).round(4).to_string(index=False))
+        print(f"Tabela completa salva em: {ARQUIVO_RESULTADOS_BUSCA}")
+
+        melhor = candidatos[0]
+        features_list = melhor['features']
+        X_train, X_test = X_train[features_list], X_test[features_list]
+        print(f"\nMelhor candidato: C={melhor['C']}, class_weight={melhor['class_weight']}, "
+              f"features={melhor['subconjunto']} ({len(features_list)})")
+        pipeline_ml = criar_pipeline(melhor['C'], melhor['class_weight'], max_iter=MAX_ITER)
+    else:
+        pipeline_ml = criar_pipeline()
+
+    # 7. Treinamento do Modelo
+    print("\nTreinando o modelo de Regressão Logística...")
+    pipeline_ml.fit(X_train, y_train)
+
+    # 8. Avaliação do Modelo
+    print("\n--- AVALIAÇÃO DO MODELO (nos dados de teste) ---")
+    y_pred = pipeline_ml.predict(X_test)
+    print(classification_report(y_test, y_pred, target_names=['Classe 0 (Legítimo)', 'Classe 1 (Suspeito)']))
+
+    # 9. Geração da Matriz de Confusão
+    try:
+        print("Gerando Matriz de Confusão...")
+        import matplotlib.pyplot as plt
+        ConfusionMatrixDisplay.from_estimator(pipeline_ml, X_test, y_test, cmap='Blues', display_labels=['Legítimo', 'Suspeito'])
+        plt.title('Matriz de Confusão (Dados de Teste)')
+        plt.savefig('grafico_matriz_confusao.png')
+        print("Gráfico 'grafico_matriz_confusao.png' salvo.")
+        plt.close()
+    except Exception as e:
+        print(f"Erro ao gerar Matriz de Confusão (ignorando): {e}")
+
+
+    # 10. Salvamento dos Artefatos
+    print("\nSalvando artefatos do modelo...")
+    joblib.dump(pipeline_ml, MODELO_SAIDA)
+    joblib.dump(features_list, FEATURES_LIST_SAIDA)
+
+    # 11. Exportação do Modelo Fundido (scaler incorporado aos pesos, inferência só com NumPy)
+    modelo_fundido = ModeloFundido.from_pipeline(pipeline_ml, features_list)
+    _, prob_fundido = modelo_fundido.prever(X_test)
+    diferenca_maxima = abs(prob_fundido - pipeline_ml.predict_proba(X_test)[:, 1]).max()
+    modelo_fundido.salvar(ARQUIVO_MODELO_FUNDIDO)
+    print(f"Modelo fundido salvo em: {ARQUIVO_MODELO_FUNDIDO} (diferença máxima para o sklearn: {diferenca_maxima:.2e})")
+
+    # 12. Pacote único (modelo fundido + mapa de preços + manifesto), lido pelo analise.py sem pickle
+    manifesto = salvar_pacote(modelo_fundido, avg_price_map, ARQUIVO_PACOTE)
+    print(f"Pacote de artefatos salvo em: {ARQUIVO_PACOTE} (versão {manifesto['versao']})")
+
+    # 13. O treino incremental seguinte parte deste modelo, e não da última versão incremental:
+    # as linhas da base contam como vistas e as de teste passam a ser o conjunto de avaliação
+    registrar_treino_completo(hashes_linhas, np.bincount(y_train, minlength=2), X_test.to_numpy(), y_test.to_numpy(),
+                              hashes_linhas[linhas_teste])
+
+    print("\n--- SUCESSO! ---")
+    print(f"Modelo salvo em: {MODELO_SAIDA}")
+    print(f"Lista de features salva em: {FEATURES_LIST_SAIDA}")
+    print("Treinamento concluído.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,311 @@
+# --- MÓDULO: treino_incremental.py ---
+# Retreinamento incremental do modelo de risco a partir de novos lotes rotulados.
+#
+# O treino completo (treinar_modelo.py) relê toda a base rotulada e ajusta o modelo do
+# zero. Aqui o modelo é um StandardScaler + regressão logística por gradiente estocástico
+# (SGDClassifier com log_loss), e os dois são atualizados com partial_fit usando apenas as
+# linhas rotuladas que ainda não foram vistas:
+#   - a atualização parte do modelo publicado: a versão incremental anterior ou, depois de
+#     um treino completo, o scaler e os coeficientes da regressão logística dele;
+#   - cada linha é identificada por um hash do seu conteúdo (incluindo o rótulo); os hashes
+#     já vistos ficam em modelos/estado_incremental.npz;
+#   - 1 de cada FRACAO_AVALIACAO linhas novas (pelo hash) fica reservada para avaliação e
+#     nunca entra no treino, então a avaliação é sempre feita no mesmo tipo de amostra e pode
+#     ser comparada com um ajuste completo (--comparar-refit);
+#   - o balanceamento de classes usa as contagens acumuladas de todas as linhas vistas.
+# Cada atualização gera uma versão em modelos/vNNNN/ e é publicada nos arquivos lidos pelo
+# analise.py (modelo_risco.pkl, features_list.pkl, o modelo fundido e o pacote de artefatos),
+# desde que o F1 e o ROC AUC nas linhas reservadas não fiquem claramente abaixo dos do modelo
+# publicado (nem, com --comparar-refit, dos do ajuste completo). Um treino completo grava
+# um estado novo (registrar_treino_completo): as linhas da base dele contam como vistas e as
+# linhas de teste dele passam a ser o conjunto de avaliação, e a atualização seguinte parte
+# do modelo novo.
+
+import json
+import os
+import shutil
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.metrics import f1_score, precision_score, recall_score, roc_auc_score
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from funcoes_analise import load_and_clean_data, enrich_data, create_features, COLUNAS_TITULO
+from modelo_fundido import ModeloFundido, ARQUIVO_MODELO_FUNDIDO
+from pacote_modelo import salvar_pacote, ARQUIVO_PACOTE
+from referencia_precos import carregar_mapa_precos
+
+PASTA_MODELOS = 'modelos'
+ARQUIVO_ESTADO = os.path.join(PASTA_MODELOS, 'estado_incremental.npz')
+ARQUIVO_AVALIACAO = os.path.join(PASTA_MODELOS, 'avaliacao.npz')
+ARQUIVO_VERSOES = os.path.join(PASTA_MODELOS, 'versoes.jsonl')
+FRACAO_AVALIACAO = 4 # 1 de cada 4 linhas (pelo hash) fica reservada para avaliação
+EPOCAS = 5 # Passadas sobre cada lote novo
+ALPHA = 1e-4 # Regularização L2 do SGDClassifier
+# Passo constante: o agendamento 'optimal' do SGDClassifier começa com passos da ordem de 1/ALPHA,
+# que apagam o modelo de partida logo nas primeiras linhas
+TAXA_APRENDIZADO = 0.01
+TOLERANCIA_F1 = 0.02 # Queda máxima de F1 aceita em relação ao modelo publicado (ou ao ajuste completo)
+TOLERANCIA_AUC = 0.02 # Idem para o ROC AUC
+
+
+def hash_linhas(df):
+    """Hash de 64 bits do conteúdo de cada linha (todas as colunas, incluindo o rótulo)."""
+    # id_anuncio é derivado da URL: fica fora para que os hashes já vistos continuem valendo.
+    # As colunas do enriquecimento também ficam fora: o treino completo calcula os hashes
+    # sobre a base já enriquecida, e eles precisam coincidir com os da base só limpa.
+    df = df.drop(columns=['id_anuncio', 'cluster_titulo', 'custo_por_pagina', *COLUNAS_TITULO], errors='ignore')
+    return pd.util.hash_pandas_object(df.astype(str), index=False).to_numpy(dtype=np.uint64)
+
+
+def carregar_estado(caminho=ARQUIVO_ESTADO):
+    """Hashes já vistos (ordenados), contagem de linhas de treino por classe e última versão."""
+    if not os.path.exists(caminho):
+        return {'hashes': np.zeros(0, dtype=np.uint64), 'contagens': np.zeros(2, dtype=np.int64), 'versao': 0}
+    with np.load(caminho, allow_pickle=False) as dados:
+        return {'hashes': dados['hashes'], 'contagens': dados['contagens'], 'versao': int(dados['versao'])}
+
+
+def salvar_estado(estado, caminho=ARQUIVO_ESTADO):
+    temporario = caminho + '.tmp.npz'
+    np.savez(temporario, hashes=estado['hashes'], contagens=estado['contagens'], versao=np.int64(estado['versao']))
+    os.replace(temporario, caminho)
+
+
+def registrar_treino_completo(hashes, contagens, X_teste, y_teste, hashes_teste, caminho=ARQUIVO_ESTADO,
+                              caminho_avaliacao=ARQUIVO_AVALIACAO):
+    """Estado incremental de um treino completo, mantendo a numeração das versões.
+
+    Todas as linhas da base (`hashes`) contam como vistas e as contagens por classe são as do
+    treino dele; as linhas de teste passam a ser o conjunto de avaliação. Assim a próxima
+    atualização só treina com linhas novas e compara os modelos em linhas que o modelo
+    publicado não viu.
+    """
+    os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+    estado = carregar_estado(caminho)
+    estado['hashes'] = np.unique(np.asarray(hashes, dtype=np.uint64))
+    estado['contagens'] = np.asarray(contagens, dtype=np.int64)
+    salvar_estado(estado, caminho)
+    _salvar_avaliacao(np.asarray(X_teste, dtype=np.float64), np.asarray(y_teste, dtype=np.int64), hashes_teste,
+                      caminho_avaliacao)
+
+
+def _acrescentar_avaliacao(X, y, hashes, caminho=ARQUIVO_AVALIACAO):
+    """Conjunto de avaliação com as linhas reservadas deste lote (só é gravado se a versão for publicada)."""
+    if os.path.exists(caminho):
+        with np.load(caminho, allow_pickle=False) as dados:
+            if dados['X'].shape[1] == X.shape[1]:
+                X, y = np.vstack([dados['X'], X]), np.concatenate([dados['y'], y])
+                # Conjuntos gravados antes dos hashes de avaliação: as linhas antigas ficam sem hash
+                anteriores = dados['hashes'] if 'hashes' in dados.files else np.zeros(len(dados['y']), dtype=np.uint64)
+                hashes = np.concatenate([anteriores, hashes])
+    return X, y, hashes
+
+
+def _salvar_avaliacao(X, y, hashes, caminho=ARQUIVO_AVALIACAO):
+    temporario = caminho + '.tmp.npz'
+    np.savez(temporario, X=X, y=y, hashes=np.asarray(hashes, dtype=np.uint64))
+    os.replace(temporario, caminho)
+
+
+def novo_pipeline():
+    return Pipeline([
+        ('scaler', StandardScaler()),
+        ('model', SGDClassifier(loss='log_loss', alpha=ALPHA, learning_rate='constant', eta0=TAXA_APRENDIZADO,
+                                random_state=42)),
+    ])
+
+
+def pipeline_inicial(caminho_modelo):
+    """Pipeline SGD que continua o modelo publicado, ou None se não houver modelo publicado.
+
+    Uma versão incremental é continuada como está. A regressão logística do treino completo
+    cede o scaler e os coeficientes a um SGDClassifier novo, que segue dali com partial_fit.
+    """
+    if not os.path.exists(caminho_modelo):
+        return None
+    publicado = joblib.load(caminho_modelo)
+    scaler, modelo = publicado.named_steps['scaler'], publicado.named_steps['model']
+    if isinstance(modelo, SGDClassifier):
+        # Versões antigas usavam o agendamento 'optimal'
+        return publicado.set_params(model__learning_rate='constant', model__eta0=TAXA_APRENDIZADO)
+
+    pipeline = novo_pipeline()
+    if hasattr(scaler, 'feature_names_in_'):
+        del scaler.feature_names_in_  # O incremental trabalha com matrizes NumPy, sem nomes de colunas
+    pipeline.steps[0] = ('scaler', scaler)
+    sgd = pipeline.named_steps['model']
+    # Estado equivalente a um SGDClassifier já ajustado com esses coeficientes
+    sgd.classes_ = np.array([0, 1])
+    sgd.n_features_in_ = modelo.coef_.shape[1]
+    sgd.coef_ = modelo.coef_.copy()
+    sgd.intercept_ = modelo.intercept_.copy()
+    sgd.t_ = 1.0
+    return pipeline
+
+
+def motivos_recusa(avaliacao, referencia, nome):
+    """Motivos para não publicar: F1 ou ROC AUC claramente abaixo da avaliação de referência."""
+    motivos = []
+    if not avaliacao or not referencia:
+        return motivos
+    if avaliacao['f1'] < referencia['f1'] - TOLERANCIA_F1:
+        motivos.append(f"F1 {avaliacao['f1']} < {referencia['f1']} ({nome})")
+    if avaliacao['roc_auc'] < referencia['roc_auc'] - TOLERANCIA_AUC:
+        motivos.append(f"ROC AUC {avaliacao['roc_auc']} < {referencia['roc_auc']} ({nome})")
+    return motivos
+
+
+def atualizar_pipeline(pipeline, X, y, contagens, epocas=EPOCAS, semente=0):
+    """Atualiza o scaler e o modelo com um lote (partial_fit), com pesos balanceados pelas contagens acumuladas."""
+    scaler, modelo = pipeline.named_steps['scaler'], pipeline.named_steps['model']
+    scaler.partial_fit(X)
+    X_padronizado = scaler.transform(X)
+    pesos_classe = contagens.sum() / (2.0 * np.maximum(contagens, 1))
+    pesos = pesos_classe[y]
+    rng = np.random.default_rng(semente)
+    for _ in range(epocas):
+        ordem = rng.permutation(len(y))
+        modelo.partial_fit(X_padronizado[ordem], y[ordem], classes=np.array([0, 1]), sample_weight=pesos[ordem])
+    return pipeline
+
+
+def avaliar(pipeline, X, y):
+    if len(y) == 0 or len(np.unique(y)) < 2:
+        return {}
+    probabilidades = pipeline.predict_proba(X)[:, 1]
+    previstos = (probabilidades >= 0.5).astype(int)
+    return {
+        'linhas': int(len(y)),
+        'f1': round(float(f1_score(y, previstos, zero_division=0)), 4),
+        'precision': round(float(precision_score(y, previstos, zero_division=0)), 4),
+        'recall': round(float(recall_score(y, previstos, zero_division=0)), 4),
+        'roc_auc': round(float(roc_auc_score(y, probabilidades)), 4),
+    }
+
+
+def _matriz_features(df, avg_price_map, features_list, alvo):
+    df = create_features(enrich_data(df), avg_price_map)
+    return df[features_list].fillna(0).to_numpy(dtype=np.float64), df[alvo].to_numpy(dtype=np.int64)
+
+
+def publicar_versao(pipeline, features_list, avg_price_map, registro, caminhos_saida):
+    """Grava a versão em modelos/vNNNN/ e copia os artefatos para os caminhos lidos pelo analise.py."""
+    pasta = os.path.join(PASTA_MODELOS, f"v{registro['versao']:04d}")
+    os.makedirs(pasta, exist_ok=True)
+    caminho_modelo, caminho_features = caminhos_saida
+    artefatos = {
+        caminho_modelo: lambda destino: joblib.dump(pipeline, destino),
+        caminho_features: lambda destino: joblib.dump(features_list, destino),
+        ARQUIVO_MODELO_FUNDIDO: lambda destino: ModeloFundido.from_pipeline(pipeline, features_list).salvar(destino),
+        ARQUIVO_PACOTE: lambda destino: salvar_pacote(ModeloFundido.from_pipeline(pipeline, features_list), avg_price_map,
+                                                      destino, origem='treino_incremental',
+                                                      extras={'versao_incremental': registro['versao']}),
+    }
+    for nome, gravar in artefatos.items():
+        destino = os.path.join(pasta, os.path.basename(nome))
+        gravar(destino)
+        shutil.copyfile(destino, nome + '.tmp')
+        os.replace(nome + '.tmp', nome)
+    with open(os.path.join(pasta, 'manifesto.json'), 'w', encoding='utf-8') as f:
+        json.dump(registro, f, ensure_ascii=False, indent=2)
+    with open(ARQUIVO_VERSOES, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+    return pasta
+
+
+def treinar_incremental(arquivo, separador, features_list, alvo, caminho_mapa, caminhos_saida, comparar_refit=False):
+    """Atualiza o modelo com as linhas de `arquivo` ainda não vistas. Devolve o registro da versão (ou None)."""
+    inicio = time.time()
+    os.makedirs(PASTA_MODELOS, exist_ok=True)
+    estado = carregar_estado()
+
+    df = load_and_clean_data(arquivo, separator=separador)
+    if df is None:
+        return None
+    df = df.dropna(subset=[alvo])
+    hashes = hash_linhas(df)
+    # Linhas repetidas dentro do próprio arquivo contam uma vez
+    novas = ~np.isin(hashes, estado['hashes']) & ~pd.Series(hashes).duplicated().to_numpy()
+    print(f"Treino incremental: {int(novas.sum())} linhas rotuladas novas de {len(df)} em '{arquivo}'.")
+    if not novas.any():
+        print("Nenhuma linha nova: o modelo atual foi mantido.")
+        return None
+
+    # Continua a partir do modelo publicado (warm start), com as features dele, ou começa um novo
+    pipeline = pipeline_inicial(caminhos_saida[0])
+    if pipeline is None:
+        pipeline = novo_pipeline()
+    elif os.path.exists(caminhos_saida[1]):
+        features_list = joblib.load(caminhos_saida[1])
+
+    avg_price_map = carregar_mapa_precos(caminho_mapa)
+    reservadas = hashes[novas] % FRACAO_AVALIACAO == 0
+    X_novas, y_novas = _matriz_features(df[novas], avg_price_map, features_list, alvo)
+    X_treino, y_treino = X_novas[~reservadas], y_novas[~reservadas]
+    X_avaliacao, y_avaliacao, hashes_avaliacao = _acrescentar_avaliacao(X_novas[reservadas], y_novas[reservadas],
+                                                                        hashes[novas][reservadas])
+
+    # O modelo publicado é avaliado antes da atualização (partial_fit altera o pipeline)
+    avaliacao_publicado = avaliar(pipeline, X_avaliacao, y_avaliacao) if hasattr(pipeline, 'classes_') else {}
+
+    versao_anterior = estado['versao']
+    contagens = estado['contagens'] + np.bincount(y_treino, minlength=2)
+    if len(y_treino):
+        atualizar_pipeline(pipeline, X_treino, y_treino, contagens, semente=versao_anterior)
+
+    registro = {
+        'versao': versao_anterior + 1,
+        'versao_anterior': versao_anterior or None,
+        'criado_em': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'origem': os.path.abspath(arquivo),
+        'features': list(features_list),
+        'linhas_novas_treino': int(len(y_treino)),
+        'linhas_novas_avaliacao': int(reservadas.sum()),
+        'linhas_treino_total': int(contagens.sum()),
+        'avaliacao': avaliar(pipeline, X_avaliacao, y_avaliacao),
+        'avaliacao_publicado': avaliacao_publicado,
+    }
+    referencias = {'modelo publicado': avaliacao_publicado}
+    comparacoes = {'modelo publicado': registro['avaliacao']}
+
+    if comparar_refit:
+        # Ajuste completo de referência com as linhas do arquivo, avaliado (como o incremental)
+        # nas linhas dele que estão no conjunto de avaliação
+        todas = ~pd.Series(hashes).duplicated().to_numpy()
+        X_todas, y_todas = _matriz_features(df[todas], avg_price_map, features_list, alvo)
+        treino_todas = ~np.isin(hashes[todas], hashes_avaliacao)
+        refit = Pipeline([('scaler', StandardScaler()),
+                          ('model', LogisticRegression(class_weight='balanced', random_state=42))])
+        refit.fit(X_todas[treino_todas], y_todas[treino_todas])
+        registro['avaliacao_refit'] = avaliar(refit, X_todas[~treino_todas], y_todas[~treino_todas])
+        referencias['ajuste completo'] = registro['avaliacao_refit']
+        comparacoes['ajuste completo'] = avaliar(pipeline, X_todas[~treino_todas], y_todas[~treino_todas])
+
+    motivos = [motivo for nome in referencias for motivo in motivos_recusa(comparacoes[nome], referencias[nome], nome)]
+    if motivos:
+        # Nada é gravado: as linhas continuam novas para a próxima tentativa
+        print(f"Versão {registro['versao']} NÃO publicada: {'; '.join(motivos)}.")
+        print("O modelo atual foi mantido. Para incorporar estas linhas, use o treino completo (treinar_modelo.py).")
+        return None
+
+    registro['segundos'] = round(time.time() - inicio, 3)
+    pasta = publicar_versao(pipeline, list(features_list), avg_price_map, registro, caminhos_saida)
+    _salvar_avaliacao(X_avaliacao, y_avaliacao, hashes_avaliacao)
+
+    estado['hashes'] = np.union1d(estado['hashes'], hashes[novas])
+    estado['contagens'] = contagens
+    estado['versao'] = registro['versao']
+    salvar_estado(estado)
+
+    print(f"Versão {registro['versao']} salva em '{pasta}' e publicada ({registro['segundos']:.2f} s).")
+    print(f"Avaliação (linhas reservadas): {registro['avaliacao']}")
+    if avaliacao_publicado:
+        print(f"Modelo publicado antes:        {avaliacao_publicado}")
+    if comparar_refit:
+        print(f"Avaliação do ajuste completo:  {registro['avaliacao_refit']}")
+    return registro